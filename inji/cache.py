@@ -0,0 +1,240 @@
+# Content-addressed cache of rendered templates
+#
+# Renders are keyed by a fingerprint of everything that goes into them - the
+# sources of the template and all it includes, imports or extends, the
+# context values it refers to, the inji and jinja2 versions and the engine
+# settings - so a hit can be served without compiling or running anything.
+# Templates calling globals or filters whose results depend on the clock,
+# the host, the network, files or commands can't be fingerprinted like that
+# and are not cached unless keyed explicitly (--cache-key).
+#
+# Entries are plain files, written atomically and evicted least recently
+# used first, so a cache directory can be shared by concurrent CI runners.
+
+import collections
+import collections.abc
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+import threading
+from importlib.metadata import version
+
+import jinja2
+from jinja2 import meta, nodes
+
+IMPURE_GLOBALS = frozenset(
+    {
+        "GET",
+        "GET_many",
+        "bacon_ipsum",
+        "builtins",
+        "cat",
+        "date",
+        "datetime",
+        "fqdn",
+        "git_branch",
+        "git_commit_id",
+        "git_remote_url",
+        "git_remote_url_http",
+        "git_tag",
+        "host_id",
+        "hostname",
+        "inspect",
+        "ip_api",
+        "lipsum",
+        "machine_id",
+        "markdown",
+        "now",
+        "os",
+        "os_release",
+        "platform",
+        "run",
+        "socket",
+        "sys",
+        "utils",
+        "whatismyip",
+    }
+)
+
+IMPURE_FILTERS = frozenset(
+    {
+        "builtins",
+        "cat",
+        "datetime",
+        "env_override",
+        "os",
+        "sys",
+        "time",
+        "utils",
+        # jinja2's and ansible's
+        "expanduser",
+        "expandvars",
+        "fileglob",
+        "password_hash",
+        "random",
+        "random_mac",
+        "realpath",
+        "relpath",
+        "shuffle",
+    }
+)
+
+
+def _version():
+    try:
+        return version("inji")
+    except Exception:
+        return "unknown"
+
+
+VERSION = f"inji={_version()} jinja2={jinja2.__version__}"
+
+
+def _canonical(value):
+    """Return value as JSON-serialisable data that is equal only for equal values
+
+    The types of values are kept (1, 1.0, True and '1' differ, as do dict keys
+    of those), dicts and sets are ordered. Values of other types are told
+    apart by their pickle - TypeError is raised for those that can't be.
+    """
+    kind = type(value)
+    if kind in (str, int, float, bool, type(None)):
+        return value
+    if kind in (list, tuple):
+        return [kind.__name__, [_canonical(v) for v in value]]
+    if kind is dict:
+        items = ([_canonical(k), _canonical(v)] for k, v in value.items())
+        return ["dict", sorted(items, key=json.dumps)]
+    if kind in (set, frozenset):
+        return [kind.__name__, sorted((_canonical(v) for v in value), key=json.dumps)]
+    if kind in (bytes, bytearray):
+        return [kind.__name__, value.hex()]
+
+    name = f"{kind.__module__}.{kind.__qualname__}"
+    for base in (str, int, float, bytes):
+        # e.g. markupsafe.Markup, which renders differently from a str
+        if isinstance(value, base):
+            return [name, _canonical(base(value))]
+    if isinstance(value, collections.abc.Mapping):
+        return [name, _canonical(dict(value))]
+    try:
+        state = pickle.dumps(value, protocol=4)
+    except Exception as e:
+        raise TypeError(f"can't fingerprint a {name}: {e}") from e
+    return [name, hashlib.sha256(state).hexdigest()]
+
+
+def digest(*values):
+    """Return the SHA-256 of values, raising TypeError for those it can't tell apart"""
+    try:
+        text = json.dumps(_canonical(values))
+    except RecursionError:
+        raise TypeError("can't fingerprint self-referencing values") from None
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def analyse(ast):
+    """Return what about a parsed template matters to its fingerprint"""
+    refs = list(meta.find_referenced_templates(ast))
+    names = meta.find_undeclared_variables(ast)
+    # globals are not undeclared, so look for any name loaded
+    loaded = {n.name for n in ast.find_all(nodes.Name) if n.ctx == "load"}
+    filters = {f.name for f in ast.find_all(nodes.Filter)}
+    return dict(
+        refs=sorted(r for r in refs if r is not None),
+        # includes by a name known only at render time can't be followed
+        dynamic=None in refs,
+        names=sorted(names),
+        impure=sorted((loaded & IMPURE_GLOBALS) | (filters & IMPURE_FILTERS)),
+        # files written by {% output %} blocks would not be on a hit
+        writes=any(
+            a.identifier == "inji.extensions.OutputExtension"
+            for a in ast.find_all(nodes.ExtensionAttribute)
+        ),
+    )
+
+
+class DiskCache:
+    """Entries in a directory, bounded by size with LRU eviction"""
+
+    def __init__(self, directory, max_size=512 << 20):
+        self.directory = os.path.abspath(directory)
+        self.max_size = max_size
+        self.stats = collections.Counter()
+        self._written = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.directory, key[:2], key)
+
+    def read(self, key):
+        """Return the bytes stored under key, None if there are none"""
+        path = self.path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            # the mtime doubles as the time of last use for eviction
+            os.utime(path)
+        except FileNotFoundError:
+            self.stats["misses"] += 1
+            return None
+        self.stats["hits"] += 1
+        return data
+
+    def write(self, key, data):
+        """Store bytes under key"""
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            os.remove(tmp)
+            raise
+        with self._lock:
+            self._written += len(data)
+            prune = self._written > self.max_size // 10
+            if prune:
+                self._written = 0
+        if prune:
+            self.prune()
+
+    def get(self, key):
+        """Return the text stored under key, None if there is none"""
+        data = self.read(key)
+        return data.decode("utf-8") if data is not None else None
+
+    def set(self, key, text):
+        """Store text under key"""
+        self.write(key, text.encode("utf-8"))
+
+    def entries(self):
+        """Yield the mtime, size and path of every entry"""
+        for root, _, filenames in os.walk(self.directory):
+            for filename in filenames:
+                if filename.startswith(".tmp-"):
+                    continue
+                path = os.path.join(root, filename)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:  # evicted by another process
+                    continue
+                yield st.st_mtime_ns, st.st_size, path
+
+    def prune(self):
+        """Evict the least recently used entries until the cache fits max_size"""
+        entries = sorted(self.entries())
+        size = sum(e[1] for e in entries)
+        for _, entry_size, path in entries:
+            if size <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            size -= entry_size
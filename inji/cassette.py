@@ -0,0 +1,71 @@
+# Record and replay the side effects of renders
+#
+# `inji --record calls.json.gz` keeps the result of every command run (run(),
+# git_*(), host_id(), ..) and HTTP request made (GET(), ip_api(), ..) during
+# the render. `inji --replay calls.json.gz` serves them back from memory - no
+# processes are spawned and nothing goes to the network - making renders
+# fast, deterministic and independent of the host they run on.
+#
+# A cassette is a gzipped JSON object of calls, keyed by what was called
+# with what, to their results.
+
+import gzip
+import json
+import os
+import tempfile
+import threading
+
+VERSION = 1
+
+
+class ReplayError(LookupError):
+    """A call was made on replay that was not recorded"""
+
+
+class Cassette:
+    def __init__(self, path, mode="replay"):
+        """
+        path    the cassette file
+        mode    "record" calls (adding to those already in path) or "replay" them
+        """
+        if mode not in ("record", "replay"):
+            raise ValueError(f"mode must be 'record' or 'replay', not '{mode}'")
+        self.path = path
+        self.mode = mode
+        self.calls = {}
+        self._lock = threading.Lock()
+        if mode == "replay" or os.path.exists(path):
+            self.load()
+
+    def load(self):
+        with gzip.open(self.path, "rt", encoding="utf-8") as f:
+            cassette = json.load(f)
+        if cassette.get("version") != VERSION:
+            raise ValueError(f"'{self.path}' is not a version {VERSION} cassette")
+        self.calls = cassette["calls"]
+
+    def save(self):
+        """Atomically write the recorded calls to the cassette file"""
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix=".cassette-")
+        try:
+            with os.fdopen(fd, "wb") as raw, gzip.open(raw, "wt", encoding="utf-8") as f:
+                with self._lock:
+                    json.dump(dict(version=VERSION, calls=self.calls), f, sort_keys=True)
+            os.replace(tmp, self.path)
+        except BaseException:
+            os.remove(tmp)
+            raise
+
+    def call(self, kind, arg, fn):
+        """Return fn(arg), recording it - or what was recorded for it"""
+        key = f"{kind} {arg}"
+        if self.mode == "replay":
+            try:
+                return self.calls[key]
+            except KeyError:
+                raise ReplayError(f"{kind} '{arg}' was not recorded in '{self.path}'") from None
+        result = fn(arg)
+        with self._lock:
+            self.calls[key] = result
+        return result
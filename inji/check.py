@@ -0,0 +1,137 @@
+# Check rendered templates against the output files committed for them
+#
+# `inji --check --output-dir DIR templates/*.j2` renders every template in
+# memory and compares it, line by line, with the file it would be written
+# to - reading the file as it goes instead of rendering to a scratch tree
+# and diffing that. Files emitted by {% output %} blocks are compared rather
+# than written. Templates are spread over forked workers, one per core.
+
+import multiprocessing
+import os
+
+from . import sinks
+
+
+def compare(chunks, path, name=None):
+    """Compare text chunks with the contents of path
+
+    Returns None when they are the same, else a short summary of the first
+    line that differs.
+    """
+    name = name or path
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
+        return f"{name}: missing"
+    with f:
+        lineno, pending = 0, ""
+        for chunk in chunks:
+            lines = (pending + chunk).split("\n")
+            # hold back an unterminated last line until the next chunk
+            pending = lines.pop()
+            for line in lines:
+                lineno += 1
+                expected, line = f.readline(), (line + "\n").encode("utf-8")
+                if line != expected:
+                    return _summary(name, lineno, expected, line)
+        if pending:
+            lineno += 1
+            expected, line = f.readline(), pending.encode("utf-8")
+            if line != expected:
+                return _summary(name, lineno, expected, line)
+        extra = f.readline()
+        if extra:
+            return _summary(name, lineno + 1, extra, b"")
+    return None
+
+
+def _summary(name, lineno, expected, rendered):
+    lines = [f"{name}:{lineno}"]
+    if expected:
+        lines.append("- " + expected.decode("utf-8", "replace").rstrip("\n"))
+    if rendered:
+        lines.append("+ " + rendered.decode("utf-8", "replace").rstrip("\n"))
+    return "\n".join(lines)
+
+
+class Checker(sinks.Writer):
+    """A sinks.Writer that records the files whose contents differ instead of writing"""
+
+    def __init__(self, root=".", workers=4):
+        super().__init__(root=root, workers=workers)
+        self.drifted = []
+        self._texts = {}
+
+    def submit(self, path, text):
+        path = self.path(path)
+        with self._lock:
+            # the last text for a path is what would be written
+            self._texts[path] = text
+
+    def _compare(self, path, text):
+        summary = compare([text], path, name=os.path.relpath(path))
+        if summary:
+            with self._lock:
+                self.drifted.append(summary)
+
+    def close(self):
+        with self._lock:
+            texts, self._texts = self._texts, {}
+        self._futures.extend(self._pool.submit(self._compare, p, t) for p, t in texts.items())
+        super().close()
+
+
+def check_template(engine, template, context, output_dir):
+    """Return summaries of the outputs of template that differ from what is on disk"""
+    dest = sinks.output_path(output_dir, template)
+    try:
+        with Checker(root=output_dir) as checker:
+            blocks = engine.render(
+                template=template, context=context, output_dir=output_dir, writer=checker
+            )
+            summary = compare((b + "\n" for b in blocks), dest)
+    except Exception as e:
+        return [f"{template}: {type(e).__name__}: {str(e)}"]
+    return ([summary] if summary else []) + sorted(checker.drifted)
+
+
+# The check a forked worker process is doing - handed over fork() to the
+# pool's initializer as engines can't be pickled.
+_forked_check = None
+
+
+def _init_forked(check):
+    global _forked_check
+    _forked_check = check
+
+
+def _check_forked(template):
+    engine, context, output_dir = _forked_check
+    return check_template(engine, template, context, output_dir)
+
+
+def check(engine, templates, context, output=None, output_dir=None, workers=None):
+    """Return summaries of every output that differs from what is on disk"""
+    if output:
+        # all templates go to one file, compare them with it in order
+        checker = Checker(root=engine.output_dir)
+        chunks = (
+            b + "\n"
+            for t in templates
+            for b in engine.render(template=t, context=context, writer=checker)
+        )
+        try:
+            summary = compare(chunks, output)
+        finally:
+            checker.close()
+        return ([summary] if summary else []) + sorted(checker.drifted)
+
+    workers = min(workers or os.cpu_count() or 1, len(templates))
+    if workers <= 1 or "fork" not in multiprocessing.get_all_start_methods():
+        results = [check_template(engine, t, context, output_dir) for t in templates]
+    else:
+        with multiprocessing.get_context("fork").Pool(
+            workers, initializer=_init_forked, initargs=((engine, context, output_dir),)
+        ) as pool:
+            results = pool.map(_check_forked, templates, chunksize=1)
+    return [summary for result in results for summary in result]
@@ -4,19 +4,43 @@
 # inji - Render jina2 templates to stdout
 
 import argparse
-import atexit
+import contextlib
 import fnmatch
+import hashlib
 import locale
 import os
-import shutil
 import signal
 import sys
 import tempfile
 from importlib.metadata import version
 from os.path import abspath, dirname
 
-from . import utils
+from . import (
+    check,
+    coprocess,
+    deps,
+    facts,
+    httpd,
+    md,
+    server,
+    shard,
+    sinks,
+    timeouts,
+    utils,
+    watch,
+    worker,
+)
+from .cache import DiskCache
+from .cassette import Cassette
 from .engine import TemplateEngine
+from .httpcache import HTTPCache
+from .journal import Journal
+
+# What --strict-mode accepts
+STRICT_MODES = ["strict", "empty", "keep", "StrictUndefined", "Undefined", "DebugUndefined"]
+
+# Commands other than rendering, given as the first argument
+SUBCOMMANDS = ("deps", "http", "serve")
 
 
 def pkg_location():
@@ -33,7 +57,18 @@ def _version():
 __version__ = _version()
 
 
-def cli_args():
+def fact_ttl(string):
+    """Parse a string of the form NAME=SECONDS into a dictionary"""
+    ((name, seconds),) = utils.kv_parse(string).items()
+    try:
+        return {name: float(seconds)}
+    except ValueError as e:
+        msg = f"Invalid TTL in '{string}': {str(e)}"
+        print(msg, file=sys.stderr)
+        raise argparse.ArgumentTypeError(msg)
+
+
+def cli_args(argv=None):
     parser = argparse.ArgumentParser(description="inji - render jinja templates")
     parser.add_argument_group("required arguments")
 
@@ -91,10 +126,320 @@ def cli_args():
         type=str,
         dest="undefined_variables_mode",
         default="strict",
-        choices=["strict", "empty", "keep", "StrictUndefined", "Undefined", "DebugUndefined"],
+        choices=STRICT_MODES,
         help="Refer to http://jinja.pocoo.org/docs/2.10/api/#undefined-types",
     )
 
+    parser.add_argument(
+        "--shard",
+        action="store",
+        required=False,
+        type=shard.parse,
+        dest="shard",
+        default=None,
+        metavar="INDEX/COUNT",
+        help="render only the INDEX'th of COUNT disjoint slices of the templates given",
+    )
+
+    parser.add_argument(
+        "--shard-weights",
+        action="store",
+        required=False,
+        type=lambda x: x if x == "size" else utils.path(x),
+        dest="shard_weights",
+        default=None,
+        metavar="size|FILE",
+        help="balance shards by template size or by weights (e.g. durations) in FILE",
+    )
+
+    parser.add_argument(
+        "--shard-manifest",
+        action="store",
+        required=False,
+        dest="shard_manifest",
+        default=None,
+        metavar="FILE",
+        help="write the jobs rendered by this shard (and their output hashes) to FILE",
+    )
+
+    parser.add_argument(
+        "--shard-merge",
+        action="append",
+        required=False,
+        type=lambda p, t="file": utils.path(p, t),
+        dest="shard_merge",
+        default=[],
+        metavar="FILE",
+        help="check shard manifests add up to the templates given instead of rendering",
+    )
+
+    parser.add_argument(
+        "--journal",
+        action="store",
+        required=False,
+        dest="journal",
+        default=None,
+        metavar="FILE",
+        help="append each completed template (and its output hash) to the journal FILE",
+    )
+
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        required=False,
+        dest="resume",
+        default=False,
+        help="skip templates completed according to the --journal and unchanged since",
+    )
+
+    sink = parser.add_mutually_exclusive_group()
+
+    sink.add_argument(
+        "--output",
+        action="store",
+        required=False,
+        dest="output",
+        default=None,
+        metavar="FILE",
+        help="atomically write the rendered templates to FILE if they changed",
+    )
+
+    sink.add_argument(
+        "--output-dir",
+        action="store",
+        required=False,
+        dest="output_dir",
+        default=None,
+        metavar="DIR",
+        help="atomically write each rendered template to DIR if it changed",
+    )
+
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        required=False,
+        dest="check",
+        default=False,
+        help="exit non-zero if --output or --output-dir differ from what would be rendered",
+    )
+
+    parser.add_argument(
+        "--cache-dir",
+        action="store",
+        required=False,
+        dest="cache_dir",
+        default=None,
+        metavar="DIR",
+        help="cache renders in DIR, keyed by everything that goes into them",
+    )
+
+    parser.add_argument(
+        "--cache-size",
+        action="store",
+        required=False,
+        type=int,
+        dest="cache_size",
+        default=512,
+        metavar="MB",
+        help="evict the least recently used renders beyond this size (default 512)",
+    )
+
+    parser.add_argument(
+        "--cache-key",
+        action="store",
+        required=False,
+        dest="cache_key",
+        default=None,
+        metavar="STRING",
+        help="also cache templates calling impure globals (run, GET, now, ..), keyed by STRING",
+    )
+
+    parser.add_argument(
+        "--memoize-filters",
+        action="store_true",
+        required=False,
+        dest="memoize_filters",
+        default=False,
+        help="reuse results of pure filters (format_dict, to_url, ..) given the same arguments",
+    )
+
+    parser.add_argument(
+        "--http-pool-size",
+        action="store",
+        required=False,
+        type=int,
+        dest="http_pool_size",
+        default=utils.http_pool_size,
+        metavar="N",
+        help=f"keep at most N connections to any one host (default {utils.http_pool_size})",
+    )
+
+    parser.add_argument(
+        "--http-cache-dir",
+        action="store",
+        required=False,
+        dest="http_cache_dir",
+        default=None,
+        metavar="DIR",
+        help="cache HTTP responses of GET() and friends in DIR, as their headers allow",
+    )
+
+    parser.add_argument(
+        "--http-cache-ttl",
+        action="store",
+        required=False,
+        type=float,
+        dest="http_cache_ttl",
+        default=None,
+        metavar="SECONDS",
+        help="consider cached responses fresh for SECONDS, whatever their headers say",
+    )
+
+    parser.add_argument(
+        "--http-cache-size",
+        action="store",
+        required=False,
+        type=int,
+        dest="http_cache_size",
+        default=256,
+        metavar="MB",
+        help="evict the least recently used responses beyond this size (default 256)",
+    )
+
+    parser.add_argument(
+        "--offline",
+        action="store_true",
+        required=False,
+        dest="offline",
+        default=False,
+        help="serve HTTP requests only from the --http-cache-dir, failing on a miss",
+    )
+
+    parser.add_argument(
+        "--deadline",
+        action="store",
+        required=False,
+        type=float,
+        dest="deadline",
+        default=None,
+        metavar="SECONDS",
+        help="fail the render of any template (and the calls it makes) taking longer than SECONDS",
+    )
+
+    parser.add_argument(
+        "--call-timeout",
+        action="store",
+        required=False,
+        type=float,
+        dest="call_timeout",
+        default=None,
+        metavar="SECONDS",
+        help="fail any command run or HTTP request made taking longer than SECONDS",
+    )
+
+    parser.add_argument(
+        "--coprocesses",
+        action="store",
+        required=False,
+        type=int,
+        dest="coprocesses",
+        default=0,
+        metavar="N",
+        help="run commands (run(), ..) through up to N long-lived shells instead of spawning each",
+    )
+
+    cassette = parser.add_mutually_exclusive_group()
+
+    cassette.add_argument(
+        "--record",
+        action="store",
+        required=False,
+        dest="record",
+        default=None,
+        metavar="FILE",
+        help="record the commands run and HTTP requests made while rendering to FILE",
+    )
+
+    cassette.add_argument(
+        "--replay",
+        action="store",
+        required=False,
+        type=lambda p, t="file": utils.path(p, t),
+        dest="replay",
+        default=None,
+        metavar="FILE",
+        help="serve commands and HTTP requests from the recording in FILE",
+    )
+
+    parser.add_argument(
+        "--prefetch",
+        action="store_true",
+        required=False,
+        dest="prefetch",
+        default=False,
+        help="start run(), GET(), git_*(), .. calls with known arguments all at once up front",
+    )
+
+    parser.add_argument(
+        "--fact-cache",
+        action="store",
+        required=False,
+        dest="fact_cache",
+        default=None,
+        metavar="DIR",
+        help="keep git and host facts (git_commit_id(), fqdn(), ..) across runs in DIR",
+    )
+
+    parser.add_argument(
+        "--fact-ttl",
+        action="append",
+        required=False,
+        type=fact_ttl,
+        dest="fact_ttl",
+        default=[],
+        metavar="NAME=SECONDS",
+        help="keep the fact NAME (or run) for SECONDS in the --fact-cache, 0 not at all",
+    )
+
+    parser.add_argument(
+        "--connect",
+        action="store",
+        required=False,
+        dest="connect",
+        default=None,
+        metavar="SOCKET",
+        help="have the `inji serve` daemon listening on SOCKET do the rendering",
+    )
+
+    parser.add_argument(
+        "--worker",
+        action="store_true",
+        required=False,
+        dest="worker",
+        default=False,
+        help="answer NDJSON render requests on STDIN until it is closed",
+    )
+
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        required=False,
+        dest="watch",
+        default=False,
+        help="keep re-rendering templates as they, their includes or vars files change",
+    )
+
+    parser.add_argument(
+        "--watch-interval",
+        action="store",
+        required=False,
+        type=float,
+        dest="watch_interval",
+        default=0.5,
+        metavar="SECONDS",
+        help="how often --watch polls files for changes (default 0.5)",
+    )
+
     parser.add_argument(
         "--version",
         action="version",
@@ -111,7 +456,44 @@ def cli_args():
         help="/path/to/template.j2 (defaults to -)",
     )
 
-    return parser.parse_args()
+    args = parser.parse_args(argv)
+
+    if args.resume and not args.journal:
+        parser.error("--resume requires --journal")
+
+    if args.resume and not args.output_dir:
+        # the output of templates skipped would otherwise be missing
+        parser.error("--resume requires --output-dir")
+
+    if args.connect and (args.watch or args.worker):
+        # the daemon answers one render at a time, it doesn't keep at them
+        parser.error("--connect cannot be used with --watch or --worker")
+
+    if args.offline and not args.http_cache_dir:
+        parser.error("--offline requires --http-cache-dir to serve from")
+
+    if args.check and not (args.output or args.output_dir):
+        parser.error("--check requires --output or --output-dir to compare with")
+
+    if args.check and args.watch:
+        parser.error("--check cannot be used with --watch")
+
+    if args.output_dir and "-" in args.template:
+        parser.error("--output-dir needs template files to name outputs after")
+
+    if args.output_dir:
+        templates = [args.template] if isinstance(args.template, str) else args.template
+        for path, colliding in sorted(sinks.output_collisions(args.output_dir, templates).items()):
+            parser.error(f"{', '.join(colliding)} would all be rendered to '{path}'")
+
+    if args.coprocesses < 0:
+        parser.error("--coprocesses must not be negative")
+
+    for name in ("deadline", "call_timeout"):
+        if getattr(args, name) is not None and getattr(args, name) <= 0:
+            parser.error(f"--{name.replace('_', '-')} must be positive")
+
+    return args
 
 
 def sigint_handler(signum, frame):  # pragma: no cover # despite being covered
@@ -120,6 +502,17 @@ def sigint_handler(signum, frame):  # pragma: no cover # despite being covered
     sys.exit(128 + signal.SIGINT)  # 130 by convention
 
 
+def subcommand(argv):
+    """Return the subcommand argv starts with, None if it starts with a template
+
+    A template file of the same name as a subcommand (e.g. ./serve) is
+    rendered as such rather than taken for the subcommand.
+    """
+    if argv[:1] and argv[0] in SUBCOMMANDS and not os.path.exists(argv[0]):
+        return argv[0]
+    return None
+
+
 def main():
     """Our main method"""
 
@@ -130,8 +523,36 @@ def main():
         f"Python version ({sys.version_info.major}.{sys.version_info.minor}) !>= 3.5"
     )
 
+    command = subcommand(sys.argv[1:])
+    if command == "deps":
+        sys.exit(deps.main(deps.deps_args(sys.argv[2:]), TemplateEngine()))
+
+    if command == "http":
+        sys.exit(httpd.serve(httpd.http_args(sys.argv[2:])))
+
+    if command == "serve":
+        args = server.serve_args(sys.argv[2:])
+        return server.serve(args.socket, workers=args.workers)
+
     args = cli_args()
 
+    if args.worker:
+        timeouts.call_timeout = args.call_timeout
+        sys.exit(worker.serve(sys.stdin, sys.stdout, deadline=args.deadline))
+
+    if args.connect:
+        sys.exit(server.connect(args.connect, server.forwarded_argv(sys.argv[1:]), args))
+
+    try:
+        run(args)
+    except timeouts.Timeout as e:
+        print(f"inji: {e}", file=sys.stderr)
+        sys.exit(124)  # as timeout(1) does
+
+
+def vars_files(args):
+    """Return all the vars files we are told about or imply in order of precedence"""
+
     # this holds all the possible vars files we are told about or imply
     vars_files = []
 
@@ -151,13 +572,19 @@ def main():
     # context from named vars files - p3
     vars_files += args.vars_file
 
+    return vars_files
+
+
+def read_vars(args, environ):
+    """Assemble the context from all the sources of vars in order of precedence"""
+
     # This will hold the final vars dict merged from various available sources
     context = {}
-    for file in vars_files:
+    for file in vars_files(args):
         context.update(utils.read_context(file))
 
     # context from environment variables - p2
-    context.update(os.environ)
+    context.update(environ)
 
     # context at the command line (either JSON or KV type) - p1
     if args.json_string:
@@ -168,26 +595,199 @@ def main():
         for d in args.kv_pair:
             context.update(d)
 
-    if "-" in args.template:
-        # Template passed in via stdin. Create template as a tempfile and use it
-        # instead but since includes are possible (though not likely), we have to do
-        # this in an isolated tmpdir container to prevent inadvertent reading of
-        # includes not meant to be read.
-        tmpdir = tempfile.mkdtemp(prefix=__name__)
-        atexit.register(shutil.rmtree, tmpdir)
+    return context
+
 
-        _, tmpfile = tempfile.mkstemp(prefix="stdin-", dir=tmpdir, text=True)
-        atexit.register(os.remove, tmpfile)
+def engine_settings(args):
+    """Return the settings of the engine args ask for, besides the undefined variables mode
 
-        with open(tmpfile, "a+") as f:
-            f.write(sys.stdin.read())
+    These are all hashable, so that engines can be kept by them.
+    """
+    return dict(
+        cache_dir=os.path.abspath(args.cache_dir) if args.cache_dir else None,
+        cache_size=args.cache_size,
+        cache_key=args.cache_key,
+        memoize_filters=args.memoize_filters,
+        prefetch=args.prefetch,
+        deadline=args.deadline,
+    )
 
-        # Yes, even if user specifies multiple other templates, the fact he
-        # specified '-' just once means we only deal with one template i.e. '-'
-        args.template = [tmpfile]
 
-    engine = TemplateEngine(undefined_variables_mode_behaviour=args.undefined_variables_mode)
+def new_engine(mode, cache_dir=None, cache_size=512, **settings):
+    """Return a new TemplateEngine with the engine_settings() given"""
+    return TemplateEngine(
+        undefined_variables_mode_behaviour=mode,
+        cache=DiskCache(cache_dir, cache_size << 20) if cache_dir else None,
+        **settings,
+    )
+
 
-    for template in args.template:
-        for block in engine.render(template=template, context=context):
-            print(block)
+def run(args, engine=None, environ=None, stdin=None, out=None):
+    """Render the templates named in args, passing each rendered block to out
+
+    An engine given has to have been set up as engine_settings(args) ask.
+    """
+
+    environ = os.environ if environ is None else environ
+    stdin = sys.stdin if stdin is None else stdin
+    out = print if out is None else out
+
+    if isinstance(args.template, str):
+        args.template = [args.template]
+
+    if args.shard_merge:
+        problems = shard.merge(args.shard_merge, args.template)
+        for kind, jobs in problems.items():
+            for job in jobs:
+                print(f"shard merge: {kind} job '{job}'", file=sys.stderr)
+        sys.exit(1 if any(problems.values()) else 0)
+
+    timeouts.call_timeout = args.call_timeout
+
+    if args.http_pool_size != utils.http_pool_size:
+        utils.configure_http(args.http_pool_size)
+
+    facts.cache = None
+    if args.fact_cache:
+        ttls = {}
+        for d in args.fact_ttl:
+            ttls.update(d)
+        facts.cache = facts.FactCache(args.fact_cache, ttls=ttls)
+
+    utils.http_cache = None
+    if args.http_cache_dir:
+        utils.http_cache = HTTPCache(
+            args.http_cache_dir,
+            max_size=args.http_cache_size << 20,
+            ttl=args.http_cache_ttl,
+            offline=args.offline,
+        )
+
+    context = read_vars(args, environ)
+
+    # only keep the slice of templates this shard is responsible for
+    if args.shard:
+        weights = None
+        if args.shard_weights == "size":
+            weights = shard.weights_by_size({shard.job_key(t): t for t in args.template})
+        elif args.shard_weights:
+            weights = shard.read_weights(args.shard_weights)
+        args.template = shard.select(args.template, *args.shard, weights=weights)
+    job_keys = {t: shard.job_key(t) for t in args.template}
+
+    with contextlib.ExitStack() as stack:
+        stack.callback(setattr, utils, "cassette", None)
+        if args.record:
+            utils.cassette = Cassette(args.record, mode="record")
+            stack.callback(utils.cassette.save)
+        elif args.replay:
+            utils.cassette = Cassette(args.replay, mode="replay")
+
+        stack.callback(setattr, utils, "coprocesses", None)
+        if args.coprocesses:
+            utils.coprocesses = stack.enter_context(coprocess.Pool(args.coprocesses))
+
+        if "-" in args.template:
+            # Template passed in via stdin. Create template as a tempfile and use it
+            # instead but since includes are possible (though not likely), we have to do
+            # this in an isolated tmpdir container to prevent inadvertent reading of
+            # includes not meant to be read.
+            tmpdir = stack.enter_context(tempfile.TemporaryDirectory(prefix=__name__))
+
+            _, tmpfile = tempfile.mkstemp(prefix="stdin-", dir=tmpdir, text=True)
+
+            with open(tmpfile, "a+") as f:
+                f.write(stdin.read())
+
+            # Yes, even if user specifies multiple other templates, the fact he
+            # specified '-' just once means we only deal with one template i.e. '-'
+            args.template = [tmpfile]
+            job_keys = {tmpfile: "-"}
+
+        if engine is None:
+            engine = new_engine(args.undefined_variables_mode, **engine_settings(args))
+
+        # markdown() conversions are kept along with the renders
+        md.disk_cache, md.cache_key = engine.cache, args.cache_key
+        stack.callback(setattr, md, "disk_cache", None)
+        stack.callback(setattr, md, "cache_key", None)
+
+        if args.check:
+            drifted = check.check(
+                engine, args.template, context, output=args.output, output_dir=args.output_dir
+            )
+            for summary in drifted:
+                out(summary)
+            if drifted:
+                print(f"{len(drifted)} output(s) out of date", file=sys.stderr)
+            sys.exit(1 if drifted else 0)
+
+        # the rendered text of each template when writing to --output
+        texts = dict.fromkeys(args.template, "")
+
+        def render(template, context):
+            """Render a template to its sink, returning its hash and journal fields"""
+            digest, text = hashlib.sha256(), ""
+            for block in engine.render(
+                template=template, context=context, output_dir=args.output_dir
+            ):
+                digest.update(block.encode("utf-8"))
+                if args.output or args.output_dir:
+                    text += block + "\n"
+                else:
+                    out(block)
+            fields = {}
+            if args.output_dir:
+                fields["output"] = sinks.output_path(args.output_dir, template)
+                fields["output_sha256"] = hashlib.sha256(text.encode("utf-8")).hexdigest()
+                sinks.write_if_changed(fields["output"], text)
+            elif args.output:
+                texts[template] = text
+            return digest.hexdigest(), fields
+
+        if args.watch:
+
+            def rerender(template, context):
+                render(template, context)
+                if args.output:
+                    sinks.write_if_changed(args.output, "".join(texts.values()))
+
+            return watch.Watch(
+                args.template,
+                vars_files=lambda: vars_files(args),
+                context=lambda: read_vars(args, environ),
+                dependencies=engine.dependencies,
+                render=rerender,
+                interval=args.watch_interval,
+            ).run()
+
+        journal = stack.enter_context(Journal(args.journal)) if args.journal else None
+        if journal and not args.resume:
+            # entries of an earlier run are only to be trusted by --resume
+            journal.reset()
+        completed = journal.completed() if args.resume else {}
+
+        rendered = {}
+        for template in args.template:
+            job = job_keys[template]
+            entry = completed.get(job)
+            inputs = engine.inputs(template, context) if journal else None
+            # templates changed since and outputs removed or edited since are rendered again
+            if (
+                entry
+                and inputs is not None
+                and entry.get("inputs") == inputs
+                and sinks.file_sha256(entry["output"]) == entry["output_sha256"]
+            ):
+                rendered[job] = entry["sha256"]
+                continue
+            rendered[job], fields = render(template, context)
+            if journal:
+                journal.record(job, rendered[job], inputs=inputs, **fields)
+
+        if args.output:
+            sinks.write_if_changed(args.output, "".join(texts.values()))
+
+    if args.shard_manifest:
+        index, count = args.shard or (0, 1)
+        shard.write_manifest(args.shard_manifest, index, count, rendered)
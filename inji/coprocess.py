@@ -0,0 +1,177 @@
+# Run commands through long-lived shells instead of spawning each
+#
+# With `--coprocesses N`, run() and the other globals running commands hand
+# them to one of at most N shells started once for the whole invocation,
+# rather than to a new subprocess from inji each time. Commands are written
+# to the shell properly quoted, their stdout read back up to a marker line
+# carrying the exit status. Templates calling run() hundreds of times in
+# loops no longer pay for spawning a process from a large python process
+# each time - the shell forks itself (cheaply) for external commands and
+# not at all for the builtins known to behave like their binaries.
+#
+# Commands run with stdin from /dev/null, in the current directory of inji
+# and with the environment inji had when the shells were started. Processes
+# forked off (mode="processes" loops, --check workers) start shells of their
+# own rather than share those of their parent.
+
+import os
+import queue
+import shlex
+import signal
+import subprocess
+import threading
+import uuid
+import weakref
+
+# builtins that behave as their binaries do and can't change the shell's state
+BUILTINS = frozenset({"[", "false", "printf", "test", "true"})
+
+
+class Coprocess:
+    """A shell commands are written to and their output read back from"""
+
+    def __init__(self, shell="/bin/sh"):
+        self.marker = f"inji-{uuid.uuid4().hex}".encode()
+        # in a session of its own so that it can be killed along with what it runs
+        self.process = subprocess.Popen(
+            [shell], stdin=subprocess.PIPE, stdout=subprocess.PIPE, start_new_session=True
+        )
+        self.cwd = os.getcwd()
+        self.timed_out = False
+
+    @property
+    def alive(self):
+        return not self.timed_out and self.process.poll() is None
+
+    def kill(self):
+        self.timed_out = True
+        try:
+            os.killpg(self.process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+    def run(self, argv, timeout=None):
+        """Return the stdout of argv, raising as subprocess.check_output() does"""
+        script = []
+        cwd = os.getcwd()
+        if cwd != self.cwd:
+            script.append(f"cd -- {shlex.quote(cwd)}")
+            self.cwd = cwd
+        command = shlex.join(argv)
+        # a subshell keeps the likes of cd, exit or export from affecting later commands
+        script.append(
+            f"{command} </dev/null" if argv[0] in BUILTINS else f"(exec {command}) </dev/null"
+        )
+        script.append(f"printf '\\n%s %d\\n' {self.marker.decode()} $?\n")
+        try:
+            self.process.stdin.write("\n".join(script).encode())
+            self.process.stdin.flush()
+        except BrokenPipeError:
+            raise ChildProcessError("The shell running commands has exited") from None
+
+        # the shell is killed when the command takes too long
+        timer = threading.Timer(timeout, self.kill) if timeout is not None else None
+        if timer is not None:
+            timer.start()
+        lines = []
+        try:
+            while True:
+                line = self.process.stdout.readline()
+                if not line:
+                    if self.timed_out:
+                        raise subprocess.TimeoutExpired(argv, timeout, b"".join(lines))
+                    raise ChildProcessError("The shell running commands has exited")
+                if line.startswith(self.marker + b" "):
+                    status = int(line[len(self.marker) + 1 :])
+                    break
+                lines.append(line)
+        finally:
+            if timer is not None:
+                timer.cancel()
+        output = b"".join(lines)[:-1]  # the newline printed before the marker
+
+        if status == 127 and argv[0] not in BUILTINS:
+            raise FileNotFoundError(2, "No such file or directory", argv[0])
+        if status == 126 and argv[0] not in BUILTINS:
+            raise PermissionError(13, "Permission denied", argv[0])
+        if status:
+            raise subprocess.CalledProcessError(status, argv, output)
+        return output
+
+    def close(self):
+        if self.process.poll() is None:
+            self.process.stdin.close()
+        self.process.wait()
+        self.process.stdout.close()
+
+
+class Pool:
+    """At most size shells, started as they are needed, commands are spread over"""
+
+    def __init__(self, size=1, shell="/bin/sh"):
+        self.shell = shell
+        self.size = size
+        self._inherited = []
+        self._reset()
+        _pools.add(self)
+
+    def _reset(self):
+        self.coprocesses = []
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._lock = threading.Lock()
+
+    def _forked(self):
+        # the shells (and locks) are the parent's - writing to them would
+        # interleave with its commands and read its output. They are kept
+        # referenced and untouched as closing them would flush what the parent
+        # may have been writing when it forked.
+        self._inherited.extend(self.coprocesses)
+        self._reset()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _acquire(self):
+        self._slots.acquire()
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            coprocess = Coprocess(self.shell)
+            with self._lock:
+                self.coprocesses.append(coprocess)
+            return coprocess
+
+    def _release(self, coprocess):
+        if coprocess.alive:
+            self._idle.put(coprocess)
+        self._slots.release()
+
+    def run(self, argv, timeout=None):
+        """Return the stdout of argv run on one of the shells"""
+        coprocess = self._acquire()
+        try:
+            return coprocess.run(argv, timeout=timeout)
+        finally:
+            self._release(coprocess)
+
+    def close(self):
+        with self._lock:
+            coprocesses, self.coprocesses = self.coprocesses, []
+        for coprocess in coprocesses:
+            coprocess.close()
+
+
+# Pools of this process, started afresh in forked children
+_pools = weakref.WeakSet()
+
+
+def _after_fork():
+    for pool in list(_pools):
+        pool._forked()
+
+
+os.register_at_fork(after_in_child=_after_fork)
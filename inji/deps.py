@@ -0,0 +1,223 @@
+# Index of the include/import/extends edges between templates under a root
+#
+# The index is kept in a JSON file and brought up to date incrementally -
+# only templates whose mtime or size changed since they were last indexed
+# are parsed again. Template names are paths relative to the root, as they
+# are referred to by a FileSystemLoader rooted there.
+
+import argparse
+import fnmatch
+import json
+import os
+import posixpath
+import sys
+import tempfile
+
+from jinja2 import meta
+
+INDEX_FILE = ".inji-deps.json"
+VERSION = 1
+
+
+def _name(path):
+    return posixpath.normpath(path.replace(os.sep, "/"))
+
+
+class DependencyIndex:
+    def __init__(self, root, environment, path=None, patterns=("*",)):
+        self.root = os.path.abspath(root)
+        self.environment = environment
+        self.path = path or os.path.join(self.root, INDEX_FILE)
+        self.patterns = list(patterns)
+        self.templates = {}
+        self.load()
+
+    def load(self):
+        """Load the index from disk, if there is one matching our settings"""
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return
+        if index.get("version") == VERSION and index.get("patterns") == self.patterns:
+            self.templates = index["templates"]
+
+    def save(self):
+        """Atomically write the index to disk"""
+        index = dict(version=VERSION, patterns=self.patterns, templates=self.templates)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(self.path), prefix=".inji-deps-")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(index, f, indent=1, sort_keys=True)
+            os.replace(tmp, self.path)
+        except BaseException:
+            os.remove(tmp)
+            raise
+
+    def scan(self):
+        """Yield the name and path of every template under the root"""
+        index = os.path.abspath(self.path)
+        for root, dirnames, filenames in os.walk(self.root):
+            dirnames[:] = sorted(d for d in dirnames if not d.startswith("."))
+            for filename in sorted(filenames):
+                path = os.path.join(root, filename)
+                if path == index:
+                    continue
+                if any(fnmatch.fnmatch(filename, p) for p in self.patterns):
+                    yield _name(os.path.relpath(path, self.root)), path
+
+    def references(self, path):
+        """Return the names a template refers to and whether some are dynamic"""
+        try:
+            with open(path, encoding="utf-8") as f:
+                ast = self.environment.parse(f.read())
+        except Exception:
+            # not a template jinja2 can make sense of - it refers to nothing
+            return [], False
+        refs = list(meta.find_referenced_templates(ast))
+        return sorted({_name(r) for r in refs if r is not None}), None in refs
+
+    def update(self):
+        """Bring the index up to date, returning the names of changed templates"""
+        changed, seen = set(), set()
+        for name, path in self.scan():
+            seen.add(name)
+            st = os.stat(path)
+            stamp = [st.st_mtime_ns, st.st_size]
+            entry = self.templates.get(name)
+            if entry is not None and entry["stamp"] == stamp:
+                continue
+            refs, dynamic = self.references(path)
+            self.templates[name] = dict(stamp=stamp, refs=refs, dynamic=dynamic)
+            changed.add(name)
+        for name in set(self.templates) - seen:
+            del self.templates[name]
+            changed.add(name)
+        if changed or not os.path.exists(self.path):
+            self.save()
+        return changed
+
+    def name(self, path):
+        """Return the template name of a path (relative to the cwd or absolute)"""
+        return _name(os.path.relpath(os.path.abspath(path), self.root))
+
+    def dependencies(self, name):
+        """Return all the templates name includes, imports or extends (recursively)"""
+        ret, todo = set(), [name]
+        while todo:
+            for ref in self.templates.get(todo.pop(), {}).get("refs", []):
+                if ref not in ret:
+                    ret.add(ref)
+                    todo.append(ref)
+        return ret
+
+    def reverse(self):
+        """Return a dict of template name to the names of templates referring to it"""
+        ret = {}
+        for name, entry in self.templates.items():
+            for ref in entry["refs"]:
+                ret.setdefault(ref, set()).add(name)
+        return ret
+
+    def dependants(self, name):
+        """Return all the templates that include, import or extend name (recursively)"""
+        reverse = self.reverse()
+        ret, todo = set(), [name]
+        while todo:
+            for referrer in reverse.get(todo.pop(), ()):
+                if referrer not in ret:
+                    ret.add(referrer)
+                    todo.append(referrer)
+        return ret
+
+    def toplevel(self):
+        """Return the templates no other template refers to"""
+        return set(self.templates) - set(self.reverse())
+
+    def dynamic(self):
+        """Return the templates referring to others by names only known when rendering"""
+        return {name for name, entry in self.templates.items() if entry.get("dynamic")}
+
+    def affected(self, *names):
+        """Return the top-level templates that need rendering when names change
+
+        Templates with dynamic references (e.g. {% include name %}) could be
+        referring to any template, so they (and the templates made up of them)
+        are taken to be affected by any change.
+        """
+        toplevel = self.toplevel()
+        ret = set()
+        if names:
+            names = set(names) | self.dynamic()
+        for name in names:
+            ret |= ({name} | self.dependants(name)) & toplevel
+        return ret
+
+
+def deps_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="inji deps", description="inji - index template dependencies"
+    )
+
+    parser.add_argument(
+        "root",
+        nargs="?",
+        action="store",
+        default=".",
+        help="/path/to/templates/ (defaults to .)",
+    )
+
+    parser.add_argument(
+        "--index",
+        action="store",
+        required=False,
+        dest="index",
+        default=None,
+        metavar="FILE",
+        help=f"where to keep the index (defaults to ROOT/{INDEX_FILE})",
+    )
+
+    parser.add_argument(
+        "--pattern",
+        action="append",
+        required=False,
+        dest="patterns",
+        default=[],
+        help="only index files matching the glob (defaults to all files)",
+    )
+
+    parser.add_argument(
+        "--affected",
+        action="append",
+        required=False,
+        dest="affected",
+        default=[],
+        metavar="PATH",
+        help="print the top-level templates affected by a change to PATH",
+    )
+
+    parser.add_argument(
+        "--json",
+        action="store_true",
+        required=False,
+        dest="json",
+        default=False,
+        help="print the whole index as JSON",
+    )
+
+    return parser.parse_args(argv)
+
+
+def main(args, engine):
+    index = engine.dependency_index(args.root, path=args.index, patterns=args.patterns or ["*"])
+
+    if args.affected:
+        for name in sorted(index.affected(*(index.name(p) for p in args.affected))):
+            print(name)
+    elif args.json:
+        json.dump(index.templates, sys.stdout, indent=2, sort_keys=True)
+        print()
+    else:
+        for name, entry in sorted(index.templates.items()):
+            print(f"{name}: {' '.join(entry['refs'])}".rstrip())
+    return 0
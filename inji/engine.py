@@ -1,29 +1,63 @@
+import hashlib
 import inspect
+import json
 import logging
+import os
 import sys
 
+import jinja2
 from jinja2 import (
     DebugUndefined,
-    Environment,
     FileSystemLoader,
     StrictUndefined,
     Undefined,
     make_logging_undefined,
+    meta,
+    nodes,
 )
-from jinja2.exceptions import UndefinedError
+from jinja2.exceptions import TemplateNotFound, TemplateSyntaxError, UndefinedError
 
-from . import filters, globals, tests, utils
+from . import cache as cache_module
+from . import deps, filters, globals, memo, prefetch, sinks, tests, timeouts, utils
 
 
 def get_symbols(mod):
     return {k: v for k, v in inspect.getmembers(mod) if not (k.startswith("_"))}
 
 
+class DeadlineEnvironment(jinja2.Environment):
+    """A jinja2 environment whose {% for %} loops keep to the deadline of the render
+
+    Loops producing no output would otherwise run to completion before the
+    deadline is looked at between chunks of output.
+    """
+
+    deadline_filter = "_inji_deadline"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.filters[self.deadline_filter] = timeouts.checked
+
+    def _parse(self, source, name, filename):
+        ast = super()._parse(source, name, filename)
+        for loop in ast.find_all(nodes.For):
+            loop.iter = nodes.Filter(
+                loop.iter, self.deadline_filter, [], [], None, None, lineno=loop.iter.lineno
+            )
+        return ast
+
+
 class TemplateEngine:
     def __init__(
         self,
         undefined_variables_mode_behaviour="strict",
         j2_env_params=None,
+        output_dir=".",
+        cache=None,
+        cache_key=None,
+        memoize_filters=False,
+        prefetch=False,
+        deadline=None,
     ):
         if j2_env_params is None:
             j2_env_params = {}
@@ -39,9 +73,11 @@ class TemplateEngine:
         # its activities
         root = logging.getLogger(__name__)
         root.setLevel(logging.DEBUG)
-        handler = logging.StreamHandler(sys.stderr)
-        handler.setFormatter(logging.Formatter("%(name)s %(levelname)s: %(message)s"))
-        root.addHandler(handler)
+        # once per process, however many engines there are (e.g. one per strict mode)
+        if not root.handlers:
+            handler = logging.StreamHandler(sys.stderr)
+            handler.setFormatter(logging.Formatter("%(name)s %(levelname)s: %(message)s"))
+            root.addHandler(handler)
 
         UndefinedHandler = make_logging_undefined(logger=root, base=UndefinedHandler)
 
@@ -54,17 +90,276 @@ class TemplateEngine:
                 "jinja2.ext.i18n",
                 "jinja2.ext.do",
                 "jinja2.ext.loopcontrols",
+                "inji.extensions.OutputExtension",
+                "inji.extensions.ParallelExtension",
+                "inji.extensions.FragmentCacheExtension",
             ],
         )
 
         self.j2_env_params = j2_env_params
+        self.output_dir = output_dir
+
+        # renders are cached in cache (a cache.DiskCache) under fingerprints
+        # that cache_key is part of, which makes impure templates cacheable
+        self.cache = cache
+        self.cache_key = cache_key
+        self._settings = cache_module.digest(
+            cache_module.VERSION,
+            m,
+            {k: v for k, v in j2_env_params.items() if k not in ("loader", "undefined")},
+        )
+        self._analyses = memo.LRU(maxsize=4096)
+
+        # start external calls with arguments known up front before rendering
+        self.prefetch = prefetch
+
+        # seconds each render (and the calls it makes) may take
+        self.deadline = deadline
+
+        # (path, mtime, size) of templates known to contain jinja2 syntax
+        self._dynamic = memo.LRU(maxsize=4096)
+        # bounded as long-lived engines (inji serve, --worker, inji http) see a
+        # new directory for every template read from stdin
+        self._environments = memo.LRU(maxsize=64)
+        self.cache_stats = self._environments.stats
 
         self.filters = get_symbols(filters)
+        if memoize_filters:
+            # pure filters keep their results for the life of the engine
+            self.filters = memo.memoize_filters(self.filters)
         self.tests = get_symbols(tests)
         self.globals = get_symbols(globals)
 
-    def render(self, template, context):
-        """Render the template"""
+    def static_source(self, template):
+        """Return the contents of template if it has no jinja2 syntax, else None
+
+        Such templates render to their own contents (less the trailing newline
+        jinja2 drops) so there is no point loading, compiling and running them.
+        """
+        p = self.j2_env_params
+        if (
+            p.get("line_statement_prefix")
+            or p.get("line_comment_prefix")
+            or p.get("keep_trailing_newline")
+            or p.get("newline_sequence", "\n") != "\n"
+        ):
+            return None
+
+        try:
+            st = os.stat(template)
+        except OSError:
+            return None
+        key = (template, st.st_mtime_ns, st.st_size)
+        if self._dynamic.get(key):
+            return None
+
+        with open(template, "rb") as f:
+            source = f.read()
+        delimiters = (
+            p.get("block_start_string", "{%"),
+            p.get("variable_start_string", "{{"),
+            p.get("comment_start_string", "{#"),
+        )
+        # jinja2 also normalises newlines so leave anything with a \r to it
+        if b"\r" in source or any(d.encode("utf-8") in source for d in delimiters):
+            self._dynamic.set(key, True)
+            return None
+
+        source = source.decode("utf-8")
+        return source[:-1] if source.endswith("\n") else source
+
+    def environment(self, rootdir):
+        """Return the jinja2 environment for templates in rootdir
+
+        The environments of the directories used most recently are kept so
+        that compiled templates are reused across renders - jinja2 recompiles
+        any that have changed on disk since (auto_reload).
+        """
+        if "loader" in self.j2_env_params:
+            rootdir = None
+        j2_env = self._environments.get(rootdir)
+        if j2_env is None:
+            params = dict(self.j2_env_params)
+            params.setdefault("loader", FileSystemLoader(rootdir))
+            j2_env = DeadlineEnvironment(**params)
+
+            j2_env.globals.update(self.globals)
+            j2_env.filters.update(self.filters)
+            j2_env.tests.update(self.tests)
+            j2_env.fragment_cache = self.cache
+            self._environments.set(rootdir, j2_env)
+        return j2_env
+
+    def dependencies(self, template):
+        """Return the files template is made up of
+
+        That is the template itself and everything it includes, imports or
+        extends, recursively. References to templates by a name that is only
+        known at render time (e.g. {% include name %}) could be to any of them,
+        so such templates are made up of every file (and the directories of
+        them, to see new files in) their loader finds templates in.
+        """
+        j2_env = self.environment(utils.dirname(template))
+        files = {os.path.abspath(template)}
+        names, seen, dynamic = [utils.basename(template)], set(), False
+        while names:
+            name = names.pop()
+            if name in seen:
+                continue
+            seen.add(name)
+            try:
+                source, filename, _ = j2_env.loader.get_source(j2_env, name)
+                if filename:
+                    files.add(os.path.abspath(filename))
+                refs = meta.find_referenced_templates(j2_env.parse(source))
+            except (TemplateNotFound, TemplateSyntaxError):
+                continue
+            for ref in refs:
+                if ref is None:
+                    dynamic = True
+                else:
+                    names.append(ref)
+        if dynamic:
+            files |= self._loader_files(j2_env)
+        return files
+
+    @staticmethod
+    def _loader_files(j2_env):
+        """Return the files templates of j2_env are loaded from and their directories"""
+        try:
+            names = j2_env.list_templates()
+        except TypeError:
+            # loaders that can't list their templates
+            return set()
+        ret = set()
+        for name in names:
+            try:
+                _, filename, _ = j2_env.loader.get_source(j2_env, name)
+            except TemplateNotFound:
+                continue
+            if filename:
+                ret |= {os.path.abspath(filename), os.path.dirname(os.path.abspath(filename))}
+        return ret
+
+    def _analysis(self, j2_env, name):
+        """Return the source hash and cache.analyse() of the template name"""
+        source, _, _ = j2_env.loader.get_source(j2_env, name)
+        source_hash = hashlib.sha256(source.encode("utf-8")).hexdigest()
+        key = cache_module.digest("analysis", self._settings, source_hash)
+        analysis = self._analyses.get(key)
+        if analysis is None and self.cache is not None:
+            text = self.cache.get(key)
+            analysis = json.loads(text) if text is not None else None
+        if analysis is None:
+            analysis = cache_module.analyse(j2_env.parse(source))
+            if self.cache is not None:
+                self.cache.set(key, json.dumps(analysis))
+        self._analyses.set(key, analysis)
+        return source_hash, analysis
+
+    def _closure(self, template):
+        """Return the source hashes and analyses of template and those it is made up of
+
+        That is None when the template can't be loaded or parsed, or includes
+        templates by names known only at render time.
+        """
+        j2_env = self.environment(utils.dirname(template))
+        sources, analyses = {}, []
+        todo = [utils.basename(template)]
+        while todo:
+            name = todo.pop()
+            if name in sources:
+                continue
+            try:
+                sources[name], analysis = self._analysis(j2_env, name)
+            except (TemplateNotFound, TemplateSyntaxError):
+                return None
+            if analysis["dynamic"]:
+                return None
+            analyses.append(analysis)
+            todo.extend(analysis["refs"])
+        return sources, analyses
+
+    def _values(self, analyses, context):
+        """Return the digests of the context values analyses refer to"""
+        names = set().union(*(a["names"] for a in analyses))
+        return {n: cache_module.digest(context[n]) if n in context else None for n in names}
+
+    def fingerprint(self, template, context):
+        """Return the key the render of template with context is cached under
+
+        That is None when the render can't be cached: the template (or one it
+        is made up of) writes files, includes templates by names known only
+        at render time or - without a cache_key - calls impure globals, or it
+        refers to context values that can't be fingerprinted.
+        """
+        closure = self._closure(template)
+        if closure is None:
+            return None
+        sources, analyses = closure
+        if any(a["writes"] for a in analyses):
+            return None
+        if self.cache_key is None and any(a["impure"] for a in analyses):
+            return None
+        try:
+            values = self._values(analyses, context)
+        except TypeError:
+            # values that can't be told apart can't be keyed on
+            return None
+        return cache_module.digest(self._settings, self.cache_key, sources, values)
+
+    def inputs(self, template, context):
+        """Return a digest of the sources of template and the context values it reads
+
+        Unlike fingerprint() this doesn't vouch for the render being
+        repeatable, only for nothing it was rendered from having changed -
+        None when that can't be told.
+        """
+        closure = self._closure(template)
+        if closure is None:
+            return None
+        sources, analyses = closure
+        try:
+            return cache_module.digest(self._settings, sources, self._values(analyses, context))
+        except TypeError:
+            return None
+
+    def dependency_index(self, root, path=None, patterns=("*",)):
+        """Return the up to date index of dependencies between templates under root"""
+        root = os.path.abspath(root)
+        index = deps.DependencyIndex(root, self.environment(root), path=path, patterns=patterns)
+        index.update()
+        return index
+
+    def _render_within(self, template, context):
+        """Render template, stopping it where it is once the deadline has passed"""
+        chunks = []
+        generator = template.generate(context)
+        for chunk in generator:
+            chunks.append(chunk)
+            if timeouts.expired():
+                generator.throw(timeouts.exceeded("render", self.deadline))
+        return template.environment.concat(chunks)
+
+    def render(self, template, context, output_dir=None, writer=None):
+        """Render the template
+
+        Files emitted by {% output %} blocks are written relative to output_dir
+        (defaulting to that of the engine) or handed to writer, which the
+        caller then has to close.
+        """
+
+        source = self.static_source(template)
+        if source is not None:
+            yield source
+            return
+
+        key = self.fingerprint(template, context) if self.cache is not None else None
+        if key is not None:
+            output = self.cache.get(key)
+            if output is not None:
+                yield output
+                return
 
         # We don't assume that includes and other sourceables reside relative
         # to the current directory but instead relative to the "master" template
@@ -72,17 +367,40 @@ class TemplateEngine:
         # This is because.
         # 1. We process template from stdin in temporary directories
         # 2. We should be free to change the process CWD and not break rendering
-        rootdir = utils.dirname(template)
-
-        self.j2_env_params.setdefault("loader", FileSystemLoader(rootdir))
-        j2_env = Environment(**self.j2_env_params)
-
-        j2_env.globals.update(self.globals)
-        j2_env.filters.update(self.filters)
-        j2_env.tests.update(self.tests)
+        j2_env = self.environment(utils.dirname(template))
 
+        # Files emitted by {% output %} blocks are written as the render goes
+        # and all of them are on disk by the time the render is yielded.
+        owned = writer is None
+        if owned:
+            writer = sinks.Writer(root=output_dir or self.output_dir)
+        token = sinks.writer.set(writer)
+        memo_token = memo.render_memo.set(memo.SingleFlight())
+        deadline_token = timeouts.start(self.deadline)
+        prefetched = None
         try:
             template = utils.basename(template)
-            yield j2_env.get_template(template).render(context)
+            if self.prefetch:
+                calls = prefetch.calls(prefetch.closure(j2_env, template), context)
+                if calls:
+                    prefetched = prefetch.Prefetch(self.globals, calls)
+                    context = {**context, **prefetched.context()}
+            if timeouts.deadline.get() is None:
+                output = j2_env.get_template(template).render(context)
+            else:
+                output = self._render_within(j2_env.get_template(template), context)
         except UndefinedError as e:
             raise UndefinedError(f"variable {str(e)} in template '{template}'") from e
+        except timeouts.Timeout as e:
+            raise timeouts.Timeout(f"{e}{timeouts.locate(e.__traceback__)}") from None
+        finally:
+            if prefetched is not None:
+                prefetched.close()
+            timeouts.deadline.reset(deadline_token)
+            memo.render_memo.reset(memo_token)
+            sinks.writer.reset(token)
+            if owned:
+                writer.close()
+        if key is not None:
+            self.cache.set(key, output)
+        yield output
@@ -0,0 +1,308 @@
+# Custom jinja2 tags
+# https://jinja.palletsprojects.com/en/3.1.x/extensions/#writing-extensions
+
+import collections
+import contextvars
+import copy
+import json
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from jinja2 import meta, nodes
+from jinja2.exceptions import TemplateRuntimeError, TemplateSyntaxError
+from jinja2.ext import Extension
+from jinja2.runtime import Namespace, Undefined
+from markupsafe import Markup
+
+from . import cache, sinks
+
+
+def _interpolated(environment, node):
+    """Compile a string literal holding {{ }} expressions into an expression
+
+    This allows {% output "path/{{ name }}.yaml" %} to refer to loop and
+    other local variables as if the path were written inline.
+    """
+    if not (isinstance(node, nodes.Const) and isinstance(node.value, str)):
+        return node
+    if environment.variable_start_string not in node.value:
+        return node
+
+    parts = []
+    for child in environment.parse(node.value).body:
+        if not isinstance(child, nodes.Output):
+            raise TemplateSyntaxError(
+                f"only {{{{ expressions }}}} are allowed in '{node.value}'", node.lineno
+            )
+        for n in child.nodes:
+            parts.append(nodes.Const(n.data) if isinstance(n, nodes.TemplateData) else n)
+    return nodes.Concat(parts).set_lineno(node.lineno)
+
+
+class OutputExtension(Extension):
+    """
+    Render the body of the block into a file instead of the template output
+    e.g. {% output "hosts/{{ host.name }}.yaml" %}...{% endoutput %}
+    """
+
+    tags = {"output"}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        path = _interpolated(self.environment, parser.parse_expression())
+        body = parser.parse_statements(("name:endoutput",), drop_needle=True)
+        return nodes.CallBlock(self.call_method("_write", [path]), [], [], body).set_lineno(lineno)
+
+    def _write(self, path, caller):
+        writer = sinks.writer.get()
+        if writer is None:
+            raise RuntimeError(f"no writer to render '{path}' to")
+        writer.submit(path, caller())
+        return ""
+
+
+class ParallelLoop:
+    """The loop.* variables of an iteration of a {% parallel for %}"""
+
+    def __init__(self, items, index0, undefined):
+        self.length = len(items)
+        self.index0 = index0
+        self.index = index0 + 1
+        self.revindex0 = self.length - self.index
+        self.revindex = self.length - index0
+        self.first = index0 == 0
+        self.last = index0 == self.length - 1
+        self.depth, self.depth0 = 1, 0
+        self.previtem = items[index0 - 1] if index0 > 0 else undefined("there is no previous item")
+        self.nextitem = items[index0 + 1] if not self.last else undefined("there is no next item")
+
+    def cycle(self, *args):
+        return args[self.index0 % len(args)]
+
+    def changed(self, *value):
+        # what earlier iterations passed it isn't known - they run alongside this one
+        raise TemplateRuntimeError(
+            "loop.changed() is not available in {% parallel for %} loops, "
+            "compare with loop.previtem instead"
+        )
+
+
+# The loop a forked worker process is rendering iterations of - handed over
+# fork() to the pool's initializer as neither jinja2 macros nor contexts can
+# be pickled.
+_forked_loop = None
+
+
+def _init_forked(loop):
+    global _forked_loop
+    _forked_loop = loop
+
+
+def _render_forked(index0):
+    caller, items, unpack, undefined, outer, root = _forked_loop
+    with sinks.Writer(root=root) as writer:
+        sinks.writer.set(writer)
+        return _iteration(caller, items, index0, unpack, undefined, outer)
+
+
+def _isolated(value):
+    """Return a copy of value for an iteration to read and change on its own"""
+    if isinstance(value, Undefined):
+        return value
+    if isinstance(value, Namespace):
+        # namespace() hides its attributes from copy, as from templates
+        return Namespace(copy.deepcopy(value._Namespace__attrs))
+    try:
+        return copy.deepcopy(value)
+    except (TypeError, copy.Error):
+        # e.g. locks or open files, which can only be shared
+        return value
+
+
+def _iteration(caller, items, index0, unpack, undefined, outer):
+    item = items[index0]
+    args = tuple(item) if unpack else (item,)
+    if unpack and len(args) != unpack:
+        raise ValueError(f"cannot unpack {item!r} into {unpack} loop variables")
+    outer = [_isolated(v) for v in outer]
+    return caller(*args, ParallelLoop(items, index0, undefined), *outer)
+
+
+class ParallelExtension(Extension):
+    """
+    Render the iterations of a for loop concurrently, joined in order
+    e.g. {% parallel for svc in services workers=8 %}{{ GET(svc.url) }}{% endparallel %}
+
+    Iterations run on threads by default, which suits bodies waiting on
+    run()/GET(). mode="processes" forks worker processes instead, for CPU
+    heavy bodies. Either way iterations work on their own copies of the
+    values they read from outside the loop, so nothing one assigns or
+    mutates is seen by the others or after the loop, and loop.changed()
+    isn't available.
+    """
+
+    tags = {"parallel"}
+    options = ("workers", "mode")
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        parser.stream.expect("name:for")
+        target = parser.parse_assign_target(extra_end_rules=("name:in",))
+        parser.stream.expect("name:in")
+        iter = parser.parse_tuple(
+            with_condexpr=False, extra_end_rules=tuple(f"name:{o}" for o in self.options)
+        )
+
+        options = {"workers": nodes.Const(None), "mode": nodes.Const("threads")}
+        while parser.stream.current.test_any(*(f"name:{o}" for o in self.options)):
+            key = next(parser.stream).value
+            parser.stream.expect("assign")
+            options[key] = parser.parse_expression()
+
+        if isinstance(target, nodes.Tuple):
+            if not all(isinstance(n, nodes.Name) for n in target.items):
+                parser.fail("nested loop variables are not supported", lineno)
+            names, unpack = [n.name for n in target.items], len(target.items)
+        else:
+            names, unpack = [target.name], 0
+
+        body = parser.parse_statements(("name:endparallel",), drop_needle=True)
+        # what the body reads from outside of it is handed to every iteration
+        # as parameters of its own, rather than read from the shared frame
+        outer = sorted(
+            meta.find_undeclared_variables(nodes.Template(body).set_environment(self.environment))
+            - {*names, "loop"}
+        )
+        call = self.call_method(
+            "_loop",
+            [
+                iter,
+                options["workers"],
+                options["mode"],
+                nodes.Const(unpack),
+                nodes.List([nodes.Name(n, "load") for n in outer]),
+            ],
+        )
+        params = [nodes.Name(n, "param") for n in [*names, "loop", *outer]]
+        return nodes.CallBlock(call, params, [], body).set_lineno(lineno)
+
+    def _loop(self, items, workers, mode, unpack, outer, caller):
+        items = list(items)
+        undefined = self.environment.undefined
+        workers = workers or os.cpu_count() or 1
+        if mode == "threads":
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                futures = [
+                    # every thread needs its own copy of the context (e.g. sinks.writer)
+                    pool.submit(
+                        contextvars.copy_context().run,
+                        _iteration,
+                        caller,
+                        items,
+                        i,
+                        unpack,
+                        undefined,
+                        outer,
+                    )
+                    for i in range(len(items))
+                ]
+                results = [f.result() for f in futures]
+        elif mode == "processes":
+            writer = sinks.writer.get()
+            root = writer.root if writer else "."
+            # each loop's state goes to its own workers, not through a global
+            # other loops (on other threads of the http or worker servers) would see
+            loop = (caller, items, unpack, undefined, outer, root)
+            with multiprocessing.get_context("fork").Pool(
+                workers, initializer=_init_forked, initargs=(loop,)
+            ) as pool:
+                results = pool.map(_render_forked, range(len(items)))
+        else:
+            raise ValueError(f"mode must be 'threads' or 'processes', not '{mode}'")
+
+        if all(isinstance(r, Markup) for r in results):
+            return Markup("").join(results)
+        return "".join(results)
+
+
+class FragmentCacheExtension(Extension):
+    """
+    Cache the rendered body of the block, keyed by the key given and the
+    values of the variables the body reads
+    e.g. {% cache "changelog", ttl=600 %}{{ markdown("CHANGELOG.md") }}{% endcache %}
+
+    Fragments are kept in the environment's fragment_cache (a cache.DiskCache,
+    shared across processes) when it has one and in memory otherwise. They
+    expire after ttl seconds, if given.
+    """
+
+    tags = {"cache"}
+
+    # fragments kept in memory when there is no fragment_cache
+    max_entries = 1024
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        environment.extend(fragment_cache=None)
+        self._fragments = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        key = parser.parse_expression()
+        ttl = nodes.Const(None)
+        if parser.stream.skip_if("comma"):
+            parser.stream.expect("name:ttl")
+            parser.stream.expect("assign")
+            ttl = parser.parse_expression()
+        body = parser.parse_statements(("name:endcache",), drop_needle=True)
+
+        # what the body reads from outside of it is part of the key
+        names = meta.find_undeclared_variables(
+            nodes.Template(body).set_environment(self.environment)
+        )
+        values = nodes.Dict(
+            [nodes.Pair(nodes.Const(n), nodes.Name(n, "load")) for n in sorted(names)]
+        )
+        call = self.call_method("_cache", [key, ttl, values])
+        return nodes.CallBlock(call, [], [], body).set_lineno(lineno)
+
+    def _get(self, key):
+        store = self.environment.fragment_cache
+        if store is not None:
+            entry = store.get(key)
+            return json.loads(entry) if entry is not None else None
+        with self._lock:
+            entry = self._fragments.get(key)
+            if entry is not None:
+                self._fragments.move_to_end(key)
+        return entry
+
+    def _set(self, key, entry):
+        store = self.environment.fragment_cache
+        if store is not None:
+            return store.set(key, json.dumps(entry))
+        with self._lock:
+            self._fragments[key] = entry
+            while len(self._fragments) > self.max_entries:
+                self._fragments.popitem(last=False)
+
+    def _cache(self, key, ttl, values, caller):
+        try:
+            key = cache.digest("fragment", cache.VERSION, key, values)
+        except TypeError:
+            # values that can't be told apart can't be keyed on
+            return caller()
+        entry = self._get(key)
+        if entry is None or (entry["expires"] is not None and entry["expires"] < time.time()):
+            text = caller()
+            entry = dict(
+                text=str(text),
+                markup=isinstance(text, Markup),
+                expires=time.time() + ttl if ttl is not None else None,
+            )
+            self._set(key, entry)
+        return Markup(entry["text"]) if entry["markup"] else entry["text"]
@@ -0,0 +1,129 @@
+# Persistent cache of host and git facts across invocations
+#
+# With `--fact-cache DIR`, what globals like git_commit_id(), host_id() or
+# fqdn() return is kept for the TTL of the fact, or until what it is derived
+# from changes - the HEAD, refs and config of the git repository for git
+# facts, the boot for host facts - so that thousands of short inji runs on a
+# host don't fork the same commands and resolve the same names over again.
+# run() is only cached when given a TTL (e.g. --fact-ttl run=60), keyed by
+# the command and the current directory.
+
+import json
+import os
+import time
+
+from . import utils
+from .cache import DiskCache, digest
+from .git import git_dir
+
+# Seconds facts are kept for by default, those not listed are not cached
+TTLS = {
+    "fqdn": 300,
+    "git_branch": 3600,
+    "git_commit_id": 3600,
+    "git_remote_url": 3600,
+    "git_remote_url_http": 3600,
+    "git_tag": 3600,
+    "host_id": 86400,
+    "hostname": 3600,
+    "machine_id": 86400,
+    "os_release": 86400,
+}
+
+BOOT_ID = "/proc/sys/kernel/random/boot_id"
+
+# The FactCache globals go through, if any (--fact-cache)
+cache = None
+
+
+def _stamp(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_mtime_ns, st.st_size]
+
+
+def git_validator():
+    """Return what changes whenever HEAD, the refs or the config of the repository do"""
+    gitdir = git_dir()
+    if gitdir is None:
+        return [os.getcwd()]
+    try:
+        with open(os.path.join(gitdir, "HEAD"), encoding="utf-8") as f:
+            head = f.read().strip()
+    except OSError:
+        head = None
+    paths = ["HEAD", "packed-refs", "config", "refs/tags"]
+    if head and head.startswith("ref:"):
+        paths.append(head[len("ref:") :].strip())
+    return [gitdir, head] + [_stamp(os.path.join(gitdir, p)) for p in paths]
+
+
+def host_validator():
+    """Return what changes when the host is rebooted"""
+    try:
+        with open(BOOT_ID, encoding="utf-8") as f:
+            return [f.read().strip()]
+    except OSError:
+        return [None]
+
+
+VALIDATORS = {
+    "fqdn": host_validator,
+    "git_branch": git_validator,
+    "git_commit_id": git_validator,
+    "git_remote_url": git_validator,
+    "git_remote_url_http": git_validator,
+    "git_tag": git_validator,
+    "host_id": host_validator,
+    "hostname": host_validator,
+    "machine_id": host_validator,
+    "os_release": lambda: host_validator() + [_stamp("/etc/os-release")],
+    "run": lambda: [os.getcwd()],
+}
+
+
+class FactCache:
+    def __init__(self, directory, ttls=None, max_size=16 << 20):
+        """
+        directory   where facts are kept
+        ttls        seconds facts are kept for by name, over the defaults in TTLS
+        """
+        self.store = DiskCache(directory, max_size=max_size)
+        self.ttls = {**TTLS, **(ttls or {})}
+
+    def call(self, name, fn, *args, **kwargs):
+        """Return fn(*args, **kwargs), as cached for the fact name if still valid"""
+        ttl = self.ttls.get(name)
+        if not ttl:
+            return fn(*args, **kwargs)
+        try:
+            key = digest("fact", name, args, kwargs)
+        except TypeError:
+            return fn(*args, **kwargs)
+        validator = VALIDATORS.get(name, lambda: [])()
+        text = self.store.get(key)
+        if text is not None:
+            entry = json.loads(text)
+            if entry["validator"] == validator and entry["expires"] > time.time():
+                return entry["value"]
+        value = fn(*args, **kwargs)
+        entry = dict(value=value, validator=validator, expires=time.time() + ttl)
+        self.store.set(key, json.dumps(entry))
+        return value
+
+
+def cached(name, fn):
+    """Return fn going through the fact cache (when there is one) as the fact name"""
+
+    def fact(*args, **kwargs):
+        # cassettes record and replay the calls made for facts, which a fact
+        # served from the cache would keep from them
+        if cache is None or utils.cassette is not None:
+            return fn(*args, **kwargs)
+        return cache.call(name, fn, *args, **kwargs)
+
+    fact.__name__ = name
+    fact.__doc__ = fn.__doc__
+    return fact
@@ -0,0 +1,702 @@
+# Read git metadata in-process for the git_* globals
+#
+# HEAD, loose and packed refs, the config and the object database (loose
+# objects and v2 packs, deltas included) are read directly so that
+# git_branch(), git_commit_id(), git_tag() and git_remote_url() don't fork a
+# `git` per call. What they return matches the `git` commands they stand in
+# for; where that can't be vouched for (alternates, reftables, SHA-256
+# repositories, url.<base>.insteadOf rewrites, config includes, GIT_DIR and
+# friends in the environment, ..) Unsupported is raised and the caller runs
+# the command instead.
+
+import heapq
+import os
+import re
+import struct
+import zlib
+
+# Environment variables changing where or how git finds what it reads
+ENVIRONMENT = (
+    "GIT_ALTERNATE_OBJECT_DIRECTORIES",
+    "GIT_CEILING_DIRECTORIES",
+    "GIT_COMMON_DIR",
+    "GIT_CONFIG",
+    "GIT_DEFAULT_HASH",
+    "GIT_DIR",
+    "GIT_DISCOVERY_ACROSS_FILESYSTEM",
+    "GIT_NAMESPACE",
+    "GIT_NO_REPLACE_OBJECTS",
+    "GIT_OBJECT_DIRECTORY",
+    "GIT_REPLACE_REF_BASE",
+    "GIT_WORK_TREE",
+)
+
+# Refs kept per worktree rather than in the common directory
+PER_WORKTREE = ("HEAD", "refs/bisect/", "refs/rewritten/", "refs/worktree/")
+
+TYPES = {1: "commit", 2: "tree", 3: "blob", 4: "tag"}
+OFS_DELTA, REF_DELTA = 6, 7
+
+# How git log --pretty=format: placeholders are filled from a commit
+PLACEHOLDERS = {
+    "H": lambda repo, sha, c: sha,
+    "h": lambda repo, sha, c: repo.abbrev(sha),
+    "T": lambda repo, sha, c: c["tree"],
+    "t": lambda repo, sha, c: repo.abbrev(c["tree"]),
+    "P": lambda repo, sha, c: " ".join(c["parents"]),
+    "p": lambda repo, sha, c: " ".join(repo.abbrev(p) for p in c["parents"]),
+    "an": lambda repo, sha, c: _ident(c["author"])[0],
+    "ae": lambda repo, sha, c: _ident(c["author"])[1],
+    "at": lambda repo, sha, c: str(_ident(c["author"])[2]),
+    "cn": lambda repo, sha, c: _ident(c["committer"])[0],
+    "ce": lambda repo, sha, c: _ident(c["committer"])[1],
+    "ct": lambda repo, sha, c: str(_ident(c["committer"])[2]),
+    "s": lambda repo, sha, c: _subject(c["message"]),
+    "%": lambda repo, sha, c: "%",
+}
+
+_SECTION = re.compile(r'\s*\[\s*([-.\w]+)(?:\s+"((?:[^"\\]|\\.)*)")?\s*\]')
+_KEY = re.compile(r"\s*([A-Za-z][-A-Za-z0-9]*)\s*(=?)(.*)")
+_ESCAPES = {"n": "\n", "t": "\t", "b": "\b", "\\": "\\", '"': '"'}
+_IDENT = re.compile(r"(.*?) <(.*?)> (\d+) [-+]\d{4}$")
+
+
+class Unsupported(Exception):
+    """What git would make of the repository is beyond this reader, ask git"""
+
+
+def git_dir(path="."):
+    """Return the .git directory of the repository path is in, None if there is none"""
+    path = os.path.abspath(path)
+    device = os.stat(path).st_dev
+    while True:
+        candidate = os.path.join(path, ".git")
+        if os.path.isdir(candidate):
+            return candidate
+        if os.path.isfile(candidate):  # a worktree or submodule
+            with open(candidate, encoding="utf-8") as f:
+                line = f.read().strip()
+            if line.startswith("gitdir:"):
+                return os.path.join(path, line[len("gitdir:") :].strip())
+        parent = os.path.dirname(path)
+        # like git, don't look beyond the filesystem we started in
+        if parent == path or os.stat(parent).st_dev != device:
+            return None
+        path = parent
+
+
+def _config(path):
+    """Return the (key, value) entries of the git config file at path"""
+    try:
+        with open(path, encoding="utf-8") as f:
+            lines = iter(f.read().splitlines())
+    except FileNotFoundError:
+        return []
+    except (OSError, UnicodeDecodeError) as e:
+        raise Unsupported(f"Unreadable config '{path}': {e}") from e
+    entries, section = [], None
+    for line in lines:
+        m = _SECTION.match(line)
+        if m:
+            name, subsection = m.groups()
+            if subsection is not None:
+                section = name.lower() + "." + re.sub(r"\\(.)", r"\1", subsection)
+            else:
+                # [section.subsection] is the deprecated, case insensitive form
+                section = name.lower()
+            line = line[m.end() :]
+        if not line.strip() or line.lstrip()[0] in "#;":
+            continue
+        m = _KEY.match(line)
+        if m is None or section is None:
+            raise Unsupported(f"Can't parse '{line}' in '{path}'")
+        name, equals, rest = m.groups()
+        key = f"{section}.{name.lower()}"
+        entries.append((key, _config_value(rest, lines, path) if equals else None))
+    return entries
+
+
+def _config_value(rest, lines, path):
+    value, space, quoted = "", "", False
+    while True:
+        i = 0
+        while i < len(rest):
+            c = rest[i]
+            if c == "\\":
+                if i + 1 == len(rest):
+                    break  # continued on the next line
+                if rest[i + 1] not in _ESCAPES:
+                    raise Unsupported(f"Bad escape in '{rest}' in '{path}'")
+                value, space = value + space + _ESCAPES[rest[i + 1]], ""
+                i += 2
+                continue
+            if c == '"':
+                quoted = not quoted
+            elif not quoted and c in "#;":
+                return value
+            elif not quoted and c.isspace():
+                if value:
+                    space += " "
+            else:
+                value, space = value + space + c, ""
+            i += 1
+        else:
+            if quoted:
+                raise Unsupported(f"Unterminated quote in '{path}'")
+            return value
+        rest = next(lines, "")
+
+
+def _true(value):
+    return value is None or value.lower() not in ("false", "no", "off", "0", "")
+
+
+def _ident(line):
+    m = _IDENT.match(line)
+    if m is None:
+        raise Unsupported(f"Can't parse the identity '{line}'")
+    return m.group(1), m.group(2), int(m.group(3))
+
+
+def _subject(message):
+    lines = []
+    for line in message.lstrip("\n").split("\n"):
+        if not line.strip():
+            break
+        lines.append(line.strip())
+    return " ".join(lines)
+
+
+def _headers(data):
+    """Return the headers (multi-valued ones as lists) and message of a commit or tag"""
+    head, _, message = data.partition(b"\n\n")
+    headers = {}
+    for line in head.split(b"\n"):
+        if line.startswith(b" "):  # continuation, e.g. of gpgsig
+            continue
+        key, _, value = line.decode("utf-8", "replace").partition(" ")
+        headers.setdefault(key, []).append(value)
+    return headers, message.decode("utf-8", "replace")
+
+
+def _apply_delta(base, delta):
+    def varint(i):
+        value = shift = 0
+        while True:
+            c = delta[i]
+            i += 1
+            value |= (c & 0x7F) << shift
+            shift += 7
+            if not c & 0x80:
+                return value, i
+
+    _, i = varint(0)
+    size, i = varint(i)
+    out = bytearray()
+    while i < len(delta):
+        op = delta[i]
+        i += 1
+        if op & 0x80:  # copy from the base
+            offset = length = 0
+            for k in range(4):
+                if op & (1 << k):
+                    offset |= delta[i] << (8 * k)
+                    i += 1
+            for k in range(3):
+                if op & (0x10 << k):
+                    length |= delta[i] << (8 * k)
+                    i += 1
+            out += base[offset : offset + (length or 0x10000)]
+        elif op:  # insert what follows
+            out += delta[i : i + op]
+            i += op
+        else:
+            raise Unsupported("Invalid delta opcode 0")
+    if len(out) != size:
+        raise Unsupported("Delta applied to the wrong size")
+    return bytes(out)
+
+
+class Pack:
+    """A pack file and its (v2) index"""
+
+    def __init__(self, idx):
+        with open(idx, "rb") as f:
+            self.idx = f.read()
+        if self.idx[:4] != b"\377tOc" or struct.unpack(">I", self.idx[4:8])[0] != 2:
+            raise Unsupported(f"'{idx}' is not a version 2 pack index")
+        self.fanout = struct.unpack(">256I", self.idx[8:1032])
+        self.count = self.fanout[255]
+        self.path = idx[: -len(".idx")] + ".pack"
+        self._file = None
+
+    def name(self, i):
+        return self.idx[1032 + 20 * i : 1052 + 20 * i]
+
+    def search(self, sha):
+        """Return the position of (binary) sha, or where it would be, in the index"""
+        lo = self.fanout[sha[0] - 1] if sha[0] else 0
+        hi = self.fanout[sha[0]]
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.name(mid) < sha:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def offset(self, sha):
+        """Return the offset of sha in the pack, None if it isn't in it"""
+        i = self.search(sha)
+        if i == self.count or self.name(i) != sha:
+            return None
+        at = 1032 + 24 * self.count + 4 * i
+        offset = struct.unpack(">I", self.idx[at : at + 4])[0]
+        if offset & 0x80000000:
+            at = 1032 + 28 * self.count + 8 * (offset & 0x7FFFFFFF)
+            offset = struct.unpack(">Q", self.idx[at : at + 8])[0]
+        return offset
+
+    def read(self, offset):
+        """Return the type, data and delta base (an offset or sha) of the entry at offset"""
+        if self._file is None:
+            self._file = open(self.path, "rb")
+        self._file.seek(offset)
+        header = self._file.read(32)
+        c = header[0]
+        kind, size, shift, i = (c >> 4) & 7, c & 15, 4, 1
+        while c & 0x80:
+            c = header[i]
+            i += 1
+            size |= (c & 0x7F) << shift
+            shift += 7
+        base = None
+        if kind == OFS_DELTA:
+            c = header[i]
+            i += 1
+            distance = c & 0x7F
+            while c & 0x80:
+                c = header[i]
+                i += 1
+                distance = ((distance + 1) << 7) | (c & 0x7F)
+            base = offset - distance
+        elif kind == REF_DELTA:
+            base = header[i : i + 20].hex()
+            i += 20
+        self._file.seek(offset + i)
+        inflate, chunks = zlib.decompressobj(), []
+        while not inflate.eof:
+            chunk = self._file.read(8192)
+            if not chunk:
+                raise Unsupported(f"Truncated entry at {offset} in '{self.path}'")
+            chunks.append(inflate.decompress(chunk))
+        data = b"".join(chunks)
+        if len(data) != size:
+            raise Unsupported(f"Corrupt entry at {offset} in '{self.path}'")
+        return kind, data, base
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class Repository:
+    def __init__(self, gitdir):
+        """
+        gitdir  the .git directory (of the worktree) to read
+        """
+        self.gitdir = gitdir
+        self.commondir = gitdir
+        if os.path.isfile(os.path.join(gitdir, "commondir")):
+            with open(os.path.join(gitdir, "commondir"), encoding="utf-8") as f:
+                self.commondir = os.path.join(gitdir, f.read().strip())
+        self.objects = os.path.join(self.commondir, "objects")
+        for path in ("info/alternates", "pack/multi-pack-index"):
+            if os.path.exists(os.path.join(self.objects, path)):
+                raise Unsupported(f"'{path}' in '{self.objects}' is not supported")
+        if os.path.isdir(os.path.join(self.commondir, "reftable")):
+            raise Unsupported("reftables are not supported")
+
+        # later files override earlier ones, like git
+        home = os.path.expanduser("~")
+        xdg = os.environ.get("XDG_CONFIG_HOME") or os.path.join(home, ".config")
+        self.config = []
+        for path in (
+            "/etc/gitconfig",
+            os.path.join(xdg, "git", "config"),
+            os.path.join(home, ".gitconfig"),
+            os.path.join(self.commondir, "config"),
+        ):
+            self.config += _config(path)
+        for key, _ in self.config:
+            if key.startswith(("include.", "includeif.")):
+                raise Unsupported("config includes are not supported")
+            if key.startswith("extensions."):
+                raise Unsupported(f"'{key}' is not supported")
+        if int(self.get("core.repositoryformatversion") or 0) > 1:
+            raise Unsupported("repository format version above 1")
+
+        self._packs = None
+        self._packed_refs = None
+        self._peeled = {}
+        self._entries = {}
+        self._commits = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        for pack in self._packs or ():
+            pack.close()
+
+    def get(self, key):
+        """Return the last value of the config key, None if it isn't set"""
+        values = self.get_all(key)
+        return values[-1] if values else None
+
+    def get_all(self, key):
+        section, _, name = key.rpartition(".")
+        first, dot, subsection = section.partition(".")
+        key = f"{first.lower()}{dot}{subsection}.{name.lower()}"
+        return [v for k, v in self.config if k == key]
+
+    # Refs
+
+    def packed_refs(self):
+        if self._packed_refs is None:
+            self._packed_refs = {}
+            peeled, name = False, None
+            try:
+                with open(os.path.join(self.commondir, "packed-refs"), encoding="utf-8") as f:
+                    for line in f:
+                        if line.startswith("#"):
+                            traits = line.split(":", 1)[-1].split()
+                            peeled = "peeled" in traits or "fully-peeled" in traits
+                        elif line.startswith("^"):
+                            if peeled and name is not None:
+                                self._peeled[name] = line[1:].strip()
+                        else:
+                            sha, _, name = line.strip().partition(" ")
+                            self._packed_refs[name] = sha
+            except FileNotFoundError:
+                pass
+        return self._packed_refs
+
+    def read_ref(self, name):
+        """Return what the ref name holds (a sha or "ref: <name>"), None if it doesn't exist"""
+        directory = self.gitdir if name.startswith(PER_WORKTREE) else self.commondir
+        try:
+            with open(os.path.join(directory, name), encoding="utf-8") as f:
+                return f.read().strip()
+        except (FileNotFoundError, IsADirectoryError, NotADirectoryError):
+            return self.packed_refs().get(name)
+
+    def resolve(self, name):
+        """Return the sha the ref name points to, following symbolic refs"""
+        for _ in range(5):
+            value = self.read_ref(name)
+            if value is None or not value.startswith("ref:"):
+                return value
+            name = value[len("ref:") :].strip()
+        raise Unsupported(f"Symbolic refs nested too deep at '{name}'")
+
+    def refs(self, prefix):
+        """Return the refs under prefix and their shas, sorted by name"""
+        ret = {k: v for k, v in self.packed_refs().items() if k.startswith(prefix)}
+        top = os.path.join(self.commondir, prefix)
+        for root, _, files in os.walk(top):
+            for file in files:
+                name = os.path.relpath(os.path.join(root, file), self.commondir)
+                name = name.replace(os.sep, "/")
+                if name.endswith(".lock"):
+                    continue
+                sha = self.resolve(name)
+                if sha is not None:
+                    ret[name] = sha
+        return dict(sorted(ret.items()))
+
+    # Objects
+
+    def packs(self):
+        if self._packs is None:
+            directory = os.path.join(self.objects, "pack")
+            try:
+                names = sorted(os.listdir(directory))
+            except FileNotFoundError:
+                names = []
+            self._packs = [Pack(os.path.join(directory, n)) for n in names if n.endswith(".idx")]
+        return self._packs
+
+    def _packed(self, pack, offset):
+        key = (pack.path, offset)
+        if key not in self._entries:
+            kind, data, base = pack.read(offset)
+            if kind == OFS_DELTA:
+                kind, source = self._packed(pack, base)
+                data = _apply_delta(source, data)
+            elif kind == REF_DELTA:
+                kind, source = self.read(base)
+                data = _apply_delta(source, data)
+            else:
+                kind = TYPES[kind]
+            self._entries[key] = (kind, data)
+        return self._entries[key]
+
+    def read(self, sha):
+        """Return the type and content of the object sha"""
+        path = os.path.join(self.objects, sha[:2], sha[2:])
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                data = zlib.decompress(f.read())
+            header, _, data = data.partition(b"\0")
+            return header.split(b" ")[0].decode(), data
+        binary = bytes.fromhex(sha)
+        for pack in self.packs():
+            offset = pack.offset(binary)
+            if offset is not None:
+                return self._packed(pack, offset)
+        raise Unsupported(f"Object {sha} not found")
+
+    def commit(self, sha):
+        """Return the parsed commit sha"""
+        if sha not in self._commits:
+            kind, data = self.read(sha)
+            if kind != "commit":
+                raise Unsupported(f"{sha} is a {kind}, not a commit")
+            headers, message = _headers(data)
+            if "encoding" in headers:
+                raise Unsupported(f"Commit {sha} is not in UTF-8")
+            self._commits[sha] = dict(
+                tree=headers["tree"][0],
+                parents=headers.get("parent", []),
+                author=headers["author"][0],
+                committer=headers["committer"][0],
+                date=_ident(headers["committer"][0])[2],
+                message=message,
+            )
+        return self._commits[sha]
+
+    def peel(self, ref, sha):
+        """Return the commit (or other object) the tag ref pointing to sha points to"""
+        if self.packed_refs().get(ref) == sha and self._peeled:
+            return self._peeled.get(ref, sha)
+        for _ in range(16):
+            kind, data = self.read(sha)
+            if kind != "tag":
+                return sha
+            sha = _headers(data)[0]["object"][0]
+        raise Unsupported(f"Tags nested too deep at {sha}")
+
+    def tag_date(self, sha):
+        """Return the date the annotated tag sha was made"""
+        headers, _ = _headers(self.read(sha)[1])
+        return _ident(headers["tagger"][0])[2] if "tagger" in headers else 0
+
+    def abbrev(self, sha):
+        """Return the shortest unique prefix of sha, at least as long as git abbreviates to"""
+        setting = self.get("core.abbrev")
+        if setting is None or setting.lower() == "auto":
+            count = sum(pack.count for pack in self.packs())
+            length = max(7, (count.bit_length() + 1) // 2)
+        elif setting.lower() in ("false", "no", "off"):
+            return sha
+        elif setting.isdigit():
+            length = max(4, min(40, int(setting)))
+        else:
+            raise Unsupported(f"core.abbrev = {setting}")
+
+        # one more digit than shared with the closest other object
+        common = 0
+        binary = bytes.fromhex(sha)
+        for pack in self.packs():
+            i = pack.search(binary)
+            for j in (i - 1, i, i + 1):
+                if 0 <= j < pack.count and pack.name(j) != binary:
+                    common = max(common, _common(sha, pack.name(j).hex()))
+        try:
+            loose = os.listdir(os.path.join(self.objects, sha[:2]))
+        except FileNotFoundError:
+            loose = []
+        for name in loose:
+            if sha[:2] + name != sha:
+                common = max(common, _common(sha, sha[:2] + name))
+        return sha[: max(length, common + 1)]
+
+    # What the git commands return
+
+    def head(self):
+        sha = self.resolve("HEAD")
+        if sha is None:
+            raise Unsupported("HEAD is unborn")
+        return sha
+
+    def branch(self):
+        """Return what `git rev-parse --abbrev-ref HEAD` does"""
+        value = self.read_ref("HEAD")
+        self.head()
+        if not value.startswith("ref:"):
+            return "HEAD"
+        ref = value[len("ref:") :].strip()
+        if not ref.startswith("refs/heads/"):
+            raise Unsupported(f"HEAD points to '{ref}'")
+        name = ref[len("refs/heads/") :]
+        # git qualifies names that are ambiguous
+        for other in (name, f"refs/{name}", f"refs/tags/{name}", f"refs/remotes/{name}"):
+            if self.read_ref(other) is not None:
+                raise Unsupported(f"'{name}' is ambiguous")
+        if self.read_ref(f"refs/remotes/{name}/HEAD") is not None:
+            raise Unsupported(f"'{name}' is ambiguous")
+        return name
+
+    def log(self, fmt):
+        """Return what `git log --pretty=format:<fmt> -n 1 HEAD` does"""
+        if _true(self.get("log.showsignature") or "false"):
+            raise Unsupported("log.showSignature is set")
+        sha = self.head()
+        commit = self.commit(sha)
+        out, i = [], 0
+        while i < len(fmt):
+            if fmt[i] != "%":
+                out.append(fmt[i])
+                i += 1
+                continue
+            for length in (2, 1):
+                placeholder = fmt[i + 1 : i + 1 + length]
+                if len(placeholder) == length and placeholder in PLACEHOLDERS:
+                    out.append(PLACEHOLDERS[placeholder](self, sha, commit))
+                    i += 1 + length
+                    break
+            else:
+                raise Unsupported(f"'{fmt[i:]}' is not supported")
+        return "".join(out)
+
+    def remote_url(self, name):
+        """Return what `git remote get-url <name>` does"""
+        if any(k.startswith("url.") for k, _ in self.config):
+            raise Unsupported("url.<base>.insteadOf is not supported")
+        urls = self.get_all(f"remote.{name}.url")
+        if not urls or urls[0] is None:
+            raise Unsupported(f"No URL for remote '{name}'")
+        return urls[0]
+
+    def describe(self, candidates=10):
+        """Return what `git describe --tags --always` does"""
+        if os.path.exists(os.path.join(self.commondir, "shallow")):
+            raise Unsupported("shallow repositories are not supported")
+        if self.refs("refs/replace/"):
+            raise Unsupported("replace refs are not supported")
+        head = self.head()
+
+        # the tag for each tagged commit: annotated over lightweight, the
+        # newest of the annotated, otherwise the first by name
+        names = {}
+        for ref, sha in self.refs("refs/tags/").items():
+            commit = self.peel(ref, sha)
+            priority = 2 if commit != sha else 1
+            known = names.get(commit)
+            if (
+                known is None
+                or known[0] < priority
+                or (priority == known[0] == 2 and self.tag_date(known[1]) < self.tag_date(sha))
+            ):
+                names[commit] = (priority, sha, ref[len("refs/tags/") :])
+        if head in names:
+            return names[head][2]
+        if not names:
+            return self.abbrev(head)
+
+        # walk from HEAD by date like git, counting the commits between it
+        # and each tagged commit found along the way
+        flags, queue, order = {head: 0}, [], 0
+        matches, gave_up = [], None
+
+        def push(sha):
+            nonlocal order
+            heapq.heappush(queue, (-self.commit(sha)["date"], order, sha))
+            order += 1
+
+        push(head)
+        seen = 0
+        while queue:
+            _, _, sha = heapq.heappop(queue)
+            seen += 1
+            if sha in names:
+                if len(matches) == candidates:
+                    gave_up = sha
+                    break
+                within = 1 << (len(matches) + 1)
+                matches.append(dict(name=names[sha][2], depth=seen - 1, within=within))
+                flags[sha] |= within
+            for match in matches:
+                if not flags[sha] & match["within"]:
+                    match["depth"] += 1
+            for parent in self.commit(sha)["parents"]:
+                if parent not in flags:
+                    flags[parent] = 0
+                    push(parent)
+                flags[parent] |= flags[sha]
+        if not matches:
+            return self.abbrev(head)
+        best = min(matches, key=lambda m: m["depth"])  # the first found of equals
+
+        if gave_up is not None:
+            push(gave_up)
+        while queue:
+            _, _, sha = heapq.heappop(queue)
+            if flags[sha] & best["within"]:
+                if all(flags[s] & best["within"] for _, _, s in queue):
+                    break
+            else:
+                best["depth"] += 1
+            for parent in self.commit(sha)["parents"]:
+                if parent not in flags:
+                    flags[parent] = 0
+                    push(parent)
+                flags[parent] |= flags[sha]
+        return f"{best['name']}-{best['depth']}-g{self.abbrev(head)}"
+
+
+def _common(a, b):
+    n = 0
+    while n < len(a) and a[n] == b[n]:
+        n += 1
+    return n
+
+
+def repository(path="."):
+    """Return the Repository path is in"""
+    for name in ENVIRONMENT:
+        if any(k.startswith(name) for k in os.environ):
+            raise Unsupported(f"{name} is set")
+    gitdir = git_dir(path)
+    if gitdir is None:
+        raise Unsupported(f"'{os.path.abspath(path)}' is not in a git repository")
+    return Repository(gitdir)
+
+
+def branch():
+    """Return the current branch, like `git rev-parse --abbrev-ref HEAD`"""
+    with repository() as repo:
+        return repo.branch()
+
+
+def commit_id(fmt="%h"):
+    """Return HEAD as fmt, like `git log --pretty=format:<fmt> -n 1 HEAD`"""
+    with repository() as repo:
+        return repo.log(fmt).strip()
+
+
+def remote_url(origin="origin"):
+    """Return the URL of the remote origin, like `git remote get-url <origin>`"""
+    with repository() as repo:
+        return repo.remote_url(origin)
+
+
+def describe():
+    """Return the closest tag to HEAD, like `git describe --tags --always`"""
+    with repository() as repo:
+        return repo.describe()
@@ -10,8 +10,10 @@ import socket
 import sys
 from datetime import datetime
 
-import markdown as _markdown
-
+from . import facts as _facts
+from . import git as _git
+from . import md as _md
+from . import memo as _memo
 from . import utils
 
 # Default extensions and config for the markdown global — extracted so ruff
@@ -41,6 +43,32 @@ def _os_release(k=None):
     return ret
 
 
+_os_release_once = _memo.per_render("os_release", _facts.cached("os_release", _os_release))
+
+
+def _git_fact(native, command):
+    """Return native(*args), or the output of the git command(*args) where it won't do"""
+
+    def fact(*args, **kwargs):
+        # cassettes record and replay the git commands
+        if utils.cassette is None:
+            try:
+                return native(*args, **kwargs)
+            except _git.Unsupported:
+                pass
+        return utils.cmd(command(*args, **kwargs))
+
+    return fact
+
+
+_git_branch = _git_fact(_git.branch, lambda: "git rev-parse --abbrev-ref HEAD")
+_git_commit_id = _git_fact(
+    _git.commit_id, lambda fmt="%h": f"git log --pretty=format:{fmt} -n 1 HEAD"
+)
+_git_remote_url = _git_fact(_git.remote_url, lambda origin="origin": f"git remote get-url {origin}")
+_git_describe = _git_fact(_git.describe, lambda: "git describe --tag --always")
+
+
 def _render_markdown(
     f,
     output_format="html5",
@@ -48,10 +76,11 @@ def _render_markdown(
     extension_configs=None,
 ):
     """Load a markdown file and convert it to HTML."""
-    return _markdown.markdown(
+    return _md.convert(
         utils.load_file(f),
-        extensions=extensions or _MD_EXTENSIONS,
         output_format=output_format,
+        extensions=extensions or _MD_EXTENSIONS,
+        extension_configs=_MD_EXTENSION_CONFIGS if extension_configs is None else extension_configs,
     )
 
 
@@ -73,32 +102,34 @@ _globals = dict(
     ),
     git_branch=(
         """ Return the current git branch of HEAD """,
-        lambda: utils.cmd("git rev-parse --abbrev-ref HEAD"),
+        lambda: _git_branch(),
     ),
     GET=(
         """ Issue a HTTP GET request against URL returning body content or an object if JSON """,
         lambda url="http://httpbin.org/anything": utils.get(url),
     ),
+    GET_many=(
+        """ Issue HTTP GET requests against URLs concurrently returning their bodies in order """,
+        lambda urls, workers=None: utils.get_many(urls, workers),
+    ),
     git_commit_id=(
         """ Return the git commit ID of HEAD """,
-        lambda fmt="%h": utils.cmd(f"git log --pretty=format:{fmt} -n 1 HEAD"),
+        lambda fmt="%h": _git_commit_id(fmt),
     ),
     git_remote_url=(
         """ Return the URL of the named origin """,
-        lambda origin="origin": utils.cmd(f"git remote get-url {origin}"),
+        lambda origin="origin": _git_remote_url(origin),
     ),
     git_remote_url_http=(
         """ Return the HTTP URL of the named origin """,
-        lambda origin="origin": re.sub(
-            "git@(.*):", "https://\\1/", utils.cmd(f"git remote get-url {origin}")
-        ),
+        lambda origin="origin": re.sub("git@(.*):", "https://\\1/", _git_remote_url(origin)),
     ),
     git_tag=(
         """ Return the value of git describe --tag --always """,
         lambda fmt="current": (
-            utils.cmd("git describe --tag --always")
+            _git_describe()
             if fmt == "current"
-            else re.sub(r"-[A-Fa-fg0-9\-]+$", "", utils.cmd("git describe --tag --always"))
+            else re.sub(r"-[A-Fa-fg0-9\-]+$", "", _git_describe())
         ),
     ),
     host_id=(""" Return the host's ID """, lambda: utils.cmd("hostid")),
@@ -113,11 +144,15 @@ _globals = dict(
         """ Load content from a markdown file and convert it to html """,
         _render_markdown,
     ),
+    memoize=(
+        """ Return macro f caching its output by its arguments for the rest of the render """,
+        lambda f, maxsize=1024: _memo.memoize(f, maxsize),
+    ),
     now=(""" Return the timestamp for datetime.now() """, lambda: datetime.now()),
     os=(""" Dictionary holding the contents of /etc/os-release """, _os_release()),
     os_release=(
         """ Lookup key in /etc/os-release and return its value """,
-        lambda k: _os_release()[k],
+        lambda k: _os_release_once()[k],
     ),
     platform=(
         """ Access functions in the platform module """,
@@ -141,6 +176,23 @@ _globals = dict(
     whatismyip=(""" Return the host's public (IPv4) address """, lambda: utils.whatismyip()),
 )
 
+# Facts that don't change during a render are looked up once per render, and
+# only every so often when they are cached across invocations (--fact-cache)
+for k in (
+    "fqdn",
+    "git_branch",
+    "git_commit_id",
+    "git_remote_url",
+    "git_remote_url_http",
+    "git_tag",
+    "host_id",
+    "hostname",
+    "machine_id",
+):
+    _globals[k] = (_globals[k][0], _memo.per_render(k, _facts.cached(k, _globals[k][1])))
+
+# run() is only cached across invocations when it is given a --fact-ttl
+_globals["run"] = (_globals["run"][0], _facts.cached("run", _globals["run"][1]))
 
 for k, v in _globals.items():
     setattr(sys.modules[__name__], k, v[1])
@@ -0,0 +1,130 @@
+# Disk cache of HTTP responses for GET() and friends
+#
+# Responses are kept as long as their Cache-Control/Expires headers (or an
+# explicit ttl) allow and revalidated with If-None-Match/If-Modified-Since
+# once stale, so unchanged resources cost a round trip but no transfer.
+# Entries are zlib-compressed in a cache.DiskCache and so bounded by size.
+# Offline, only what is cached is served - regardless of how stale.
+
+import email.utils
+import hashlib
+import json
+import time
+import zlib
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from .cache import DiskCache
+
+# response headers kept along with the body
+HEADERS = ("Cache-Control", "Content-Type", "Date", "ETag", "Expires", "Last-Modified")
+
+
+class OfflineError(Exception):
+    """A resource was asked for offline that is not in the cache"""
+
+
+def directives(headers):
+    """Return the Cache-Control directives of headers as a dict"""
+    ret = {}
+    for directive in headers.get("Cache-Control", "").split(","):
+        name, _, value = directive.strip().partition("=")
+        if name:
+            ret[name.lower()] = value.strip('"')
+    return ret
+
+
+def _http_date(value):
+    try:
+        return email.utils.parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+class HTTPCache:
+    def __init__(self, directory, max_size=256 << 20, ttl=None, offline=False):
+        """
+        directory   where responses are kept
+        max_size    bytes beyond which the least recently used are evicted
+        ttl         seconds responses are fresh for, whatever their headers say
+        offline     serve only from the cache, never touching the network
+        """
+        self.store = DiskCache(directory, max_size=max_size)
+        self.ttl = ttl
+        self.offline = offline
+
+    def key(self, url):
+        return hashlib.sha256(f"GET {url}".encode()).hexdigest()
+
+    def load(self, url):
+        """Return the cached entry and body for url, (None, None) if there is none"""
+        data = self.store.read(self.key(url))
+        if data is None:
+            return None, None
+        meta, _, body = zlib.decompress(data).partition(b"\n")
+        return json.loads(meta), body
+
+    def save(self, url, entry, body):
+        meta = json.dumps(entry).encode("utf-8")
+        self.store.write(self.key(url), zlib.compress(meta + b"\n" + body))
+
+    def fresh(self, entry):
+        """Return whether entry can be served without asking the origin"""
+        age = time.time() - entry["stored"]
+        if self.ttl is not None:
+            return age < self.ttl
+        cc = directives(entry["headers"])
+        if "no-cache" in cc:
+            return False
+        if "max-age" in cc:
+            try:
+                return age < int(cc["max-age"])
+            except ValueError:
+                return False
+        expires = _http_date(entry["headers"].get("Expires"))
+        return expires is not None and time.time() < expires
+
+    def response(self, url, entry, body):
+        """Return a requests.Response for a cached entry"""
+        response = requests.Response()
+        response.url = url
+        response.status_code = 200
+        response.headers = CaseInsensitiveDict(entry["headers"])
+        response._content = body
+        return response
+
+    def get(self, session, url, timeout=None):
+        """GET url with session, going through the cache"""
+        entry, body = self.load(url)
+        if self.offline:
+            if entry is None:
+                raise OfflineError(f"'{url}' is not cached and inji is offline")
+            return self.response(url, entry, body)
+        if entry is not None and self.fresh(entry):
+            return self.response(url, entry, body)
+
+        headers = {}
+        if entry is not None:
+            if "ETag" in entry["headers"]:
+                headers["If-None-Match"] = entry["headers"]["ETag"]
+            if "Last-Modified" in entry["headers"]:
+                headers["If-Modified-Since"] = entry["headers"]["Last-Modified"]
+        response = session.get(url, headers=headers, timeout=timeout)
+
+        if response.status_code == 304 and entry is not None:
+            # still valid, take what the origin says about it from now on
+            entry["headers"].update(
+                {h: response.headers[h] for h in HEADERS if h in response.headers}
+            )
+            entry["stored"] = time.time()
+            self.save(url, entry, body)
+            return self.response(url, entry, body)
+
+        if response.status_code == 200 and "no-store" not in directives(response.headers):
+            entry = dict(
+                stored=time.time(),
+                headers={h: response.headers[h] for h in HEADERS if h in response.headers},
+            )
+            self.save(url, entry, response.content)
+        return response
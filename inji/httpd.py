@@ -0,0 +1,312 @@
+# Local HTTP render service
+#
+# `inji http --bind 127.0.0.1:8080 --root templates/` serves
+#
+#   POST /render    {"template": "motd.j2", "context": {"k": "v"}}
+#                   responds with the rendered text
+#   GET  /metrics   render latency, cache hit ratios and queue depth in the
+#                   Prometheus text exposition format
+#
+# Renders run on a bounded pool of threads sharing the warm engines of
+# inji.server. Requests that would queue up behind more than --max-queue
+# others are turned away (503) and those not rendered within --timeout
+# seconds get a 504. Contexts are made up of the --vars-file layers with the
+# request's context on top; the environment is left out.
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from jinja2.exceptions import TemplateNotFound
+
+from . import cli, server, utils, worker
+
+# Upper bounds (in seconds) of the render latency histogram buckets
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def bind(string):
+    """Parse a string of the form HOST:PORT into a tuple"""
+    try:
+        host, port = string.rsplit(":", 1)
+        return host or "127.0.0.1", int(port)
+    except Exception as e:
+        msg = f"Invalid address '{string}': {str(e)}"
+        print(msg, file=sys.stderr)
+        raise argparse.ArgumentTypeError(msg)
+
+
+def http_args(argv=None):
+    parser = argparse.ArgumentParser(prog="inji http", description="inji - HTTP render service")
+
+    parser.add_argument(
+        "--bind",
+        action="store",
+        required=False,
+        type=bind,
+        dest="bind",
+        default=("127.0.0.1", 8080),
+        metavar="HOST:PORT",
+        help="address to listen on (defaults to 127.0.0.1:8080)",
+    )
+
+    parser.add_argument(
+        "--root",
+        action="store",
+        required=False,
+        type=lambda p, t="dir": utils.path(p, t),
+        dest="root",
+        default=".",
+        help="/path/to/templates/ that template names are relative to (defaults to .)",
+    )
+
+    parser.add_argument(
+        "-v",
+        "--vars-file",
+        action="append",
+        required=False,
+        type=lambda p, t="file": utils.path(p, t),
+        dest="vars_file",
+        default=[],
+        help="/path/to/vars.yaml to layer under the context of every request",
+    )
+
+    parser.add_argument(
+        "--max-concurrency",
+        action="store",
+        required=False,
+        type=int,
+        dest="max_concurrency",
+        default=os.cpu_count() or 1,
+        help="renders in flight at once (defaults to the number of CPUs)",
+    )
+
+    parser.add_argument(
+        "--max-queue",
+        action="store",
+        required=False,
+        type=int,
+        dest="max_queue",
+        default=64,
+        help="renders waiting for a slot before requests are turned away (default 64)",
+    )
+
+    parser.add_argument(
+        "--timeout",
+        action="store",
+        required=False,
+        type=float,
+        dest="timeout",
+        default=30.0,
+        metavar="SECONDS",
+        help="time a request may wait for its render (default 30)",
+    )
+
+    return parser.parse_args(argv)
+
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        with self._lock:
+            for i, le in enumerate(self.buckets):
+                if value <= le:
+                    self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+    def exposition(self, name):
+        with self._lock:
+            lines = [f'{name}_bucket{{le="{le}"}} {n}' for le, n in zip(self.buckets, self.counts)]
+            lines += [
+                f'{name}_bucket{{le="+Inf"}} {self.count}',
+                f"{name}_sum {self.sum}",
+                f"{name}_count {self.count}",
+            ]
+        return lines
+
+
+class Service:
+    """Renders requests on a bounded pool, keeping metrics as it goes"""
+
+    def __init__(self, root=".", vars_files=(), max_concurrency=1, max_queue=64, timeout=30.0):
+        self.root = os.path.abspath(root)
+        self.vars_files = list(vars_files)
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.latency = Histogram()
+        self.responses = {}
+        self.queued = 0
+        self.active = 0
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="inji-http")
+
+    def template(self, name):
+        """Return the path of the template name, which must be under the root"""
+        path = os.path.abspath(os.path.join(self.root, name))
+        if os.path.commonpath([self.root, path]) != self.root or not os.path.isfile(path):
+            raise TemplateNotFound(name)
+        return path
+
+    def _render(self, request):
+        with self._lock:
+            self.queued -= 1
+            self.active += 1
+        start = time.monotonic()
+        try:
+            return worker.render(request)
+        finally:
+            self.latency.observe(time.monotonic() - start)
+            with self._lock:
+                self.active -= 1
+
+    def render(self, body):
+        """Render a request body, returning an HTTP status and the response text"""
+        try:
+            request = json.loads(body)
+            if not isinstance(request, dict):
+                raise ValueError("the body must be an object")
+            if not isinstance(request.get("context", {}), dict):
+                raise ValueError("context must be an object")
+            strict_mode = request.get("strict_mode", "strict")
+            if strict_mode not in cli.STRICT_MODES:
+                raise ValueError(f"strict_mode must be one of {', '.join(cli.STRICT_MODES)}")
+            request = dict(
+                template=self.template(request["template"]),
+                vars=self.vars_files,
+                context=request.get("context", {}),
+                strict_mode=strict_mode,
+                # renders taking longer than the client waits stop rather than hold the pool
+                deadline=self.timeout,
+            )
+        except TemplateNotFound as e:
+            return self._respond(404, f"template '{e}' not found")
+        except (ValueError, KeyError, TypeError) as e:
+            return self._respond(400, f"invalid request: {str(e)}")
+
+        with self._lock:
+            full = self.queued >= self.max_queue
+            if not full:
+                self.queued += 1
+        if full:
+            return self._respond(503, "too many renders queued")
+        future = self._pool.submit(self._render, request)
+        try:
+            return self._respond(200, future.result(timeout=self.timeout))
+        except FutureTimeoutError:
+            return self._respond(504, f"render took longer than {self.timeout}s")
+        except Exception as e:
+            return self._respond(422, f"{type(e).__name__}: {str(e)}")
+
+    def _respond(self, status, text):
+        with self._lock:
+            self.responses[status] = self.responses.get(status, 0) + 1
+        return status, text
+
+    def metrics(self):
+        """Return the metrics in the Prometheus text exposition format"""
+        caches = {"vars": utils.context_cache_stats}
+        for mode, engine in server.engines.items():
+            caches[f"environment_{mode}"] = engine.cache_stats
+
+        lines = [
+            "# HELP inji_render_duration_seconds Time taken to render templates.",
+            "# TYPE inji_render_duration_seconds histogram",
+            *self.latency.exposition("inji_render_duration_seconds"),
+            "# HELP inji_http_responses_total HTTP responses by status code.",
+            "# TYPE inji_http_responses_total counter",
+        ]
+        with self._lock:
+            lines += [
+                f'inji_http_responses_total{{code="{code}"}} {n}'
+                for code, n in sorted(self.responses.items())
+            ]
+            lines += [
+                "# HELP inji_render_queue_depth Renders waiting for a free slot.",
+                "# TYPE inji_render_queue_depth gauge",
+                f"inji_render_queue_depth {self.queued}",
+                "# HELP inji_renders_in_flight Renders in progress.",
+                "# TYPE inji_renders_in_flight gauge",
+                f"inji_renders_in_flight {self.active}",
+            ]
+        lines += [
+            "# HELP inji_cache_requests_total Cache lookups by cache and result.",
+            "# TYPE inji_cache_requests_total counter",
+        ]
+        for cache, stats in sorted(caches.items()):
+            for result in ("hits", "misses"):
+                lines.append(
+                    f'inji_cache_requests_total{{cache="{cache}",result="{result}"}} '
+                    f"{stats[result]}"
+                )
+        lines += [
+            "# HELP inji_cache_hit_ratio Fraction of cache lookups that were hits.",
+            "# TYPE inji_cache_hit_ratio gauge",
+        ]
+        for cache, stats in sorted(caches.items()):
+            total = stats["hits"] + stats["misses"]
+            ratio = stats["hits"] / total if total else 0.0
+            lines.append(f'inji_cache_hit_ratio{{cache="{cache}"}} {ratio}')
+        return "\n".join(lines) + "\n"
+
+
+class Handler(BaseHTTPRequestHandler):
+    service = None
+
+    def _send(self, status, text, content_type="text/plain; charset=utf-8"):
+        body = text.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/metrics":
+            self._send(200, self.service.metrics(), "text/plain; version=0.0.4; charset=utf-8")
+        else:
+            self._send(404, "not found")
+
+    def do_POST(self):
+        if self.path != "/render":
+            return self._send(404, "not found")
+        length = int(self.headers.get("Content-Length", 0))
+        self._send(*self.service.render(self.rfile.read(length)))
+
+    def log_message(self, format, *args):
+        print(f"inji.httpd {self.address_string()} {format % args}", file=sys.stderr)
+
+
+def make_server(address, service):
+    handler = type("Handler", (Handler,), {"service": service})
+    return ThreadingHTTPServer(address, handler)
+
+
+def serve(args):
+    """Serve render requests over HTTP until interrupted"""
+    service = Service(
+        root=args.root,
+        vars_files=args.vars_file,
+        max_concurrency=args.max_concurrency,
+        max_queue=args.max_queue,
+        timeout=args.timeout,
+    )
+    httpd = make_server(args.bind, service)
+    print(f"inji.httpd listening on http://{args.bind[0]}:{args.bind[1]}/", file=sys.stderr)
+    try:
+        httpd.serve_forever()
+    finally:
+        httpd.server_close()
+    return 0
@@ -0,0 +1,97 @@
+# Append-only journal of completed render jobs
+#
+# Each completed job is appended as one JSON line. Lines are buffered and
+# fsync'ed in batches so that journaling thousands of small jobs costs a
+# handful of syncs rather than one per job, while a crash loses at most the
+# last unsynced batch - those jobs are simply rendered again on --resume.
+
+import json
+import os
+import time
+
+
+class Journal:
+    def __init__(self, path, batch_size=64, batch_interval=1.0):
+        self.path = str(path)
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self._pending = 0
+        self._synced = time.monotonic()
+        self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def completed(self):
+        """Return a dict of job key to journal entry for all completed jobs"""
+        ret = {}
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # a torn write from a crash - only ever the last line
+                        continue
+                    ret[entry["job"]] = entry
+        except FileNotFoundError:
+            pass
+        return ret
+
+    def reset(self):
+        """Empty the journal, forgetting the jobs of any earlier run"""
+        self.close()
+        open(self.path, "w").close()
+
+    def record(self, job, sha256, **kwargs):
+        """Append a completed job to the journal"""
+        if self._file is None:
+            self._file = self._open()
+        entry = dict(job=job, sha256=sha256, time=time.time(), **kwargs)
+        self._file.write(json.dumps(entry, sort_keys=True) + "\n")
+        self._pending += 1
+        if (
+            self._pending >= self.batch_size
+            or time.monotonic() - self._synced >= self.batch_interval
+        ):
+            self.sync()
+
+    def _open(self):
+        """Open the journal for appending, first dropping any line torn by a crash"""
+        try:
+            with open(self.path, "r+b") as f:
+                size = f.seek(0, os.SEEK_END)
+                end = size
+                # find the end of the last complete line, reading back from the end
+                while end > 0:
+                    start = max(0, end - 4096)
+                    f.seek(start)
+                    newline = f.read(end - start).rfind(b"\n")
+                    if newline >= 0:
+                        end = start + newline + 1
+                        break
+                    end = start
+                if end < size:
+                    f.truncate(end)
+        except FileNotFoundError:
+            pass
+        return open(self.path, "a", encoding="utf-8")
+
+    def sync(self):
+        """Flush and fsync any entries not yet on disk"""
+        if self._file is None or not self._pending:
+            return
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._pending = 0
+        self._synced = time.monotonic()
+
+    def close(self):
+        if self._file is None:
+            return
+        self.sync()
+        self._file.close()
+        self._file = None
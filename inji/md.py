@@ -0,0 +1,96 @@
+# Markdown conversion for the markdown() global
+#
+# Building a markdown.Markdown with its extensions costs far more than
+# converting a typical fragment with it, so converters are kept, per set of
+# output format, extensions and extension configs, and reset to be used again.
+# Converted HTML is kept by the SHA-256 of the markdown (and the settings)
+# in memory for the life of the process and - with --cache-dir, under
+# --cache-key as renders are - on disk, so that the same fragments rendered
+# into several layouts, or across runs, are converted once. Extensions given
+# as instances are told apart by their class and configs; those with configs
+# that can't be fingerprinted get converters of their own and aren't cached.
+
+import collections
+import contextlib
+import hashlib
+import threading
+
+import markdown
+
+from . import cache, memo
+
+# The cache.DiskCache converted HTML is kept in across runs, if any (--cache-dir)
+disk_cache = None
+
+# What else the HTML kept in disk_cache is keyed by (--cache-key)
+cache_key = None
+
+# Converted HTML by the digest of its settings and markdown
+converted = memo.LRU(maxsize=4096)
+
+_idle = collections.defaultdict(list)
+_lock = threading.Lock()
+
+
+def _extension(extension):
+    # an instance by its class and configs rather than its repr (and address)
+    if isinstance(extension, str):
+        return extension
+    kind = type(extension)
+    return [f"{kind.__module__}.{kind.__qualname__}", extension.getConfigs()]
+
+
+def settings(output_format="html5", extensions=(), extension_configs=None):
+    """Return the digest of the settings of a converter, None if they can't be told apart"""
+    try:
+        return cache.digest(
+            "markdown",
+            markdown.__version__,
+            output_format,
+            [_extension(e) for e in extensions],
+            extension_configs or {},
+        )
+    except TypeError:
+        return None
+
+
+@contextlib.contextmanager
+def converter(output_format="html5", extensions=(), extension_configs=None):
+    """Lend a markdown.Markdown for the settings given, reset for reuse once returned"""
+    key = settings(output_format, extensions, extension_configs)
+    md = None
+    if key is not None:
+        with _lock:
+            md = _idle[key].pop() if _idle[key] else None
+    if md is None:
+        md = markdown.Markdown(
+            extensions=list(extensions),
+            extension_configs=extension_configs or {},
+            output_format=output_format,
+        )
+    try:
+        yield md
+    finally:
+        if key is not None:
+            md.reset()
+            with _lock:
+                _idle[key].append(md)
+
+
+def convert(text, output_format="html5", extensions=(), extension_configs=None):
+    """Return text converted to HTML, as markdown.markdown() does"""
+    key = settings(output_format, extensions, extension_configs)
+    if key is None:
+        with converter(output_format, extensions, extension_configs) as md:
+            return md.convert(text)
+    key = cache.digest(key, cache_key, hashlib.sha256(text.encode("utf-8")).hexdigest())
+    html = converted.get(key)
+    if html is None and disk_cache is not None:
+        html = disk_cache.get(key)
+    if html is None:
+        with converter(output_format, extensions, extension_configs) as md:
+            html = md.convert(text)
+        if disk_cache is not None:
+            disk_cache.set(key, html)
+    converted.set(key, html)
+    return html
@@ -0,0 +1,191 @@
+# Memoization of macros, pure filters and facts
+#
+# {% set banner = memoize(banner) %} makes a macro return what it returned
+# before for the same arguments, for the rest of the render. Filters that
+# only depend on their arguments can be memoized for the life of the engine
+# (--memoize-filters). Dict and list arguments are compared by value, calls
+# with other unhashable arguments are passed through and mutable results are
+# copied so callers can't alter what is cached.
+#
+# Globals looking up facts that don't change during a render (the git HEAD,
+# the hostname, ..) are made at most once per render with per_render().
+
+import collections
+import contextvars
+import copy
+import functools
+import threading
+from concurrent.futures import Future
+
+from . import filters
+
+# inji's own filters whose results only depend on their arguments
+PURE_FILTERS = frozenset(
+    {
+        "format_dict",
+        "format_list",
+        "from_csv",
+        "from_literal",
+        "strftime",
+        "to_date",
+        "to_url",
+        "tr",
+        "wrap",
+    }
+)
+
+# ansible filters depending on more than their arguments (randomness, the
+# filesystem, the environment)
+IMPURE_ANSIBLE_FILTERS = frozenset(
+    {
+        "expanduser",
+        "expandvars",
+        "fileglob",
+        "password_hash",
+        "random",
+        "random_mac",
+        "realpath",
+        "relpath",
+        "shuffle",
+    }
+)
+
+_MISSING = object()
+_IMMUTABLE = (str, bytes, int, float, complex, bool, type(None), frozenset)
+
+
+class LRU:
+    """A mapping of at most maxsize entries evicting the least recently used"""
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.stats = collections.Counter()
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        with self._lock:
+            value = self._entries.get(key, _MISSING)
+            if value is _MISSING:
+                self.stats["misses"] += 1
+                return default
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+
+def _freeze(value):
+    # dicts and lists (e.g. for format_dict or to_url) as hashable
+    # equivalents, typed all the way down as functools.lru_cache(typed=True)
+    # does - True, 1 and 1.0 are equal but format differently
+    kind = type(value)
+    if isinstance(value, dict):
+        return (kind, frozenset((_freeze(k), _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return (kind, tuple(_freeze(v) for v in value))
+    return (kind, value)
+
+
+def _key(args, kwargs):
+    key = (_freeze(args), _freeze(kwargs))
+    try:
+        hash(key)
+    except TypeError:
+        return None
+    return key
+
+
+def _fresh(value):
+    return value if isinstance(value, _IMMUTABLE) else copy.deepcopy(value)
+
+
+def memoize(fn, maxsize=1024):
+    """Return fn caching what it returns by its (hashable) arguments"""
+    cache = LRU(maxsize)
+
+    def memoized(*args, **kwargs):
+        key = _key(args, kwargs)
+        if key is None:
+            return fn(*args, **kwargs)
+        value = cache.get(key, _MISSING)
+        if value is _MISSING:
+            value = fn(*args, **kwargs)
+            cache.set(key, value)
+        return _fresh(value)
+
+    # keeps jinja2's pass_environment/pass_context markers along with the name
+    functools.update_wrapper(memoized, fn)
+    if not hasattr(fn, "__name__"):
+        memoized.__name__ = getattr(fn, "name", "memoized")
+    memoized.cache = cache
+    return memoized
+
+
+def pure_filters():
+    """Return the names of the filters that are safe to memoize"""
+    ansible = {
+        k
+        for k, (doc, _) in filters.filters.items()
+        if str(doc).startswith("ansible.plugins.filter.") and k not in IMPURE_ANSIBLE_FILTERS
+    }
+    return PURE_FILTERS | ansible
+
+
+def memoize_filters(symbols, names=None, maxsize=1024):
+    """Return the filters in symbols with those named (the pure ones by default) memoized"""
+    names = pure_filters() if names is None else names
+    return {k: memoize(v, maxsize) if k in names else v for k, v in symbols.items()}
+
+
+class SingleFlight:
+    """Results of calls by key, each made once however many ask at the same time"""
+
+    def __init__(self):
+        self._futures = {}
+        self._lock = threading.Lock()
+
+    def call(self, key, fn, *args, **kwargs):
+        with self._lock:
+            future = self._futures.get(key)
+            owner = future is None
+            if owner:
+                future = self._futures[key] = Future()
+        if owner:
+            try:
+                future.set_result(fn(*args, **kwargs))
+            except BaseException as e:
+                # those waiting get the error, later calls try again
+                with self._lock:
+                    del self._futures[key]
+                future.set_exception(e)
+        return _fresh(future.result())
+
+
+# The SingleFlight of the render in progress, shared by the threads of
+# {% parallel for %} loops and prefetches as they copy the context
+render_memo = contextvars.ContextVar("render_memo", default=None)
+
+
+def per_render(name, fn):
+    """Return fn making each call at most once per render (when rendering)"""
+
+    def memoized(*args, **kwargs):
+        flight = render_memo.get()
+        key = _key(args, kwargs)
+        if flight is None or key is None:
+            return fn(*args, **kwargs)
+        return flight.call((name, key), fn, *args, **kwargs)
+
+    memoized.__name__ = name
+    memoized.__doc__ = fn.__doc__
+    return memoized
@@ -0,0 +1,159 @@
+# Start the external calls of a template before rendering it
+#
+# Calls to globals that run commands, make HTTP requests or read files,
+# with arguments that are literals or variables of the context, are found in
+# the template (and those it includes, imports or extends) and all started
+# at once on a pool of threads. As the render reaches each of them it takes
+# the result of the call already in flight instead of making it then, so a
+# template making 30 such calls takes about as long as the slowest one and
+# not as long as all of them.
+#
+# Calls are made whether the render reaches them or not (e.g. in the branch
+# of an {% if %} not taken), which is why this is opt-in (--prefetch).
+
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from jinja2 import meta, nodes
+from jinja2.exceptions import TemplateNotFound, TemplateSyntaxError
+
+PREFETCHABLE = frozenset(
+    {
+        "GET",
+        "bacon_ipsum",
+        "cat",
+        "fqdn",
+        "git_branch",
+        "git_commit_id",
+        "git_remote_url",
+        "git_remote_url_http",
+        "git_tag",
+        "host_id",
+        "hostname",
+        "ip_api",
+        "machine_id",
+        "markdown",
+        "run",
+        "whatismyip",
+    }
+)
+
+
+class _Unresolvable(Exception):
+    pass
+
+
+def _value(node, context, stored):
+    if isinstance(node, nodes.Const):
+        return node.value
+    if isinstance(node, nodes.Name) and node.name not in stored and node.name in context:
+        return context[node.name]
+    raise _Unresolvable
+
+
+def closure(environment, name):
+    """Yield the parsed template name and those it includes, imports or extends"""
+    todo, seen = [name], set()
+    while todo:
+        name = todo.pop()
+        if name in seen:
+            continue
+        seen.add(name)
+        try:
+            source, _, _ = environment.loader.get_source(environment, name)
+            ast = environment.parse(source)
+        except (TemplateNotFound, TemplateSyntaxError):
+            continue
+        yield ast
+        todo.extend(r for r in meta.find_referenced_templates(ast) if r is not None)
+
+
+def calls(asts, context, names=PREFETCHABLE):
+    """Return the (name, args, kwargs) of calls to names with arguments known up front"""
+    asts = list(asts)
+    # names assigned anywhere may not hold what the context has by the call
+    stored = set()
+    for ast in asts:
+        stored |= {n.name for n in ast.find_all(nodes.Name) if n.ctx in ("store", "param")}
+        stored |= {m.name for m in ast.find_all(nodes.Macro)}
+        stored |= {i.target for i in ast.find_all(nodes.Import)}
+        for i in ast.find_all(nodes.FromImport):
+            stored |= {n[1] if isinstance(n, tuple) else n for n in i.names}
+    ret = {}
+    for ast in asts:
+        for call in ast.find_all(nodes.Call):
+            name = getattr(call.node, "name", None)
+            if not isinstance(call.node, nodes.Name) or name not in names:
+                continue
+            # the global is shadowed
+            if name in stored or name in context:
+                continue
+            if call.dyn_args or call.dyn_kwargs:
+                continue
+            try:
+                args = tuple(_value(a, context, stored) for a in call.args)
+                kwargs = tuple(
+                    sorted((k.key, _value(k.value, context, stored)) for k in call.kwargs)
+                )
+                hash((args, kwargs))
+            except (_Unresolvable, TypeError):
+                continue
+            ret[(name, args, kwargs)] = None
+    return list(ret)
+
+
+class Prefetch:
+    """Calls to globals made ahead of the render that takes their results"""
+
+    def __init__(self, functions, calls, workers=16):
+        """
+        functions   the globals by name
+        calls       the (name, args, kwargs) to make
+        """
+        self.functions = functions
+        self.futures = {}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(
+            max_workers=max(1, min(workers, len(calls))), thread_name_prefix="inji-prefetch"
+        )
+        for name, args, kwargs in calls:
+            self.futures[(name, args, kwargs)] = self._pool.submit(
+                contextvars.copy_context().run, functions[name], *args, **dict(kwargs)
+            )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _function(self, name):
+        fn = self.functions[name]
+
+        def prefetched(*args, **kwargs):
+            key = (name, args, tuple(sorted(kwargs.items())))
+            with self._lock:
+                # taken once - calling again makes the call again, as without prefetching
+                future = self.futures.pop(key, None) if _hashable(key) else None
+            if future is None:
+                return fn(*args, **kwargs)
+            return future.result()
+
+        return prefetched
+
+    def context(self):
+        """Return the globals to render with, taking prefetched results"""
+        return {name: self._function(name) for name in {key[0] for key in self.futures}}
+
+    def close(self):
+        """Drop the calls that have not started, those in flight are left to finish"""
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _hashable(key):
+    try:
+        hash(key)
+    except TypeError:
+        return False
+    return True
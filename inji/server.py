@@ -0,0 +1,198 @@
+# Render daemon serving inji invocations over a unix socket
+#
+# `inji serve --socket PATH` binds the socket, imports and initialises
+# everything once and then forks a pool of workers that all accept() on it.
+# `inji --connect PATH ...` forwards its command line, working directory,
+# environment and STDIN to one of the workers, which renders exactly as
+# `inji ...` would have and streams the output back.
+#
+# A worker handles one request at a time so it is free to chdir() into the
+# client's directory. Workers keep their engines (and so compiled templates)
+# and parsed vars files across requests, these are invalidated by the mtime
+# of the underlying files.
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import signal
+import socket
+import socketserver
+import sys
+import traceback
+
+from . import cli, timeouts
+
+# Engines of this process by undefined variables mode and cli.engine_settings()
+engines = {}
+
+
+def engine(mode, **settings):
+    # modes come from clients (inji --worker, inji http), each would add an engine
+    if mode not in cli.STRICT_MODES:
+        raise ValueError(f"strict_mode must be one of {', '.join(cli.STRICT_MODES)}, not {mode!r}")
+    key = (mode, tuple(sorted(settings.items())))
+    if key not in engines:
+        engines[key] = cli.new_engine(mode, **settings)
+    return engines[key]
+
+
+def serve_args(argv=None):
+    parser = argparse.ArgumentParser(prog="inji serve", description="inji - render daemon")
+
+    parser.add_argument(
+        "--socket",
+        action="store",
+        required=True,
+        dest="socket",
+        metavar="PATH",
+        help="/path/to/inji.sock to listen on",
+    )
+
+    parser.add_argument(
+        "--workers",
+        action="store",
+        required=False,
+        type=int,
+        dest="workers",
+        default=os.cpu_count() or 1,
+        help="number of worker processes to pre-fork (defaults to the number of CPUs)",
+    )
+
+    return parser.parse_args(argv)
+
+
+def forwarded_argv(argv):
+    """Return argv without the --connect option the client was invoked with"""
+    ret = []
+    args = iter(argv)
+    for arg in args:
+        if arg == "--connect":
+            next(args, None)
+        elif not arg.startswith("--connect="):
+            ret.append(arg)
+    return ret
+
+
+@contextlib.contextmanager
+def environment(env):
+    """Have os.environ be env until the block exits"""
+    saved = dict(os.environ)
+    os.environ.clear()
+    os.environ.update(env)
+    try:
+        yield
+    finally:
+        os.environ.clear()
+        os.environ.update(saved)
+
+
+def exit_code(e):
+    """Return the exit status a SystemExit would have caused"""
+    if e.code is None:
+        return 0
+    return e.code if isinstance(e.code, int) else 1
+
+
+class Handler(socketserver.StreamRequestHandler):
+    """Render one request, a JSON line of argv, cwd, env and stdin
+
+    The request is rendered with the client's environment in os.environ.
+    Responds with JSON lines of {"out": block} for every block rendered
+    followed by {"err": stderr, "exit": status}.
+    """
+
+    def send(self, **msg):
+        self.wfile.write((json.dumps(msg) + "\n").encode("utf-8"))
+
+    def handle(self):
+        line = self.rfile.readline()
+        if not line:  # e.g. a client checking the daemon is up
+            return
+        request = json.loads(line)
+        stderr = io.StringIO()
+        code = 0
+        try:
+            with contextlib.redirect_stderr(stderr), environment(request["env"]):
+                os.chdir(request["cwd"])
+                args = cli.cli_args(request["argv"])
+                if args.connect or args.watch or args.worker:
+                    sys.exit("--connect, --watch and --worker can't be served by the daemon")
+                cli.run(
+                    args,
+                    engine=engine(args.undefined_variables_mode, **cli.engine_settings(args)),
+                    environ=request["env"],
+                    stdin=io.StringIO(request.get("stdin") or ""),
+                    out=lambda block: self.send(out=block),
+                )
+        except timeouts.Timeout as e:
+            code = 124  # as inji does without the daemon
+            stderr.write(f"inji: {e}\n")
+        except SystemExit as e:
+            code = exit_code(e)
+            if isinstance(e.code, str):
+                stderr.write(e.code + "\n")
+        except Exception:
+            code = 1
+            stderr.write(traceback.format_exc())
+        self.send(err=stderr.getvalue(), exit=code)
+
+
+def serve(path, workers=None):
+    """Serve render requests on the unix socket at path until terminated"""
+    workers = workers or os.cpu_count() or 1
+
+    with contextlib.suppress(FileNotFoundError):
+        os.remove(path)  # a stale socket left behind by a previous daemon
+    server = socketserver.UnixStreamServer(path, Handler)
+
+    # warm up before forking so every worker starts off with it
+    engine("strict", **cli.engine_settings(cli.cli_args([])))
+
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    children = set()
+    try:
+        while True:
+            while len(children) < workers:
+                pid = os.fork()
+                if pid == 0:  # pragma: no cover # runs in the worker
+                    signal.signal(signal.SIGINT, signal.SIG_DFL)
+                    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                    try:
+                        server.serve_forever()
+                    finally:
+                        os._exit(0)
+                children.add(pid)
+            # replace any worker that dies
+            pid, _ = os.wait()
+            children.discard(pid)
+    finally:
+        for pid in children:
+            with contextlib.suppress(ProcessLookupError):
+                os.kill(pid, signal.SIGTERM)
+        server.server_close()
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(path)
+
+
+def connect(path, argv, args):
+    """Have the daemon at path render argv, returning its exit status"""
+    request = dict(
+        argv=argv,
+        cwd=os.getcwd(),
+        env=dict(os.environ),
+        stdin=sys.stdin.read() if "-" in args.template else None,
+    )
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(path)
+        sock.sendall((json.dumps(request) + "\n").encode("utf-8"))
+        with sock.makefile("r", encoding="utf-8") as f:
+            for line in f:
+                msg = json.loads(line)
+                if "out" in msg:
+                    print(msg["out"])
+                if "exit" in msg:
+                    print(msg["err"], end="", file=sys.stderr)
+                    return msg["exit"]
+    raise ConnectionError(f"'{path}' closed the connection before the render completed")
@@ -0,0 +1,109 @@
+# Deterministic partitioning of render jobs across machines
+#
+# A CI fan-out runs the same `inji` invocation on N nodes, each with
+# --shard INDEX/COUNT. Every node must arrive at the same partition without
+# talking to the others, so assignment only depends on the job keys (and
+# optionally their weights) and never on node-local state such as absolute
+# paths, directory listing order or the hash seed of the interpreter.
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+
+from . import utils
+
+
+def parse(string):
+    """Parse a string of the form INDEX/COUNT into a tuple of ints"""
+    try:
+        index, count = (int(x) for x in string.split("/", 1))
+        if count < 1 or not 0 <= index < count:
+            raise ValueError("INDEX must be in the range 0 <= INDEX < COUNT")
+    except Exception as e:
+        msg = f"Invalid shard specification '{string}': {str(e)}"
+        print(msg, file=sys.stderr)
+        raise argparse.ArgumentTypeError(msg)
+    return index, count
+
+
+def job_key(template, record=None):
+    """Return the stable key identifying a render job"""
+    key = template if template == "-" else os.path.relpath(template)
+    if record is not None:
+        key = f"{key}#{record}"
+    return key
+
+
+def stable_hash(key):
+    """Return a hash of key that is identical across processes and hosts"""
+    return int.from_bytes(hashlib.sha1(key.encode("utf-8")).digest()[:8], "big")
+
+
+def weights_by_size(jobs):
+    """Weigh each job by the size of its template on disk"""
+    return {k: os.path.getsize(t) if t != "-" else 0 for k, t in jobs.items()}
+
+
+def read_weights(file):
+    """Read job weights (e.g. historical durations) from a YAML/JSON file"""
+    return {str(k): float(v) for k, v in utils.read_context(file).items()}
+
+
+def assign(keys, count, weights=None):
+    """Map each job key to a shard index
+
+    Without weights, jobs go to stable_hash(key) % count - adding or removing
+    a job never moves any other job. With weights, jobs are placed heaviest
+    first onto the least loaded shard (LPT scheduling) which balances the
+    total weight per shard at the cost of that stability.
+    """
+    if not weights:
+        return {k: stable_hash(k) % count for k in keys}
+
+    loads = [0.0] * count
+    ret = {}
+    # Unknown jobs weigh as much as the average known one
+    known = [weights[k] for k in keys if k in weights]
+    default = sum(known) / len(known) if known else 1.0
+    for k in sorted(keys, key=lambda k: (-weights.get(k, default), stable_hash(k), k)):
+        shard = min(range(count), key=lambda i: (loads[i], i))
+        loads[shard] += weights.get(k, default)
+        ret[k] = shard
+    return ret
+
+
+def select(templates, index, count, weights=None):
+    """Return those templates that shard index of count is to render"""
+    jobs = {job_key(t): t for t in templates}
+    assignment = assign(list(jobs), count, weights)
+    return [t for k, t in jobs.items() if assignment[k] == index]
+
+
+def write_manifest(file, index, count, outputs):
+    """Record the jobs (and the hashes of their output) a shard rendered"""
+    with open(file, "w") as f:
+        json.dump({"shard": [index, count], "jobs": outputs}, f, indent=2, sort_keys=True)
+
+
+def merge(manifests, templates):
+    """Check that shard manifests add up to exactly the given set of jobs
+
+    Returns a dict of problems found - jobs that are missing, jobs rendered
+    by more than one shard and jobs that were never asked for. All three are
+    empty when the shards cover the full set disjointly.
+    """
+    expected = {job_key(t) for t in templates}
+    seen = {}
+    for file in manifests:
+        with open(file) as f:
+            manifest = json.load(f)
+        for k in manifest["jobs"]:
+            seen.setdefault(k, []).append(file)
+
+    return {
+        "missing": sorted(expected - set(seen)),
+        "duplicated": sorted(k for k, v in seen.items() if len(v) > 1),
+        "unexpected": sorted(set(seen) - expected),
+    }
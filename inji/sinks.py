@@ -0,0 +1,177 @@
+# Destinations for rendered output other than STDOUT
+
+import contextvars
+import hashlib
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# The writer of the render in progress, used by template extensions that emit
+# files (e.g. {% output %}) without having to thread it through jinja2.
+writer = contextvars.ContextVar("writer", default=None)
+
+
+def fsync_dir(path):
+    """fsync a directory so that new entries in it are durable"""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+# Template suffixes dropped from the names of the files they render to
+SUFFIXES = (".j2", ".jinja2", ".jinja", ".tmpl", ".tpl")
+
+
+def output_path(output_dir, template):
+    """Return the path in output_dir that template renders to"""
+    name = os.path.basename(template)
+    for suffix in SUFFIXES:
+        if name.endswith(suffix) and name != suffix:
+            name = name[: -len(suffix)]
+            break
+    return os.path.join(output_dir, name)
+
+
+def output_collisions(output_dir, templates):
+    """Return the output paths in output_dir more than one of templates render to
+
+    As a dict of the output path to the templates rendering to it.
+    """
+    outputs = {}
+    for template in dict.fromkeys(os.path.abspath(t) for t in templates):
+        outputs.setdefault(output_path(output_dir, template), []).append(template)
+    return {path: ts for path, ts in outputs.items() if len(ts) > 1}
+
+
+def file_sha256(path, chunk_size=1 << 16):
+    """Return the SHA-256 of the contents of path, None if it does not exist"""
+    digest = hashlib.sha256()
+    try:
+        with open(path, "rb") as f:
+            while chunk := f.read(chunk_size):
+                digest.update(chunk)
+    except FileNotFoundError:
+        return None
+    return digest.hexdigest()
+
+
+def write_if_changed(path, text, sync=True):
+    """Atomically replace the contents of path with text, if they differ
+
+    The text is written to a temporary file next to path that is rename()d
+    over it, so readers only ever see the old or the new contents. When path
+    already holds text it is left alone - keeping its mtime so that whatever
+    watches it (make, config reloads, rsync) sees no change.
+
+    Returns whether path was written.
+    """
+    data = text.encode("utf-8")
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        st = None
+    if st is not None and st.st_size == len(data):
+        if file_sha256(path) == hashlib.sha256(data).hexdigest():
+            return False
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            if sync:
+                f.flush()
+                os.fsync(f.fileno())
+        if st is not None:
+            os.chmod(tmp, st.st_mode & 0o7777)
+        else:
+            umask = os.umask(0)
+            os.umask(umask)
+            os.chmod(tmp, 0o666 & ~umask)
+        os.replace(tmp, path)
+    except BaseException:
+        os.remove(tmp)
+        raise
+    if sync:
+        fsync_dir(directory)
+    return True
+
+
+class Writer:
+    """Write files on a pool of threads, fsync'ing them in batches
+
+    Files are written (with write_if_changed) as they are submitted but
+    only synced to disk once batch_size of them are pending (and on close) -
+    trading a bounded window of unsynced output for not paying an fsync per
+    (small) file. Writes to the same path are made in the order submitted, so
+    the last one submitted wins.
+    """
+
+    def __init__(self, root=".", workers=4, batch_size=32):
+        self.root = os.path.abspath(root)
+        self.batch_size = batch_size
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="inji-writer")
+        self._futures = []
+        self._latest = {}  # path to the future of the last write submitted for it
+        self._unsynced = []
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def path(self, path):
+        """Return path resolved against root, raising ValueError if it is not inside it"""
+        root = os.path.realpath(self.root)
+        resolved = os.path.realpath(os.path.join(root, path))
+        if resolved == root or os.path.commonpath([root, resolved]) != root:
+            raise ValueError(f"'{path}' is not a file inside '{self.root}'")
+        return resolved
+
+    def submit(self, path, text):
+        """Queue text to be written to path (relative to root)"""
+        path = self.path(path)
+        with self._lock:
+            future = self._pool.submit(self._write, path, text, self._latest.get(path))
+            self._latest[path] = future
+        self._futures.append(future)
+
+    def _write(self, path, text, previous=None):
+        if previous is not None:
+            # submitted (and so started) before this one - its error is raised on close()
+            previous.exception()
+        if not write_if_changed(path, text, sync=False):
+            return
+        with self._lock:
+            self._unsynced.append(path)
+            batch = self._unsynced if len(self._unsynced) >= self.batch_size else []
+            if batch:
+                self._unsynced = []
+        self._sync(batch)
+
+    def _sync(self, paths):
+        for path in paths:
+            fd = os.open(path, os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+        for d in {os.path.dirname(p) for p in paths}:
+            fsync_dir(d)
+
+    def close(self):
+        """Wait for all writes, sync what is left and raise the first error"""
+        self._pool.shutdown(wait=True)
+        with self._lock:
+            batch, self._unsynced = self._unsynced, []
+        self._sync(batch)
+        for future in self._futures:
+            future.result()
+        self._futures = []
+        self._latest = {}
@@ -0,0 +1,111 @@
+# Time budgets for renders and the external calls they make
+#
+# `--call-timeout SECONDS` bounds every command run and HTTP request made
+# (run(), GET(), git_*() falling back to git, ..), `--deadline SECONDS` the
+# render of each template: calls made while rendering get at most what is
+# left of it and the render itself is stopped once it is spent. The deadline
+# is carried by a context variable, so the threads of {% parallel for %}
+# loops, GET_many() and prefetches copying the context keep to it too.
+#
+# Going over either raises Timeout, saying which call (or render) went over
+# and at which line of which template. Renders are checked between the chunks
+# of output they produce and at every iteration of {% for %} loops, so loops
+# producing no output stop too.
+
+import contextlib
+import contextvars
+import time
+import traceback
+
+# The seconds any one call may take, if bounded (--call-timeout)
+call_timeout = None
+
+# The (time.monotonic(), seconds) the render in progress must end by, if any
+deadline = contextvars.ContextVar("deadline", default=None)
+
+
+class Timeout(TimeoutError):
+    """A call or render went over its time budget"""
+
+
+def start(seconds):
+    """Set a deadline seconds from now, unless an earlier one is set, returning its token"""
+    current = deadline.get()
+    if seconds is not None:
+        at = time.monotonic() + seconds
+        if current is None or at < current[0]:
+            current = (at, seconds)
+    return deadline.set(current)
+
+
+@contextlib.contextmanager
+def within(seconds):
+    """Keep what runs in the block to a deadline seconds from now"""
+    token = start(seconds)
+    try:
+        yield
+    finally:
+        deadline.reset(token)
+
+
+def expired():
+    current = deadline.get()
+    return current is not None and time.monotonic() >= current[0]
+
+
+class _Checked:
+    """An iterable raising Timeout once the deadline at has passed"""
+
+    def __init__(self, iterable, at):
+        self.iterable = iterable
+        self.at = at
+
+    def __len__(self):
+        # jinja2 falls back to counting the items for loop.length on TypeError
+        return len(self.iterable)
+
+    def __iter__(self):
+        for item in self.iterable:
+            if time.monotonic() >= self.at:
+                raise exceeded("render", None)
+            yield item
+
+
+def checked(iterable):
+    """Return iterable, stopping iterating over it once the deadline has passed"""
+    current = deadline.get()
+    return iterable if current is None else _Checked(iterable, current[0])
+
+
+def remaining(what):
+    """Return the seconds what (a call about to be made) may take, None if unbounded"""
+    budget = call_timeout
+    current = deadline.get()
+    if current is not None:
+        left = current[0] - time.monotonic()
+        if left <= 0:
+            raise Timeout(f"{what} not made, the deadline of {current[1]:g}s had passed")
+        budget = left if budget is None else min(budget, left)
+    return budget
+
+
+def exceeded(what, budget):
+    """Return the Timeout for what having taken longer than its budget"""
+    current = deadline.get()
+    if current is not None and time.monotonic() >= current[0]:
+        return Timeout(f"{what} went past the deadline of {current[1]:g}s")
+    return Timeout(f"{what} took longer than {budget:g}s")
+
+
+def locate(tb):
+    """Return the template lines the traceback tb passes through, innermost first"""
+    lines = [
+        f"{frame.f_code.co_filename}:{lineno}"
+        for frame, lineno in traceback.walk_tb(tb)
+        # frames of template code as rewritten by jinja
+        if "__jinja_exception__" in frame.f_globals
+    ]
+    if not lines:
+        return ""
+    lines.reverse()
+    return f" at {lines[0]}" + (f" (via {', '.join(lines[1:])})" if lines[1:] else "")
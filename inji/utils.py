@@ -1,9 +1,15 @@
 import argparse
+import collections
+import contextvars
+import copy
 import fnmatch
 import json
 import os
+import shlex
 import subprocess
 import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from os.path import (  # noqa: F401 — re-exported as utils.basename etc.
     abspath,
     basename,
@@ -17,6 +23,9 @@ from os.path import (  # noqa: F401 — re-exported as utils.basename etc.
 
 import requests
 import yaml
+from requests.adapters import HTTPAdapter
+
+from . import timeouts
 
 
 def json_parse(string):
@@ -42,8 +51,24 @@ def kv_parse(string):
     return {key: val}
 
 
+# Parsed vars files by path, along with the stat() they were parsed at
+_contexts = {}
+context_cache_stats = collections.Counter()
+
+
 def read_context(yaml_file):
     yaml_file = yaml_file.__str__()
+
+    # A long-lived process (e.g. inji serve) re-reads the same vars files for
+    # every render, only parse them again when they have changed.
+    st = os.stat(yaml_file)
+    stamp = (st.st_ino, st.st_mtime_ns, st.st_size)
+    cached = _contexts.get(yaml_file)
+    if cached is not None and cached[0] == stamp:
+        context_cache_stats["hits"] += 1
+        return copy.deepcopy(cached[1])
+    context_cache_stats["misses"] += 1
+
     with open(yaml_file) as f:
         try:
             in_vars = yaml.load(f, Loader=yaml.SafeLoader)
@@ -51,7 +76,8 @@ def read_context(yaml_file):
                 raise TypeError(f"'{yaml_file}' contains no data")
         except TypeError as exc:
             raise exc
-    return in_vars
+    _contexts[yaml_file] = (stamp, in_vars)
+    return copy.deepcopy(in_vars)
 
 
 def recursive_iglob(rootdir=".", pattern="*"):
@@ -91,16 +117,86 @@ def file_or_stdin(file):
     return path(file)
 
 
+# The cassette.Cassette that cmd() and get() are recorded to or replayed
+# from, if any (--record/--replay)
+cassette = None
+
+
 def cmd(args):
-    return subprocess.check_output(args.split(" ")).decode("utf-8").strip()
+    if cassette is not None:
+        return cassette.call("cmd", args, _cmd)
+    return _cmd(args)
+
+
+# The coprocess.Pool of shells commands are run through, if any (--coprocesses)
+coprocesses = None
+
+
+def _cmd(args):
+    argv = shlex.split(args)
+    if not argv:
+        raise ValueError("No command to run")
+    timeout = timeouts.remaining(f"command '{args}'")
+    try:
+        if coprocesses is not None:
+            return coprocesses.run(argv, timeout=timeout).decode("utf-8").strip()
+        return subprocess.check_output(argv, timeout=timeout).decode("utf-8").strip()
+    except subprocess.TimeoutExpired:
+        raise timeouts.exceeded(f"command '{args}'", timeout) from None
 
 
 def load_file(file):
     return open(file, encoding="utf-8").read().strip()
 
 
+# Connections are pooled, and kept alive, per host across all the GET()s of
+# the process - at most http_pool_size of them to any one host.
+http_pool_size = 16
+_session = None
+_session_lock = threading.Lock()
+
+
+def session():
+    """Return the requests.Session shared by the process"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=http_pool_size, pool_maxsize=http_pool_size)
+            _session.mount("http://", adapter)
+            _session.mount("https://", adapter)
+        return _session
+
+
+def configure_http(pool_size):
+    """Set the number of connections kept to any one host"""
+    global _session, http_pool_size
+    with _session_lock:
+        http_pool_size = pool_size
+        if _session is not None:
+            _session.close()
+        _session = None
+
+
+# The httpcache.HTTPCache get() goes through, if any (--http-cache-dir)
+http_cache = None
+
+
 def get(url):
-    response = requests.get(url)
+    if cassette is not None:
+        return cassette.call("get", url, _get)
+    return _get(url)
+
+
+def _get(url):
+    timeout = timeouts.remaining(f"GET {url}")
+    try:
+        if http_cache is not None:
+            response = http_cache.get(session(), url, timeout=timeout)
+        else:
+            response = session().get(url, timeout=timeout)
+    except requests.Timeout:
+        raise timeouts.exceeded(f"GET {url}", timeout) from None
     if (
         "Content-Type" in response.headers
         and response.headers["Content-Type"] == "application/json"
@@ -111,6 +207,17 @@ def get(url):
     return ret
 
 
+def get_many(urls, workers=None):
+    """GET urls concurrently, returning what get() does for each in order"""
+    urls = list(urls)
+    if not urls:
+        return []
+    with ThreadPoolExecutor(max_workers=workers or http_pool_size) as pool:
+        # each in a copy of the context, keeping to the deadline of the render
+        futures = [pool.submit(contextvars.copy_context().run, get, url) for url in urls]
+        return [f.result() for f in futures]
+
+
 def ip_api(key):
     return json.loads(get("http://ip-api.com/json"))[key]
 
@@ -0,0 +1,122 @@
+# Re-render templates whenever they, or anything they depend on, change
+#
+# Files are polled with stat() so there is nothing to install and it works
+# the same everywhere. A change to any vars file means a new context, and so
+# re-rendering everything. A change to a template only re-renders the
+# templates that include, import or extend it (directly or not).
+
+import os
+import sys
+import threading
+import traceback
+
+
+def stamp(path):
+    """Return what identifies the current version of path (None if missing)"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+class Watch:
+    def __init__(
+        self,
+        templates,
+        vars_files,
+        context,
+        dependencies,
+        render,
+        interval=0.5,
+        debounce=0.1,
+    ):
+        """
+        templates       the templates to keep rendered
+        vars_files      callable returning the current list of vars files
+        context         callable returning the context from those vars files
+        dependencies    callable returning the files a template is made up of
+        render          callable rendering a template with a context
+        """
+        self.templates = list(templates)
+        self.vars_files = vars_files
+        self.context = context
+        self.dependencies = dependencies
+        self.render = render
+        self.interval = interval
+        self.debounce = debounce
+        self.closure = {}
+        self._vars_stamps = {}
+        self._stamps = {}
+
+    def _changes(self, update=True):
+        """Return the vars files and other files changed since last looked at"""
+        vars_files = {os.path.abspath(f) for f in self.vars_files()}
+        vars_now = {p: stamp(p) for p in vars_files | set(self._vars_stamps)}
+        now = {p: stamp(p) for p in self._stamps}
+        ret = (
+            {p for p, s in vars_now.items() if s != self._vars_stamps.get(p)},
+            {p for p, s in now.items() if s != self._stamps[p]},
+        )
+        if update:
+            self._vars_stamps, self._stamps = vars_now, now
+        return ret
+
+    def _render(self, template, context):
+        try:
+            # look at what the template is made up of before rendering so
+            # changes made while it renders are still picked up
+            self.closure[template] = self.dependencies(template)
+        except Exception:
+            self.closure[template] = {os.path.abspath(template)}
+        for path in self.closure[template]:
+            self._stamps.setdefault(path, stamp(path))
+        try:
+            self.render(template, context)
+        except Exception:
+            traceback.print_exc(file=sys.stderr)
+
+    def affected(self, changed):
+        """Return the templates made up of any of the changed files"""
+        return [t for t in self.templates if self.closure.get(t, set()) & changed]
+
+    def run(self, stop=None):
+        """Render all templates and then whatever changes affect until stopped"""
+        stop = stop or threading.Event()
+        pending, context = list(self.templates), None
+        self._changes()
+
+        while not stop.is_set():
+            if pending and context is None:
+                try:
+                    context = self.context()
+                except Exception:
+                    traceback.print_exc(file=sys.stderr)
+                    pending = []
+
+            done = 0
+            for template in pending:
+                # stop rendering what is about to be superseded by newer changes
+                if done and any(self._changes(update=False)):
+                    break
+                self._render(template, context)
+                done += 1
+            pending = pending[done:]
+
+            stop.wait(self.interval)
+            vars_changed, changed = self._changes()
+            if not (vars_changed or changed):
+                continue
+
+            # let a burst of changes (e.g. a checkout or an editor save) settle
+            while not stop.wait(self.debounce):
+                more = self._changes()
+                if not any(more):
+                    break
+                vars_changed |= more[0]
+                changed |= more[1]
+
+            if vars_changed:
+                context, pending = None, list(self.templates)
+            else:
+                pending = list(dict.fromkeys(pending + self.affected(changed)))
@@ -0,0 +1,93 @@
+# Persistent worker speaking NDJSON over STDIN/STDOUT
+#
+# `inji --worker` is meant to be spawned once by a build system and fed
+# render requests, one JSON object per line on STDIN
+#
+#   {"requestId": 7, "template": "a.j2", "vars": ["base.yml", "prod.yml"],
+#    "context": {"k": "v"}, "output": "a.conf", "strict_mode": "strict",
+#    "deadline": 30}
+#
+# and answers each one with a JSON line on STDOUT
+#
+#   {"requestId": 7, "exitCode": 0, "output": "", "error": ""}
+#
+# where output holds the rendered text when no output path was requested
+# and deadline (optional, defaulting to that of --deadline) is the seconds the
+# render may take.
+# Vars files are layered in order with the context on top - the process
+# environment is deliberately left out to keep renders hermetic. Requests
+# are rendered concurrently so responses may come back out of order.
+
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from . import server, sinks, timeouts, utils
+
+
+def render(request):
+    """Render a request, returning the rendered text"""
+    context = {}
+    for file in request.get("vars", []):
+        context.update(utils.read_context(file))
+    context.update(request.get("context", {}))
+
+    engine = server.engine(request.get("strict_mode", "strict"))
+    with timeouts.within(request.get("deadline")):
+        return "\n".join(engine.render(template=request["template"], context=context))
+
+
+def handle(request, deadline=None):
+    """Render a request, returning the response to it"""
+    response = dict(requestId=request.get("requestId", 0), exitCode=0, output="", error="")
+    if deadline is not None:
+        request = {"deadline": deadline, **request}
+    try:
+        text = render(request)
+        if request.get("output"):
+            sinks.write_if_changed(request["output"], text + "\n")
+        else:
+            response["output"] = text
+    except Exception as e:
+        response.update(exitCode=1, error=f"{type(e).__name__}: {str(e)}")
+    return response
+
+
+def serve(stdin, stdout, workers=None, deadline=None):
+    """Answer requests read from stdin on stdout until stdin is closed"""
+    lock = threading.Lock()
+
+    def respond(response):
+        with lock:
+            stdout.write(json.dumps(response) + "\n")
+            stdout.flush()
+
+    def answer(request_id):
+        # every request is answered - a build tool would otherwise wait forever
+        def callback(future):
+            try:
+                response = future.result()
+            except Exception as e:
+                response = dict(
+                    requestId=request_id, exitCode=1, output="", error=f"{type(e).__name__}: {e}"
+                )
+            respond(response)
+
+        return callback
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="inji-worker") as pool:
+        for line in stdin:
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+            except ValueError as e:
+                respond(dict(requestId=None, exitCode=2, output="", error=f"Invalid request: {e}"))
+                continue
+            if not isinstance(request, dict):
+                error = f"Invalid request: expected a JSON object, not {type(request).__name__}"
+                respond(dict(requestId=None, exitCode=2, output="", error=error))
+                continue
+            future = pool.submit(handle, request, deadline)
+            future.add_done_callback(answer(request.get("requestId", 0)))
+    return 0
@@ -2,6 +2,8 @@
 Unit test fixtures (inherited from tests/conftest.py + unit-specific additions).
 """
 
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from unittest.mock import MagicMock
 
 import pytest
@@ -59,3 +61,55 @@ def mock_subprocess():
     mock.run.return_value.stdout = b"command output"
     mock.run.return_value.returncode = 0
     return mock
+
+
+@pytest.fixture
+def http_server():
+    """
+    Local HTTP/1.1 (keep-alive) server standing in for remote endpoints.
+    Set server.routes[path] to a callable taking the request handler and
+    returning (status, headers, body); server.seen records the path, client
+    port and headers of every request.
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            server.seen.append((self.path, self.client_address[1], dict(self.headers)))
+            route = server.routes.get(self.path)
+            status, headers, body = route(self) if route else (404, {}, "not found")
+            body = body.encode("utf-8")
+            self.send_response(status)
+            for k, v in headers.items():
+                self.send_header(k, v)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    server.routes, server.seen = {}, []
+    server.url = f"http://127.0.0.1:{server.server_address[1]}"
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def no_native_git(monkeypatch):
+    """
+    Make the git_* globals run git commands (through inji.utils.cmd) rather
+    than read the repository themselves.
+    """
+    from inji import git
+
+    def unsupported(path="."):
+        raise git.Unsupported("disabled in tests")
+
+    monkeypatch.setattr(git, "repository", unsupported)
@@ -0,0 +1,117 @@
+"""
+Unit tests for inji.cache module.
+
+Tests the content-addressed render cache:
+- What template analysis finds (names, references, impurities, side effects)
+- Fingerprints of values keeping their types
+- Disk entries, hit/miss stats and LRU eviction
+"""
+
+import collections
+import os
+
+import pytest
+from jinja2 import Environment
+from markupsafe import Markup
+
+from inji import cache
+
+
+class Thing:
+    """An object whose repr leaves out its state"""
+
+    def __init__(self, value):
+        self.value = value
+
+
+def analyse(source):
+    env = Environment(extensions=["inji.extensions.OutputExtension"])
+    env.filters["env_override"] = env.filters["shuffle"] = lambda v, *args: v
+    return cache.analyse(env.parse(source))
+
+
+class TestAnalyse:
+    def test_names_and_references(self):
+        analysis = analyse('{% include "a.j2" %}{{ x }}{% set y = 1 %}{{ y }}')
+        assert analysis["names"] == ["x"]
+        assert analysis["refs"] == ["a.j2"]
+        assert not analysis["dynamic"]
+
+    def test_dynamic_includes(self):
+        assert analyse("{% include name %}")["dynamic"]
+
+    def test_impure_globals_and_filters(self):
+        assert analyse("{{ now() }}{{ x | env_override('X') }}")["impure"] == [
+            "env_override",
+            "now",
+        ]
+        assert analyse("{{ x | upper }}")["impure"] == []
+        assert analyse("{{ lipsum() }}{{ x | random }}{{ x | shuffle }}")["impure"] == [
+            "lipsum",
+            "random",
+            "shuffle",
+        ]
+
+    def test_output_blocks_write(self):
+        assert analyse('{% output "f" %}x{% endoutput %}')["writes"]
+        assert not analyse("x")["writes"]
+
+
+class TestDigest:
+    def test_types_kept(self):
+        values = [1, 1.0, True, "1", None, [1], (1,), {1}, frozenset({1}), b"1", Markup("1")]
+        assert len({cache.digest(v) for v in values}) == len(values)
+        assert cache.digest({1: "x"}) != cache.digest({"1": "x"})
+        assert cache.digest({True: "x"}) != cache.digest({1: "x"})
+
+    def test_order_of_dicts_and_sets_ignored(self):
+        assert cache.digest({"a": 1, "b": 2}) == cache.digest({"b": 2, "a": 1})
+        assert cache.digest({3, 1, 2}) == cache.digest({2, 3, 1})
+
+    def test_mixed_keys(self):
+        assert cache.digest({1: "x", "a": "y", None: "z"}) == cache.digest(
+            {"a": "y", None: "z", 1: "x"}
+        )
+
+    def test_objects_told_apart_by_state(self):
+        assert cache.digest(Thing(1)) == cache.digest(Thing(1))
+        assert cache.digest(Thing(1)) != cache.digest(Thing(2))
+        assert cache.digest(collections.OrderedDict(a=1)) != cache.digest({"a": 1})
+
+    def test_unfingerprintable(self):
+        with pytest.raises(TypeError):
+            cache.digest(lambda: 1)
+        loop = []
+        loop.append(loop)
+        with pytest.raises(TypeError):
+            cache.digest(loop)
+
+
+class TestDiskCache:
+    def test_get_and_set(self, tmp_path):
+        c = cache.DiskCache(tmp_path)
+        assert c.get("ab12") is None
+        c.set("ab12", "text")
+        assert c.get("ab12") == "text"
+        assert c.stats == {"hits": 1, "misses": 1}
+
+    def test_shared_by_instances(self, tmp_path):
+        cache.DiskCache(tmp_path).set("ab12", "text")
+        assert cache.DiskCache(tmp_path).get("ab12") == "text"
+
+    def test_least_recently_used_evicted(self, tmp_path):
+        c = cache.DiskCache(tmp_path)
+        for i, key in enumerate(["aa", "bb", "cc"]):
+            c.set(key, "xxxx")
+            os.utime(c.path(key), ns=(i, i))
+        c.get("aa")  # now the most recently used
+        c.max_size = 10
+        c.prune()
+        assert c.get("bb") is None
+        assert c.get("aa") == c.get("cc") == "xxxx"
+
+    def test_pruned_as_entries_are_written(self, tmp_path):
+        c = cache.DiskCache(tmp_path, max_size=100)
+        for i in range(50):
+            c.set(f"{i:04x}", "x" * 10)
+        assert sum(e[1] for e in c.entries()) <= 100
@@ -0,0 +1,68 @@
+"""
+Unit tests for inji.cassette module.
+
+Tests recording and replaying the side effects of renders:
+- Calls recorded to and replayed from a gzipped cassette
+- Replay misses
+- utils.cmd and utils.get going through the cassette
+"""
+
+import gzip
+from unittest.mock import patch
+
+import pytest
+
+from inji import cassette, utils
+
+
+class TestCassette:
+    def test_record_then_replay(self, tmp_path):
+        path = str(tmp_path / "c.json.gz")
+        recorder = cassette.Cassette(path, mode="record")
+        assert recorder.call("cmd", "echo hi", lambda a: "hi") == "hi"
+        assert recorder.call("get", "http://x", lambda a: {"a": [1]}) == {"a": [1]}
+        recorder.save()
+
+        player = cassette.Cassette(path)
+        assert player.call("cmd", "echo hi", None) == "hi"
+        assert player.call("get", "http://x", None) == {"a": [1]}
+        with gzip.open(path, "rt") as f:
+            assert '"cmd echo hi"' in f.read()
+
+    def test_replay_miss(self, tmp_path):
+        path = str(tmp_path / "c.json.gz")
+        cassette.Cassette(path, mode="record").save()
+        with pytest.raises(cassette.ReplayError, match="cmd 'date' was not recorded"):
+            cassette.Cassette(path).call("cmd", "date", None)
+
+    def test_recording_adds_to_cassette(self, tmp_path):
+        path = str(tmp_path / "c.json.gz")
+        first = cassette.Cassette(path, mode="record")
+        first.call("cmd", "a", str.upper)
+        first.save()
+        second = cassette.Cassette(path, mode="record")
+        second.call("cmd", "b", str.upper)
+        second.save()
+        assert cassette.Cassette(path).calls == {"cmd a": "A", "cmd b": "B"}
+
+    def test_invalid_mode(self, tmp_path):
+        with pytest.raises(ValueError):
+            cassette.Cassette(str(tmp_path / "c"), mode="rewind")
+
+
+class TestUtils:
+    def test_cmd_and_get_replayed(self, tmp_path, monkeypatch):
+        path = str(tmp_path / "c.json.gz")
+        monkeypatch.setattr(utils, "cassette", cassette.Cassette(path, mode="record"))
+        with patch("inji.utils._get", return_value="body"):
+            assert utils.cmd("echo hello") == "hello"
+            assert utils.get("http://example.com") == "body"
+        utils.cassette.save()
+
+        monkeypatch.setattr(utils, "cassette", cassette.Cassette(path))
+        with patch("inji.utils.subprocess.check_output") as check_output:
+            with patch("inji.utils.requests.Session.get") as get:
+                assert utils.cmd("echo hello") == "hello"
+                assert utils.get("http://example.com") == "body"
+        check_output.assert_not_called()
+        get.assert_not_called()
@@ -0,0 +1,124 @@
+"""
+Unit tests for inji.check module.
+
+Tests checking rendered templates against files on disk:
+- Streamed line by line comparison and its summaries
+- {% output %} files compared rather than written
+- Checking templates on forked workers, including from several threads at once
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from inji import check
+from inji.engine import TemplateEngine
+
+
+class TestCompare:
+    @pytest.mark.parametrize(
+        "chunks",
+        [["a\nb\n"], ["a\n", "b\n"], ["a", "\nb", "\n"], ["", "a\nb\n", ""]],
+    )
+    def test_same_content_however_chunked(self, tmp_path, chunks):
+        path = tmp_path / "f"
+        path.write_text("a\nb\n")
+        assert check.compare(chunks, path) is None
+
+    def test_first_differing_line_summarised(self, tmp_path):
+        path = tmp_path / "f"
+        path.write_text("a\nb\nc\n")
+        assert check.compare(["a\nB\nC\n"], path, name="f") == "f:2\n- b\n+ B"
+
+    def test_missing_file(self, tmp_path):
+        assert check.compare(["a"], tmp_path / "f", name="f") == "f: missing"
+
+    def test_file_longer(self, tmp_path):
+        path = tmp_path / "f"
+        path.write_text("a\nb\n")
+        assert check.compare(["a\n"], path, name="f") == "f:2\n- b"
+
+    def test_file_shorter(self, tmp_path):
+        path = tmp_path / "f"
+        path.write_text("a\n")
+        assert check.compare(["a\nb\n"], path, name="f") == "f:2\n+ b"
+
+    def test_missing_trailing_newline(self, tmp_path):
+        path = tmp_path / "f"
+        path.write_text("a")
+        assert check.compare(["a\n"], path) is not None
+
+
+class TestCheck:
+    def _tree(self, tmp_path, count=3):
+        templates = []
+        for i in range(count):
+            template = tmp_path / f"t{i}.j2"
+            template.write_text(f"{{{{ greeting }}}} {i}")
+            templates.append(str(template))
+        out = tmp_path / "out"
+        out.mkdir()
+        for i in range(count):
+            (out / f"t{i}").write_text(f"hello {i}\n")
+        return templates, str(out)
+
+    @pytest.mark.parametrize("workers", [1, 2])
+    def test_up_to_date(self, tmp_path, workers):
+        templates, out = self._tree(tmp_path)
+        drifted = check.check(
+            TemplateEngine(), templates, {"greeting": "hello"}, output_dir=out, workers=workers
+        )
+        assert drifted == []
+
+    @pytest.mark.parametrize("workers", [1, 2])
+    def test_drift_reported_in_template_order(self, tmp_path, workers):
+        templates, out = self._tree(tmp_path)
+        drifted = check.check(
+            TemplateEngine(), templates, {"greeting": "hi"}, output_dir=out, workers=workers
+        )
+        assert [d.splitlines()[0] for d in drifted] == [f"{out}/t{i}:1" for i in range(3)]
+
+    def test_concurrent_checks_keep_their_contexts(self, tmp_path):
+        templates, out = self._tree(tmp_path)
+        engine = TemplateEngine()
+        with ThreadPoolExecutor(2) as pool:
+            results = list(
+                pool.map(
+                    lambda greeting: check.check(
+                        engine, templates, {"greeting": greeting}, output_dir=out, workers=2
+                    ),
+                    ["hello", "hi"] * 4,
+                )
+            )
+        assert [len(r) for r in results] == [0, 3] * 4
+
+    def test_render_errors_reported(self, tmp_path):
+        templates, out = self._tree(tmp_path, count=1)
+        (drifted,) = check.check(TemplateEngine(), templates, {}, output_dir=out)
+        assert "UndefinedError" in drifted
+
+    def test_output_blocks_compared_not_written(self, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        template = tmp_path / "t.j2"
+        template.write_text('{% output "extra.txt" %}new{% endoutput %}')
+        (tmp_path / "t").write_text("\n")
+        (tmp_path / "extra.txt").write_text("old")
+        drifted = check.check(TemplateEngine(), [str(template)], {}, output_dir=str(tmp_path))
+        assert drifted == ["extra.txt:1\n- old\n+ new"]
+        assert (tmp_path / "extra.txt").read_text() == "old"
+
+    def test_last_output_block_for_a_path_compared(self, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        template = tmp_path / "t.j2"
+        template.write_text(
+            '{% output "extra.txt" %}old{% endoutput %}{% output "extra.txt" %}new{% endoutput %}'
+        )
+        (tmp_path / "t").write_text("\n")
+        (tmp_path / "extra.txt").write_text("new")
+        assert check.check(TemplateEngine(), [str(template)], {}, output_dir=str(tmp_path)) == []
+
+    def test_single_output_file(self, tmp_path):
+        templates, _ = self._tree(tmp_path, count=2)
+        out = tmp_path / "all"
+        out.write_text("hello 0\nhello 1\n")
+        assert check.check(TemplateEngine(), templates, {"greeting": "hello"}, output=out) == []
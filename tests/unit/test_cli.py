@@ -6,8 +6,11 @@ Tests CLI argument parsing and main() entry-point logic:
 - Context assembly (precedence: vars files < env vars < json < kv)
 - Stdin handling (dash / tempfile flow)
 - Version helpers
+- Subcommands, and templates named like them
 """
 
+import io
+import json
 import os
 import tempfile
 from pathlib import Path
@@ -15,7 +18,17 @@ from unittest.mock import patch
 
 import pytest
 
-from inji import cli
+from inji import cli, facts, sinks, utils
+from inji.httpcache import OfflineError
+
+
+def run_main(argv, output=None):
+    """Run `inji argv...` collecting what it prints to STDOUT in output, which is returned"""
+    output = [] if output is None else output
+    stdout = lambda *a, **kw: "file" in kw or output.append(*a)
+    with patch("sys.argv", ["inji"] + argv), patch("builtins.print", side_effect=stdout):
+        cli.main()
+    return output
 
 
 class TestPkgLocation:
@@ -105,6 +118,26 @@ class TestCliArgs:
             self._parse(["--version"])
 
 
+class TestSubcommand:
+    def test_subcommands(self, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        for name in cli.SUBCOMMANDS:
+            assert cli.subcommand([name, "--help"]) == name
+        assert cli.subcommand(["t.j2"]) is None
+        assert cli.subcommand([]) is None
+
+    def test_template_named_like_a_subcommand_rendered(self, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        (tmp_path / "serve").write_text("served {{ 1 + 1 }}")
+        assert cli.subcommand(["serve"]) is None
+        output = []
+        with patch("sys.argv", ["inji", "serve"]), patch("inji.server.serve") as serve:
+            with patch("builtins.print", side_effect=output.append):
+                cli.main()
+        serve.assert_not_called()
+        assert output == ["served 2"]
+
+
 class TestMain:
     """Test main() context assembly and rendering."""
 
@@ -239,3 +272,284 @@ class TestMain:
                 assert out == [""]
             finally:
                 os.unlink(f.name)
+
+
+class TestShard:
+    """Test --shard, --shard-manifest and --shard-merge."""
+
+    def test_shards_render_disjoint_complete_slices(self, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        templates = []
+        for i in range(10):
+            t = tmp_path / f"t{i}.j2"
+            t.write_text(f"t{i}")
+            templates.append(str(t))
+
+        outputs, manifests = [], []
+        for i in range(3):
+            m = str(tmp_path / f"shard-{i}.json")
+            outputs += run_main(["--shard", f"{i}/3", "--shard-manifest", m, *templates])
+            manifests.append(m)
+
+        assert sorted(outputs) == sorted(f"t{i}" for i in range(10))
+
+        merge = ["--shard-merge", manifests[0], "--shard-merge", manifests[1]]
+        with pytest.raises(SystemExit) as e:
+            run_main(merge + ["--shard-merge", manifests[2], *templates])
+        assert e.value.code == 0
+
+        with pytest.raises(SystemExit) as e:
+            run_main(merge + templates)
+        assert e.value.code == 1
+
+    def test_shard_weights_by_size(self, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        big, small = tmp_path / "big.j2", tmp_path / "small.j2"
+        big.write_text("x" * 100)
+        small.write_text("y")
+        first = run_main(["--shard", "0/2", "--shard-weights", "size", str(big), str(small)])
+        second = run_main(["--shard", "1/2", "--shard-weights", "size", str(big), str(small)])
+        assert len(first) == len(second) == 1
+
+
+class TestJournal:
+    """Test --journal and --resume."""
+
+    def test_resume_requires_journal(self):
+        with pytest.raises(SystemExit):
+            with patch("sys.argv", ["inji", "--resume"]):
+                cli.cli_args()
+
+    def test_resume_requires_output_dir(self):
+        for argv in (["--resume"], ["--output", "out", "--resume"]):
+            with pytest.raises(SystemExit):
+                cli.cli_args(["--journal", "journal", *argv, "t.j2"])
+
+    def test_resume_skips_completed_templates(self, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        first, second = tmp_path / "first.j2", tmp_path / "second.j2"
+        first.write_text("first")
+        second.write_text("{{ needed }}")
+        journal = str(tmp_path / "journal")
+        argv = ["--journal", journal, "--resume", "--output-dir", "out", str(first), str(second)]
+
+        # the run dies on the second template but the first is journaled
+        with pytest.raises(Exception):
+            run_main(argv)
+
+        with patch("inji.sinks.write_if_changed", wraps=sinks.write_if_changed) as write:
+            run_main(["-d", "needed=second"] + argv)
+        assert [c.args[0] for c in write.call_args_list] == [os.path.join("out", "second")]
+        assert (tmp_path / "out" / "second").read_text() == "second\n"
+
+    def test_resume_renders_changed_templates_again(self, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        (tmp_path / "motd.j2").write_text("{% include 'name.j2' %} {{ greeting }}")
+        (tmp_path / "name.j2").write_text("world")
+        argv = ["--journal", "journal", "--resume", "--output-dir", "out", "motd.j2"]
+        motd = tmp_path / "out" / "motd"
+
+        run_main(["-d", "greeting=hi"] + argv)
+        assert motd.read_text() == "world hi\n"
+        (tmp_path / "name.j2").write_text("there")
+        run_main(["-d", "greeting=hi"] + argv)
+        assert motd.read_text() == "there hi\n"
+        run_main(["-d", "greeting=ho"] + argv)
+        assert motd.read_text() == "there ho\n"
+
+    def test_journal_without_resume_starts_afresh(self, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        (tmp_path / "motd.j2").write_text("{{ now() }}")
+        argv = ["--journal", "journal", "--output-dir", "out", "motd.j2"]
+        run_main(argv)
+        run_main(argv)
+        assert len((tmp_path / "journal").read_text().splitlines()) == 1
+
+
+class TestOutput:
+    """Test --output and --output-dir."""
+
+    def test_output_and_output_dir_exclusive(self):
+        with pytest.raises(SystemExit):
+            cli.cli_args(["--output", "a", "--output-dir", "b", "-"])
+
+    def test_output_dir_needs_template_files(self):
+        with pytest.raises(SystemExit):
+            cli.cli_args(["--output-dir", "b"])
+
+    def test_output_dir_collisions_refused(self, tmp_path, capsys):
+        for d in ("a", "b"):
+            (tmp_path / d).mkdir()
+            (tmp_path / d / "motd.j2").write_text(d)
+        (tmp_path / "a" / "motd").write_text("x")
+        templates = [str(tmp_path / "a/motd.j2"), str(tmp_path / "b/motd.j2")]
+        with pytest.raises(SystemExit):
+            cli.cli_args(["--output-dir", str(tmp_path / "out"), *templates])
+        assert "would all be rendered to" in capsys.readouterr().err
+        # the same template given twice, or templates whose names only differ in suffix
+        args = cli.cli_args(["--output-dir", "out", templates[0], templates[0]])
+        assert args.template == [templates[0], templates[0]]
+        with pytest.raises(SystemExit):
+            cli.cli_args(["--output-dir", "out", templates[0], str(tmp_path / "a/motd")])
+
+    def test_output_written_once_and_left_alone(self, tmp_path):
+        first, second = tmp_path / "first.j2", tmp_path / "second.j2"
+        first.write_text("first")
+        second.write_text("second")
+        out = tmp_path / "out.txt"
+        argv = ["--output", str(out), str(first), str(second)]
+
+        assert run_main(argv) == []
+        assert out.read_text() == "first\nsecond\n"
+        os.utime(out, ns=(1, 1))
+        run_main(argv)
+        assert out.stat().st_mtime_ns == 1
+
+    def test_output_dir_named_after_templates(self, tmp_path):
+        (tmp_path / "motd.j2").write_text("hello {{ name }}")
+        run_main(
+            ["-d", "name=world", "--output-dir", str(tmp_path / "out"), str(tmp_path / "motd.j2")]
+        )
+        assert (tmp_path / "out" / "motd").read_text() == "hello world\n"
+
+    def test_resume_renders_changed_outputs_again(self, tmp_path):
+        template = tmp_path / "a.j2"
+        template.write_text("a")
+        outdir, journal = tmp_path / "out", str(tmp_path / "journal")
+        argv = ["--journal", journal, "--resume", "--output-dir", str(outdir), str(template)]
+
+        run_main(argv)
+        (outdir / "a").write_text("tampered")
+        run_main(argv)
+        assert (outdir / "a").read_text() == "a\n"
+
+
+class TestCheck:
+    """Test --check."""
+
+    def test_check_requires_an_output(self):
+        with pytest.raises(SystemExit):
+            cli.cli_args(["--check", "-"])
+
+    def test_check_exits_non_zero_on_drift(self, tmp_path):
+        template, out = tmp_path / "a.j2", tmp_path / "a.txt"
+        template.write_text("{{ v }}")
+        out.write_text("old\n")
+        argv = ["--check", "--output", str(out), str(template)]
+        for value, code in (("old", 0), ("new", 1)):
+            output = []
+            with pytest.raises(SystemExit) as e:
+                run_main(["-d", f"v={value}"] + argv, output)
+            assert e.value.code == code
+        assert output == [f"{out}:1\n- old\n+ new"]
+        assert out.read_text() == "old\n"
+
+
+class TestWorkerMode:
+    """Test --worker."""
+
+    def test_worker_answers_requests_on_stdout(self, tmp_path, capsys):
+        (tmp_path / "t.j2").write_text("{{ a }}")
+        request = {"requestId": 1, "template": str(tmp_path / "t.j2"), "context": {"a": "b"}}
+        with patch("sys.argv", ["inji", "--worker"]):
+            with patch("sys.stdin", io.StringIO(json.dumps(request) + "\n")):
+                with pytest.raises(SystemExit) as e:
+                    cli.main()
+        assert e.value.code == 0
+        assert json.loads(capsys.readouterr().out)["output"] == "b"
+
+
+class TestHttpCache:
+    """Test --http-cache-dir and --offline."""
+
+    def test_offline_requires_cache_dir(self):
+        with pytest.raises(SystemExit):
+            cli.cli_args(["--offline", "-"])
+
+    def test_offline_miss_fails(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(utils, "http_cache", None)
+        template = tmp_path / "t.j2"
+        template.write_text("{{ GET('http://127.0.0.1:9/nothing') }}")
+        argv = ["inji", "--http-cache-dir", str(tmp_path / "c"), "--offline", str(template)]
+        with patch("sys.argv", argv):
+            with pytest.raises(OfflineError):
+                cli.main()
+
+
+class TestRecordReplay:
+    """Test --record and --replay."""
+
+    def test_record_and_replay_are_exclusive(self, tmp_path):
+        with pytest.raises(SystemExit):
+            cli.cli_args(["--record", "a", "--replay", str(tmp_path), "-"])
+
+    def test_replayed_render_runs_nothing(self, tmp_path):
+        template = tmp_path / "t.j2"
+        template.write_text("{{ run('echo recorded') }}")
+        tape = str(tmp_path / "tape.json.gz")
+        assert run_main(["--record", tape, str(template)]) == ["recorded"]
+        with patch("inji.utils.subprocess.check_output") as check_output:
+            assert run_main(["--replay", tape, str(template)]) == ["recorded"]
+        check_output.assert_not_called()
+        assert utils.cassette is None
+
+
+class TestFactCache:
+    """Test --fact-cache and --fact-ttl."""
+
+    def test_fact_ttl_parsed(self):
+        args = cli.cli_args(["--fact-ttl", "run=60", "--fact-ttl", "fqdn=0", "-"])
+        assert args.fact_ttl == [{"run": 60.0}, {"fqdn": 0.0}]
+
+    def test_invalid_fact_ttl(self):
+        with pytest.raises(SystemExit):
+            cli.cli_args(["--fact-ttl", "run=soon", "-"])
+
+    def test_run_kept_across_invocations(self, tmp_path):
+        template = tmp_path / "t.j2"
+        template.write_text("{{ run('echo once') }}")
+        argv = ["inji", "--fact-cache", str(tmp_path / "facts"), "--fact-ttl", "run=60"]
+        try:
+            for expected in (1, 0):
+                with patch("sys.argv", argv + [str(template)]):
+                    with patch("builtins.print"):
+                        with patch("inji.utils.cmd", return_value="once") as cmd:
+                            cli.main()
+                assert cmd.call_count == expected
+        finally:
+            facts.cache = None
+
+
+class TestCoprocesses:
+    """Test --coprocesses."""
+
+    def test_negative(self):
+        with pytest.raises(SystemExit):
+            cli.cli_args(["--coprocesses", "-1", "-"])
+
+    def test_commands_run_through_shells(self, tmp_path):
+        template = tmp_path / "t.j2"
+        template.write_text("{{ run('printf %s \"a b\"') }}")
+        with patch("inji.utils.subprocess.check_output") as check_output:
+            output = run_main(["--coprocesses", "2", str(template)])
+        check_output.assert_not_called()
+        assert output == ["a b"]
+        assert utils.coprocesses is None
+
+
+class TestDeadline:
+    """Test --deadline and --call-timeout."""
+
+    def test_must_be_positive(self):
+        for option in ("--deadline", "--call-timeout"):
+            with pytest.raises(SystemExit):
+                cli.cli_args([option, "0", "-"])
+
+    def test_timeout_exits_124(self, tmp_path, capsys):
+        template = tmp_path / "t.j2"
+        template.write_text("{{ run('sleep 5') }}")
+        with patch("sys.argv", ["inji", "--deadline", "0.2", str(template)]):
+            with pytest.raises(SystemExit) as e:
+                cli.main()
+        assert e.value.code == 124
+        assert f"went past the deadline of 0.2s at {template}:1" in capsys.readouterr().err
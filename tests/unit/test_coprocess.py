@@ -0,0 +1,162 @@
+"""
+Unit tests for inji.coprocess module.
+
+Tests running commands through long-lived shells:
+- Output, quoting and exit statuses as with subprocess.check_output()
+- Shells reused across commands, at most as many as the pool allows
+- Commands unable to change the state of the shell
+- Following the current directory of inji
+- run() in templates going through the pool
+- Forked children starting shells of their own
+"""
+
+import multiprocessing
+import subprocess
+import threading
+import time
+
+import pytest
+
+from inji import coprocess, utils
+from inji.engine import TemplateEngine
+
+
+@pytest.fixture
+def pool():
+    with coprocess.Pool(2) as pool:
+        yield pool
+
+
+class TestCoprocess:
+    def test_output(self, pool):
+        assert pool.run(["printf", "%s|", "a b", "'c'"]) == b"a b|'c'|"
+        assert pool.run(["echo", "hello"]) == b"hello\n"
+
+    def test_output_without_trailing_newline(self, pool):
+        assert pool.run(["printf", "no newline"]) == b"no newline"
+        assert pool.run(["true"]) == b""
+
+    def test_multiline_and_binary_output(self, pool):
+        expected = subprocess.check_output(["printf", "a\\n\\nb\\0\\377\\n\\n"])
+        assert pool.run(["printf", "a\\n\\nb\\0\\377\\n\\n"]) == expected
+
+    def test_failure(self, pool):
+        with pytest.raises(subprocess.CalledProcessError) as e:
+            pool.run(["sh", "-c", "echo partial; exit 3"])
+        assert (e.value.returncode, e.value.output) == (3, b"partial\n")
+        assert pool.run(["echo", "still running"]) == b"still running\n"
+
+    def test_not_found(self, pool):
+        with pytest.raises(FileNotFoundError):
+            pool.run(["inji-no-such-command"])
+
+    def test_state_not_changed(self, pool, tmp_path):
+        cwd = pool.run(["pwd"])
+        for argv in (["cd", str(tmp_path)], ["exit"], ["export", "X=1"]):
+            with pytest.raises(FileNotFoundError):
+                pool.run(argv)
+        assert pool.run(["pwd"]) == cwd
+        assert pool.run(["sh", "-c", "echo ${X:-unset}"]) == b"unset\n"
+
+    def test_stdin_is_empty(self, pool):
+        assert pool.run(["cat"]) == b""
+
+    def test_follows_current_directory(self, pool, tmp_path, monkeypatch):
+        pool.run(["true"])
+        monkeypatch.chdir(tmp_path)
+        assert pool.run(["pwd"]) == f"{tmp_path}\n".encode()
+
+
+class TestPool:
+    def test_shell_reused(self, pool):
+        for _ in range(20):
+            pool.run(["true"])
+        assert len(pool.coprocesses) == 1
+
+    def test_bounded(self, pool):
+        running, peak, lock = [0], [0], threading.Lock()
+        run = coprocess.Coprocess.run
+
+        def counted(self, argv, timeout=None):
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            try:
+                time.sleep(0.02)
+                return run(self, argv, timeout)
+            finally:
+                with lock:
+                    running[0] -= 1
+
+        coprocess.Coprocess.run = counted
+        try:
+            threads = [threading.Thread(target=pool.run, args=(["true"],)) for _ in range(8)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        finally:
+            coprocess.Coprocess.run = run
+        assert peak[0] == 2
+        assert len(pool.coprocesses) == 2
+
+    def test_forked_children_start_their_own_shells(self, pool):
+        pool.run(["true"])
+        parent = {c.process.pid for c in pool.coprocesses}
+        with multiprocessing.get_context("fork").Pool(
+            8, initializer=_set_pool, initargs=(pool,)
+        ) as p:
+            results = p.map(_run_forked, range(40))
+        assert [output for output, _ in results] == [str(i).encode() for i in range(40)]
+        assert not parent & {pid for _, shells in results for pid in shells}
+        # the parent's shells are still in step
+        assert pool.run(["printf", "%s", "parent"]) == b"parent"
+        assert {c.process.pid for c in pool.coprocesses} == parent
+
+    def test_close(self, pool):
+        pool.run(["true"])
+        shell = pool.coprocesses[0]
+        pool.close()
+        assert not shell.alive
+
+
+# The pool forked children of test_forked_children_start_their_own_shells run on
+_forked_pool = None
+
+
+def _set_pool(pool):
+    global _forked_pool
+    _forked_pool = pool
+
+
+def _run_forked(i):
+    output = _forked_pool.run(["sh", "-c", f"printf %s {i}"])
+    return output, [c.process.pid for c in _forked_pool.coprocesses]
+
+
+class TestRun:
+    def test_template(self, pool, tmp_path):
+        template = tmp_path / "t.j2"
+        template.write_text("{% for i in range(50) %}{{ run('printf %s, ' ~ i) }}{% endfor %}")
+        utils.coprocesses = pool
+        try:
+            text = "".join(TemplateEngine().render(str(template), {}))
+        finally:
+            utils.coprocesses = None
+        assert text == "".join(f"{i}," for i in range(50))
+        assert len(pool.coprocesses) == 1
+
+    def test_process_mode_loop(self, pool, tmp_path):
+        template = tmp_path / "t.j2"
+        template.write_text(
+            "{{ run('true') }}"
+            '{% parallel for i in range(40) workers=8 mode="processes" %}'
+            "{{ run('printf %s, ' ~ i) }}"
+            "{% endparallel %}"
+        )
+        utils.coprocesses = pool
+        try:
+            text = "".join(TemplateEngine().render(str(template), {}))
+        finally:
+            utils.coprocesses = None
+        assert text == "".join(f"{i}," for i in range(40))
@@ -0,0 +1,116 @@
+"""
+Unit tests for inji.deps module.
+
+Tests the template dependency index:
+- Forward and reverse (transitive) edges
+- Top-level templates affected by a change to a partial, or to anything when
+  they refer to templates dynamically
+- Persistence and incremental updates
+- The `inji deps` command
+"""
+
+import json
+import os
+from unittest.mock import patch
+
+import pytest
+
+from inji import cli, deps
+from inji.engine import TemplateEngine
+
+
+@pytest.fixture
+def root(tmp_path):
+    (tmp_path / "partials").mkdir()
+    (tmp_path / "partials/macros.j2").write_text('{% include "partials/leaf.j2" %}')
+    (tmp_path / "partials/leaf.j2").write_text("leaf")
+    (tmp_path / "base.j2").write_text("{% block b %}{% endblock %}")
+    (tmp_path / "page.j2").write_text(
+        '{% extends "base.j2" %}{% import "partials/macros.j2" as m %}'
+    )
+    (tmp_path / "other.j2").write_text('{% include "partials/leaf.j2" %}{% include name %}')
+    (tmp_path / "static.txt").write_text("static")
+    return tmp_path
+
+
+def index(root, **kwargs):
+    return TemplateEngine().dependency_index(str(root), **kwargs)
+
+
+class TestDependencyIndex:
+    def test_forward_edges(self, root):
+        i = index(root)
+        assert i.templates["page.j2"]["refs"] == ["base.j2", "partials/macros.j2"]
+        assert i.dependencies("page.j2") == {"base.j2", "partials/macros.j2", "partials/leaf.j2"}
+        assert i.templates["other.j2"]["dynamic"] is True
+
+    def test_reverse_edges(self, root):
+        i = index(root)
+        assert i.dependants("partials/leaf.j2") == {"partials/macros.j2", "page.j2", "other.j2"}
+
+    def test_affected_toplevel_templates(self, root):
+        i = index(root)
+        assert i.toplevel() == {"page.j2", "other.j2", "static.txt"}
+        assert i.affected("partials/leaf.j2") == {"page.j2", "other.j2"}
+        assert i.affected() == set()
+
+    def test_dynamic_references_affected_by_any_change(self, root):
+        (root / "wrapper.j2").write_text('{% include "other.j2" %}')
+        i = index(root)
+        assert i.dynamic() == {"other.j2"}
+        assert i.affected("base.j2") == {"page.j2", "wrapper.j2"}
+        assert i.affected("static.txt") == {"static.txt", "wrapper.j2"}
+
+    def test_patterns(self, root):
+        assert "static.txt" not in index(root, patterns=["*.j2"]).templates
+
+    def test_persisted(self, root):
+        index(root)
+        saved = json.loads((root / deps.INDEX_FILE).read_text())
+        assert "page.j2" in saved["templates"]
+        assert deps.INDEX_FILE not in saved["templates"]
+
+    def test_incremental_update(self, root):
+        index(root)
+        with patch.object(deps.DependencyIndex, "references", return_value=([], False)) as refs:
+            assert index(root).templates["page.j2"]["refs"] == ["base.j2", "partials/macros.j2"]
+            refs.assert_not_called()
+
+        (root / "page.j2").write_text("no more refs, longer than before")
+        (root / "base.j2").unlink()
+        i = deps.DependencyIndex(str(root), TemplateEngine().environment(str(root)))
+        assert i.update() == {"page.j2", "base.j2"}
+        assert i.templates["page.j2"]["refs"] == []
+        assert "base.j2" not in i.templates
+
+    def test_unparseable_files(self, root):
+        (root / "broken.j2").write_text("{% if %}")
+        (root / "binary.bin").write_bytes(b"\xff\xfe\x00")
+        i = index(root)
+        assert i.templates["broken.j2"]["refs"] == []
+        assert i.templates["binary.bin"]["refs"] == []
+
+
+class TestDepsCommand:
+    def _run(self, argv, capsys):
+        with patch("sys.argv", ["inji", "deps"] + argv):
+            with pytest.raises(SystemExit) as e:
+                cli.main()
+        assert e.value.code == 0
+        return capsys.readouterr().out.splitlines()
+
+    def test_list(self, root, capsys):
+        out = self._run([str(root)], capsys)
+        assert "page.j2: base.j2 partials/macros.j2" in out
+        assert "static.txt:" in out
+
+    def test_affected(self, root, capsys, monkeypatch):
+        monkeypatch.chdir(root)
+        out = self._run(["--affected", "partials/leaf.j2"], capsys)
+        assert out == ["other.j2", "page.j2"]
+
+    def test_json(self, root, capsys, tmp_path_factory):
+        index_file = str(tmp_path_factory.mktemp("index") / "deps.json")
+        out = self._run([str(root), "--json", "--index", index_file], capsys)
+        assert json.loads("\n".join(out))["base.j2"]["refs"] == []
+        assert os.path.exists(index_file)
@@ -9,11 +9,15 @@ Tests the TemplateEngine class in isolation:
 - Edge cases (empty templates, large templates, special characters)
 """
 
+import logging
+import os
 from pathlib import Path
+from unittest.mock import patch
 
 import pytest
 from jinja2 import TemplateNotFound, TemplateSyntaxError, UndefinedError
 
+from inji import cache
 from inji.engine import TemplateEngine
 
 
@@ -28,6 +32,11 @@ class TestTemplateEngineInit:
         assert engine.tests is not None
         assert engine.globals is not None
 
+    def test_logging_handler_added_once(self):
+        TemplateEngine()
+        TemplateEngine(undefined_variables_mode_behaviour="keep")
+        assert len(logging.getLogger("inji.engine").handlers) == 1
+
     def test_init_undefined_mode_strict(self):
         """Engine initializes with strict undefined mode (default)."""
         engine = TemplateEngine(undefined_variables_mode_behaviour="strict")
@@ -311,3 +320,204 @@ class TestTemplateEngineIntegration:
         assert "Alice" in output[0]
         assert "Bob" in output[0]
         assert "admin" in output[0]
+
+
+class TestTemplateEngineOutput:
+    """Test {% output %} blocks rendered through the engine."""
+
+    def test_output_blocks_written_to_output_dir(self, tmp_templates_dir, tmp_output_dir):
+        engine = TemplateEngine(output_dir=tmp_output_dir)
+        Path(tmp_templates_dir, "multi.jinja2").write_text(
+            '{% for n in names %}{% output "{{ n }}.txt" %}{{ n }}{% endoutput %}{% endfor %}'
+        )
+        template_path = Path(tmp_templates_dir) / "multi.jinja2"
+
+        output = list(engine.render(str(template_path), {"names": ["a", "b"]}))
+        assert output == [""]
+        assert Path(tmp_output_dir, "a.txt").read_text() == "a"
+        assert Path(tmp_output_dir, "b.txt").read_text() == "b"
+
+
+class TestTemplateEngineStatic:
+    """Test the passthrough of templates without any jinja2 syntax."""
+
+    @pytest.mark.parametrize(
+        "content",
+        ["plain text\n", "no trailing newline", "two newlines\n\n", "", "braces { } %}"],
+    )
+    def test_static_matches_jinja2_render(self, tmp_templates_dir, content):
+        template_path = Path(tmp_templates_dir) / "static.txt"
+        template_path.write_text(content)
+        engine = TemplateEngine()
+
+        assert engine.static_source(str(template_path)) is not None
+        expected = list(engine.render(str(template_path), {}))
+
+        engine = TemplateEngine()
+        engine._dynamic.set(
+            (str(template_path), template_path.stat().st_mtime_ns, template_path.stat().st_size),
+            True,
+        )
+        assert list(engine.render(str(template_path), {})) == expected
+
+    @pytest.mark.parametrize("content", ["{{ x }}", "{% if 1 %}{% endif %}", "{# c #}", "a\r\nb"])
+    def test_dynamic_templates_not_passed_through(self, tmp_templates_dir, content):
+        template_path = Path(tmp_templates_dir) / "dynamic.txt"
+        template_path.write_bytes(content.encode("utf-8"))
+        engine = TemplateEngine()
+        assert engine.static_source(str(template_path)) is None
+        assert len(engine._dynamic) == 1
+
+    def test_custom_delimiters_respected(self, tmp_templates_dir):
+        template_path = Path(tmp_templates_dir) / "custom.txt"
+        template_path.write_text("<< x >>")
+        engine = TemplateEngine(j2_env_params={"variable_start_string": "<<"})
+        assert engine.static_source(str(template_path)) is None
+
+    def test_detection_cached_until_modified(self, tmp_templates_dir):
+        template_path = Path(tmp_templates_dir) / "cached.txt"
+        template_path.write_text("{{ 1 }}")
+        engine = TemplateEngine()
+        assert engine.static_source(str(template_path)) is None
+        with patch("builtins.open") as mock_open:
+            assert engine.static_source(str(template_path)) is None
+            mock_open.assert_not_called()
+        template_path.write_text("static now")
+        assert engine.static_source(str(template_path)) == "static now"
+
+
+class TestTemplateEngineEnvironments:
+    """Test the reuse of jinja2 environments across renders."""
+
+    def test_environment_cached_per_directory(self, tmp_path):
+        engine = TemplateEngine()
+        (tmp_path / "a").mkdir()
+        (tmp_path / "b").mkdir()
+        assert engine.environment(str(tmp_path / "a")) is engine.environment(str(tmp_path / "a"))
+        assert engine.environment(str(tmp_path / "a")) is not engine.environment(
+            str(tmp_path / "b")
+        )
+
+    def test_environments_bounded(self, tmp_path):
+        engine = TemplateEngine()
+        engine._environments.maxsize = 3
+        first = engine.environment(str(tmp_path / "0"))
+        for i in range(1, 10):
+            engine.environment(str(tmp_path / str(i)))
+        assert len(engine._environments) == 3
+        assert engine.environment(str(tmp_path / "0")) is not first
+
+    def test_templates_in_different_directories(self, tmp_path):
+        engine = TemplateEngine()
+        for d in ("a", "b"):
+            (tmp_path / d).mkdir()
+            (tmp_path / d / "inc.j2").write_text(d)
+            (tmp_path / d / "t.j2").write_text('{% include "inc.j2" %}')
+        assert list(engine.render(str(tmp_path / "a/t.j2"), {})) == ["a"]
+        assert list(engine.render(str(tmp_path / "b/t.j2"), {})) == ["b"]
+
+    def test_modified_template_recompiled(self, tmp_path):
+        engine = TemplateEngine()
+        t = tmp_path / "t.j2"
+        t.write_text("{{ 1 }}")
+        assert list(engine.render(str(t), {})) == ["1"]
+        t.write_text("{{ 2 }}")
+        os.utime(t, ns=(t.stat().st_atime_ns, t.stat().st_mtime_ns + 10**9))
+        assert list(engine.render(str(t), {})) == ["2"]
+
+
+class TestTemplateEngineDependencies:
+    """Test the discovery of what a template is made up of."""
+
+    def test_dependency_closure(self, tmp_path):
+        (tmp_path / "base.j2").write_text("{% block b %}{% endblock %}")
+        (tmp_path / "macros.j2").write_text('{% include "leaf.j2" %}')
+        (tmp_path / "leaf.j2").write_text("leaf")
+        (tmp_path / "other.j2").write_text("other")
+        (tmp_path / "t.j2").write_text('{% extends "base.j2" %}{% import "macros.j2" as m %}')
+        deps = TemplateEngine().dependencies(str(tmp_path / "t.j2"))
+        assert deps == {str(tmp_path / f) for f in ("t.j2", "base.j2", "macros.j2", "leaf.j2")}
+
+    def test_dynamic_references_depend_on_everything(self, tmp_path):
+        (tmp_path / "sub").mkdir()
+        (tmp_path / "sub" / "leaf.j2").write_text("leaf")
+        (tmp_path / "other.j2").write_text("other")
+        (tmp_path / "t.j2").write_text("{% include name %}")
+        deps = TemplateEngine().dependencies(str(tmp_path / "t.j2"))
+        assert deps == {str(tmp_path / f) for f in ("t.j2", "other.j2", "sub/leaf.j2", "sub")} | {
+            str(tmp_path)
+        }
+
+    def test_missing_and_broken_templates(self, tmp_path):
+        (tmp_path / "t.j2").write_text('{% include "missing.j2" %}{% include "broken.j2" %}')
+        (tmp_path / "broken.j2").write_text("{% if %}")
+        deps = TemplateEngine().dependencies(str(tmp_path / "t.j2"))
+        assert deps == {str(tmp_path / "t.j2"), str(tmp_path / "broken.j2")}
+
+
+class TestTemplateEngineCache:
+    """Test caching renders by fingerprint."""
+
+    def _engine(self, tmp_path, **kwargs):
+        return TemplateEngine(cache=cache.DiskCache(tmp_path / "cache"), **kwargs)
+
+    def test_hit_skips_rendering(self, tmp_path):
+        template = tmp_path / "t.j2"
+        template.write_text("{{ x }}")
+        list(self._engine(tmp_path).render(str(template), {"x": 1}))
+
+        engine = self._engine(tmp_path)
+        with patch.object(engine, "environment", wraps=engine.environment) as environment:
+            with patch("jinja2.Environment.get_template") as get_template:
+                assert list(engine.render(str(template), {"x": 1})) == ["1"]
+        get_template.assert_not_called()
+        assert environment.called  # for the loader, but nothing is compiled
+
+    def test_fingerprint_covers_inputs(self, tmp_path):
+        (tmp_path / "inc.j2").write_text("{{ y }}")
+        template = tmp_path / "t.j2"
+        template.write_text('{{ x }}{% include "inc.j2" %}')
+        engine = self._engine(tmp_path)
+        key = engine.fingerprint(str(template), {"x": 1, "y": 2, "unused": 3})
+
+        assert key == engine.fingerprint(str(template), {"x": 1, "y": 2, "unused": 4})
+        assert key != engine.fingerprint(str(template), {"x": 1, "y": 3})
+        assert key != self._engine(tmp_path, undefined_variables_mode_behaviour="keep").fingerprint(
+            str(template), {"x": 1, "y": 2}
+        )
+        (tmp_path / "inc.j2").write_text("{{ y }}!")
+        assert key != engine.fingerprint(str(template), {"x": 1, "y": 2})
+
+    @pytest.mark.parametrize(
+        "source",
+        [
+            "{{ now() }}",
+            '{% output "f" %}x{% endoutput %}',
+            "{% include name %}",
+            "{{ [1, 2] | random }}",
+            "{{ lipsum(1) }}",
+            "{{ f }}",
+        ],
+    )
+    def test_uncacheable(self, tmp_path, source):
+        template = tmp_path / "t.j2"
+        template.write_text(source)
+        context = {"name": "x", "f": lambda: 1}
+        assert self._engine(tmp_path).fingerprint(str(template), context) is None
+
+    def test_context_keys_of_different_types(self, tmp_path):
+        template = tmp_path / "t.j2"
+        template.write_text("{% for k, v in d.items() %}{{ k is string }}{{ v }},{% endfor %}")
+        engine = self._engine(tmp_path)
+        assert list(engine.render(str(template), {"d": {1: "x", "a": "y"}})) == ["Falsex,Truey,"]
+        assert list(engine.render(str(template), {"d": {1: "x"}})) == ["Falsex,"]
+        assert list(engine.render(str(template), {"d": {"1": "x"}})) == ["Truex,"]
+        assert engine.fingerprint(str(template), {"d": {1: "x"}}) != engine.fingerprint(
+            str(template), {"d": {"1": "x"}}
+        )
+
+    def test_impure_cached_with_cache_key(self, tmp_path):
+        template = tmp_path / "t.j2"
+        template.write_text("{{ now() }}")
+        first = list(self._engine(tmp_path, cache_key="k").render(str(template), {}))
+        assert list(self._engine(tmp_path, cache_key="k").render(str(template), {})) == first
@@ -0,0 +1,204 @@
+"""
+Unit tests for inji.extensions module.
+
+Tests the custom template tags:
+- {% output %} writing block bodies to (interpolated) paths
+- {% parallel for %} rendering iterations concurrently, in order
+- {% cache %} reusing rendered fragments
+"""
+
+import os
+import threading
+import time
+
+import pytest
+from jinja2 import Environment, TemplateRuntimeError, TemplateSyntaxError
+
+from inji import cache, sinks
+from inji.extensions import FragmentCacheExtension, OutputExtension, ParallelExtension
+
+
+@pytest.fixture
+def env():
+    return Environment(extensions=[OutputExtension, ParallelExtension])
+
+
+def render(env, source, root, **context):
+    with sinks.Writer(root=root) as writer:
+        token = sinks.writer.set(writer)
+        try:
+            return env.from_string(source).render(**context)
+        finally:
+            sinks.writer.reset(token)
+
+
+class TestOutputExtension:
+    def test_body_goes_to_file_not_output(self, env, tmp_path):
+        out = render(env, 'a{% output "f.txt" %}body{% endoutput %}b', tmp_path)
+        assert out == "ab"
+        assert (tmp_path / "f.txt").read_text() == "body"
+
+    def test_interpolated_path_sees_loop_variables(self, env, tmp_path):
+        source = (
+            "{% for h in hosts %}"
+            '{% output "hosts/{{ h.name }}-{{ loop.index }}.yaml" %}name: {{ h.name }}'
+            "{% endoutput %}"
+            "{% endfor %}"
+        )
+        render(env, source, tmp_path, hosts=[{"name": "a"}, {"name": "b"}])
+        assert (tmp_path / "hosts/a-1.yaml").read_text() == "name: a"
+        assert (tmp_path / "hosts/b-2.yaml").read_text() == "name: b"
+
+    def test_expression_path(self, env, tmp_path):
+        render(env, '{% output name ~ ".txt" %}x{% endoutput %}', tmp_path, name="n")
+        assert (tmp_path / "n.txt").read_text() == "x"
+
+    def test_statements_in_path_rejected(self, env):
+        with pytest.raises(TemplateSyntaxError):
+            env.from_string('{% output "{{ x }}{% if x %}a{% endif %}" %}x{% endoutput %}')
+
+    def test_no_writer(self, env):
+        with pytest.raises(RuntimeError):
+            env.from_string('{% output "f.txt" %}x{% endoutput %}').render()
+
+
+class TestParallelExtension:
+    def test_output_in_iteration_order(self, env):
+        source = "{% parallel for i in items workers=4 %}{{ i }},{% endparallel %}"
+        assert (
+            env.from_string(source).render(items=range(20)) == ",".join(map(str, range(20))) + ","
+        )
+
+    def test_iterations_run_concurrently(self, env):
+        barrier = threading.Barrier(4, timeout=5)
+        source = "{% parallel for i in items workers=4 %}{{ wait() }}{% endparallel %}"
+        # deadlocks (and times out) unless all four iterations run at once
+        env.from_string(source).render(items=range(4), wait=lambda: barrier.wait() and "")
+
+    def test_loop_variables(self, env):
+        source = (
+            "{% parallel for i in items %}"
+            "{{ loop.index }}{{ loop.index0 }}{{ loop.revindex }}{{ loop.first }}{{ loop.last }}"
+            "{{ loop.cycle('a', 'b') }}{{ loop.previtem is defined }};"
+            "{% endparallel %}"
+        )
+        out = env.from_string(source).render(items="xy")
+        assert out == "102TrueFalseaFalse;211FalseTruebTrue;"
+
+    def test_loop_changed_unavailable(self, env):
+        source = "{% parallel for i in items %}{{ loop.changed(i) }}{% endparallel %}"
+        with pytest.raises(TemplateRuntimeError, match="loop.previtem"):
+            env.from_string(source).render(items=[1, 2])
+
+    def test_tuple_unpacking(self, env):
+        source = "{% parallel for k, v in d.items() %}{{ k }}={{ v }} {% endparallel %}"
+        assert env.from_string(source).render(d={"a": 1, "b": 2}) == "a=1 b=2 "
+
+    def test_assignments_are_local_to_iterations(self, env):
+        source = (
+            "{% set x = 0 %}{% parallel for i in items %}{% set x = i %}{% endparallel %}{{ x }}"
+        )
+        assert env.from_string(source).render(items=[1, 2]) == "0"
+
+    @pytest.mark.parametrize("mode", ["threads", "processes"])
+    def test_iterations_change_their_own_copies(self, env, mode):
+        source = (
+            "{% set ns = namespace(n=0) %}"
+            f'{{% parallel for i in items workers=2 mode="{mode}" %}}'
+            "{% set ns.n = ns.n + i %}{{ seen.append(i) or '' }}{{ ns.n }}{{ seen }} "
+            "{% endparallel %}{{ ns.n }}{{ seen }}"
+        )
+        out = env.from_string(source).render(items=[1, 2, 3], seen=[])
+        assert out == "1[1] 2[2] 3[3] 0[]"
+
+    def test_process_mode(self, env):
+        source = (
+            '{% parallel for i in items workers=2 mode="processes" %}{{ pid() }} {% endparallel %}'
+        )
+        pids = env.from_string(source).render(items=range(4), pid=os.getpid).split()
+        assert len(pids) == 4
+        assert str(os.getpid()) not in pids
+
+    def test_concurrent_process_mode_loops(self, env):
+        source = (
+            '{% parallel for i in items workers=2 mode="processes" %}{{ i }}{{ wait() }},'
+            "{% endparallel %}"
+        )
+        template = env.from_string(source)
+        results = {}
+
+        def render(name):
+            results[name] = template.render(items=[name] * 6, wait=lambda: time.sleep(0.05) or "")
+
+        threads = [threading.Thread(target=render, args=(name,)) for name in "abc"]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert results == {name: f"{name}," * 6 for name in "abc"}
+
+    def test_output_blocks_in_iterations(self, env, tmp_path):
+        source = (
+            "{% parallel for n in names %}"
+            '{% output "{{ n }}.txt" %}{{ n }}{% endoutput %}'
+            "{% endparallel %}"
+        )
+        render(env, source, tmp_path, names=["a", "b", "c"])
+        assert sorted(p.read_text() for p in tmp_path.iterdir()) == ["a", "b", "c"]
+
+    def test_autoescape(self):
+        env = Environment(extensions=[ParallelExtension], autoescape=True)
+        source = "{% parallel for i in items %}<b>{{ i }}</b>{% endparallel %}"
+        assert env.from_string(source).render(items=["<"]) == "<b>&lt;</b>"
+
+    def test_invalid_mode(self, env):
+        source = '{% parallel for i in items mode="fibres" %}{% endparallel %}'
+        with pytest.raises(ValueError):
+            env.from_string(source).render(items=[1])
+
+
+class TestFragmentCacheExtension:
+    @pytest.fixture
+    def env(self):
+        env = Environment(extensions=[FragmentCacheExtension])
+        env.globals["calls"] = calls = []
+        env.globals["expensive"] = lambda x: calls.append(x) or f"<{x}>"
+        return env
+
+    def test_body_rendered_once(self, env):
+        template = env.from_string('{% cache "k" %}{{ expensive(x) }}{% endcache %}')
+        assert [template.render(x=1) for _ in range(3)] == ["<1>"] * 3
+        assert env.globals["calls"] == [1]
+
+    def test_values_read_are_part_of_the_key(self, env):
+        template = env.from_string('{% cache "k" %}{{ expensive(x) }}{% endcache %}')
+        assert template.render(x=1, unread=1) == template.render(x=1, unread=2) == "<1>"
+        assert template.render(x=2) == "<2>"
+        assert env.globals["calls"] == [1, 2]
+
+    def test_loop_variables(self, env):
+        source = (
+            '{% for i in [1, 2, 1] %}{% cache "k" %}{{ expensive(i) }}{% endcache %}{% endfor %}'
+        )
+        assert env.from_string(source).render() == "<1><2><1>"
+        assert env.globals["calls"] == [1, 2]
+
+    def test_ttl(self, env):
+        template = env.from_string('{% cache "k", ttl=-1 %}{{ expensive(1) }}{% endcache %}')
+        template.render()
+        template.render()
+        assert env.globals["calls"] == [1, 1]
+
+    def test_shared_through_disk_cache(self, env, tmp_path):
+        source = '{% cache "k" %}{{ expensive(1) }}{% endcache %}'
+        env.fragment_cache = cache.DiskCache(tmp_path)
+        env.from_string(source).render()
+        other = Environment(extensions=[FragmentCacheExtension])
+        other.fragment_cache = cache.DiskCache(tmp_path)
+        other.globals["expensive"] = None
+        assert other.from_string(source).render() == "<1>"
+
+    def test_autoescape(self):
+        env = Environment(extensions=[FragmentCacheExtension], autoescape=True)
+        template = env.from_string('{% cache "k" %}<b>{{ x }}</b>{% endcache %}')
+        assert template.render(x="<") == template.render(x="<") == "<b>&lt;</b>"
@@ -0,0 +1,124 @@
+"""
+Unit tests for inji.facts module.
+
+Tests the persistent cache of host and git facts:
+- Facts kept across caches on the same directory until their TTL
+- Facts without a TTL passed through
+- Git facts invalidated by HEAD and ref changes
+- Host facts invalidated by a reboot
+- Globals going through the fact cache only when there is one and no cassette
+"""
+
+import subprocess
+from unittest.mock import patch
+
+import pytest
+
+from inji import facts, globals, utils
+from inji.cassette import Cassette
+
+
+@pytest.fixture
+def fact_cache(tmp_path):
+    facts.cache = facts.FactCache(str(tmp_path / "facts"))
+    yield facts.cache
+    facts.cache = None
+
+
+class TestFactCache:
+    def test_kept_across_instances(self, tmp_path):
+        calls = []
+        fn = lambda: calls.append(1) or "host.example.com"  # noqa: E731
+        for _ in range(2):
+            cache = facts.FactCache(str(tmp_path))
+            assert cache.call("fqdn", fn) == "host.example.com"
+        assert len(calls) == 1
+
+    def test_expired_after_ttl(self, tmp_path):
+        calls = []
+        cache = facts.FactCache(str(tmp_path), ttls={"fqdn": 10})
+        with patch("inji.facts.time.time", return_value=1000):
+            cache.call("fqdn", lambda: calls.append(1))
+        with patch("inji.facts.time.time", return_value=1011):
+            cache.call("fqdn", lambda: calls.append(1))
+        assert len(calls) == 2
+
+    def test_no_ttl_not_cached(self, tmp_path):
+        calls = []
+        cache = facts.FactCache(str(tmp_path))
+        for _ in range(2):
+            cache.call("run", lambda cmd: calls.append(cmd) or "", "date")
+        assert calls == ["date", "date"]
+
+    def test_run_cached_by_command_with_ttl(self, tmp_path):
+        calls = []
+        cache = facts.FactCache(str(tmp_path), ttls={"run": 60})
+        for cmd in ("date", "date", "uptime"):
+            cache.call("run", lambda cmd: calls.append(cmd) or cmd, cmd)
+        assert calls == ["date", "uptime"]
+
+    def test_git_facts_invalidated_by_commit(self, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+
+        def git(*args):
+            subprocess.run(
+                ["git", "-c", "user.name=t", "-c", "user.email=t@t", *args],
+                check=True,
+                capture_output=True,
+            )
+
+        git("init", "-q")
+        git("commit", "-q", "--allow-empty", "-m", "one")
+        cache = facts.FactCache(str(tmp_path / ".facts"))
+        head = lambda: subprocess.check_output(["git", "rev-parse", "HEAD"], text=True)  # noqa: E731
+        first = cache.call("git_commit_id", head)
+        assert cache.call("git_commit_id", lambda: "stale") == first
+        git("commit", "-q", "--allow-empty", "-m", "two")
+        assert cache.call("git_commit_id", head) != first
+
+    def test_host_facts_invalidated_by_reboot(self, tmp_path):
+        boot_id = tmp_path / "boot_id"
+        boot_id.write_text("one\n")
+        cache = facts.FactCache(str(tmp_path / "facts"))
+        with patch("inji.facts.BOOT_ID", str(boot_id)):
+            assert cache.call("host_id", lambda: "a") == "a"
+            assert cache.call("host_id", lambda: "b") == "a"
+            boot_id.write_text("two\n")
+            assert cache.call("host_id", lambda: "b") == "b"
+
+
+class TestGitDir:
+    def test_found_from_subdirectory(self, tmp_path):
+        (tmp_path / ".git").mkdir()
+        (tmp_path / "a" / "b").mkdir(parents=True)
+        assert facts.git_dir(str(tmp_path / "a" / "b")) == str(tmp_path / ".git")
+
+    def test_gitdir_file(self, tmp_path):
+        (tmp_path / ".git").write_text("gitdir: /elsewhere/.git/worktrees/x\n")
+        assert facts.git_dir(str(tmp_path)) == "/elsewhere/.git/worktrees/x"
+
+
+class TestGlobals:
+    def test_uncached_without_fact_cache(self):
+        with patch("inji.utils.cmd", return_value="h1") as cmd:
+            globals.host_id()
+            globals.host_id()
+        assert cmd.call_count == 2
+
+    def test_cached_with_fact_cache(self, fact_cache):
+        with patch("inji.utils.cmd", return_value="h1") as cmd:
+            assert globals.host_id() == "h1"
+        with patch("inji.utils.cmd", return_value="h2") as cmd:
+            assert globals.host_id() == "h1"
+        cmd.assert_not_called()
+
+    def test_bypassed_with_cassette(self, fact_cache, tmp_path):
+        with patch("inji.utils.cmd", return_value="h1"):
+            assert globals.host_id() == "h1"
+        utils.cassette = Cassette(str(tmp_path / "tape.json.gz"), mode="record")
+        try:
+            with patch("inji.utils._cmd", return_value="h2"):
+                assert globals.host_id() == "h2"
+        finally:
+            cassette, utils.cassette = utils.cassette, None
+        assert list(cassette.calls) == ["cmd hostid"]
@@ -0,0 +1,284 @@
+"""
+Unit tests for inji.git module.
+
+Tests the in-process git reader against what `git` itself says about the
+same repositories:
+- Branches, detached HEADs and worktrees
+- Commit formats, loose and packed (delta compressed) objects
+- describe with lightweight, annotated and competing tags, across merges
+- Remote URLs and config parsing
+- Falling back to the git commands where the reader can't vouch for the answer
+"""
+
+import os
+import shutil
+import subprocess
+from unittest.mock import patch
+
+import pytest
+
+from inji import git, utils
+from inji import globals as inji_globals
+from inji.cassette import Cassette
+
+pytestmark = pytest.mark.skipif(shutil.which("git") is None, reason="git is not installed")
+
+FORMATS = ["%h", "%H", "%T %t", "%P %p", "%an <%ae> %at", "%cn <%ce> %ct", "%s", "100%% %h"]
+
+
+class Repo:
+    """A scratch repository with commits dated one minute apart"""
+
+    def __init__(self, path):
+        self.path = path
+        self.clock = 1700000000
+        self.git("init", "-q", "-b", "main")
+
+    def git(self, *args):
+        self.clock += 60
+        env = {
+            **os.environ,
+            "GIT_AUTHOR_NAME": "A U Thor",
+            "GIT_AUTHOR_EMAIL": "author@example.com",
+            "GIT_AUTHOR_DATE": f"{self.clock} +0000",
+            "GIT_COMMITTER_NAME": "C O Mitter",
+            "GIT_COMMITTER_EMAIL": "committer@example.com",
+            "GIT_COMMITTER_DATE": f"{self.clock} +0000",
+        }
+        return subprocess.check_output(["git", *args], cwd=self.path, env=env, text=True).strip()
+
+    def commit(self, message, content=None):
+        with open(os.path.join(self.path, "file.txt"), "a") as f:
+            f.write(content or f"{message}\n")
+        self.git("add", "file.txt")
+        self.git("commit", "-q", "-m", message)
+        return self.git("rev-parse", "HEAD")
+
+    def assert_parity(self):
+        assert git.branch() == self.git("rev-parse", "--abbrev-ref", "HEAD")
+        assert git.describe() == self.git("describe", "--tag", "--always")
+        for fmt in FORMATS:
+            assert git.commit_id(fmt) == self.git(
+                "log", f"--pretty=format:{fmt}", "-n", "1", "HEAD"
+            )
+
+
+@pytest.fixture
+def repo(tmp_path, monkeypatch):
+    path = tmp_path / "repo"
+    path.mkdir()
+    monkeypatch.chdir(path)
+    for name in list(os.environ):
+        if name.startswith(git.ENVIRONMENT):
+            monkeypatch.delenv(name)
+    return Repo(str(path))
+
+
+class TestParity:
+    def test_untagged(self, repo):
+        for i in range(3):
+            repo.commit(f"commit {i}")
+        repo.assert_parity()
+
+    def test_lightweight_tag_behind_head(self, repo):
+        repo.commit("one")
+        repo.git("tag", "v1")
+        repo.commit("two")
+        repo.commit("three")
+        repo.assert_parity()
+        assert git.describe().startswith("v1-2-g")
+
+    def test_annotated_tag_at_head(self, repo):
+        repo.commit("one")
+        repo.git("tag", "-a", "-m", "release", "v1.0")
+        repo.assert_parity()
+        assert git.describe() == "v1.0"
+
+    def test_annotated_preferred_over_lightweight(self, repo):
+        repo.commit("one")
+        repo.git("tag", "a-light")
+        repo.git("tag", "-a", "-m", "release", "z-annotated")
+        repo.assert_parity()
+
+    def test_newest_annotated_preferred(self, repo):
+        repo.commit("one")
+        repo.git("tag", "-a", "-m", "newer", "b")
+        repo.git("tag", "-a", "-m", "newest", "a")
+        repo.commit("two")
+        repo.assert_parity()
+
+    def test_closest_of_several_tags(self, repo):
+        for i in range(6):
+            repo.commit(f"commit {i}")
+            if i % 2 == 0:
+                repo.git("tag", f"v{i}")
+        repo.assert_parity()
+
+    def test_more_tags_than_candidates(self, repo):
+        for i in range(14):
+            repo.commit(f"commit {i}")
+            repo.git("tag", f"t{i:02}")
+        repo.commit("untagged")
+        repo.assert_parity()
+
+    def test_merges(self, repo):
+        repo.commit("base")
+        repo.git("tag", "base")
+        repo.git("checkout", "-q", "-b", "side")
+        repo.commit("side one", "side\n")
+        repo.git("tag", "-a", "-m", "side", "side-tag")
+        repo.commit("side two", "more side\n")
+        repo.git("checkout", "-q", "main")
+        repo.commit("main one")
+        repo.commit("main two")
+        repo.git("tag", "main-tag")
+        repo.commit("main three")
+        repo.git("merge", "-q", "--no-edit", "-X", "ours", "side")
+        repo.commit("after merge")
+        repo.assert_parity()
+
+    def test_packed(self, repo):
+        for i in range(20):
+            repo.commit(f"commit {i}", "".join(f"line {j} of {i}\n" for j in range(200)))
+            if i % 5 == 0:
+                repo.git("tag", "-a", "-m", f"release {i}", f"r{i}")
+        repo.git("gc", "-q", "--aggressive")
+        assert not os.path.exists(os.path.join(repo.path, ".git", "refs", "tags", "r0"))
+        repo.assert_parity()
+
+    def test_delta_compressed_objects(self, repo):
+        for i in range(10):
+            repo.commit(f"commit {i}", "".join(f"line {j}\n" for j in range(i * 50)))
+        repo.git("gc", "-q", "--aggressive")
+        blobs = repo.git("rev-list", "--objects", "--all").split("\n")
+        with git.repository() as r:
+            for line in blobs:
+                sha = line.split(" ")[0]
+                kind = repo.git("cat-file", "-t", sha)
+                expected = subprocess.check_output(["git", "cat-file", kind, sha], cwd=repo.path)
+                assert r.read(sha) == (kind, expected)
+
+    def test_detached_head(self, repo):
+        first = repo.commit("one")
+        repo.commit("two")
+        repo.git("checkout", "-q", first)
+        repo.assert_parity()
+        assert git.branch() == "HEAD"
+
+    def test_branch_with_slash(self, repo):
+        repo.commit("one")
+        repo.git("checkout", "-q", "-b", "feature/x")
+        repo.assert_parity()
+
+    def test_worktree(self, repo, tmp_path, monkeypatch):
+        repo.commit("one")
+        repo.git("tag", "v1")
+        repo.git("worktree", "add", "-q", "-b", "other", str(tmp_path / "wt"))
+        monkeypatch.chdir(tmp_path / "wt")
+        wt = Repo.__new__(Repo)
+        wt.path, wt.clock = str(tmp_path / "wt"), repo.clock
+        wt.commit("in the worktree")
+        wt.assert_parity()
+        assert git.branch() == "other"
+
+    def test_subdirectory(self, repo, monkeypatch):
+        repo.commit("one")
+        os.makedirs(os.path.join(repo.path, "a", "b"))
+        monkeypatch.chdir(os.path.join(repo.path, "a", "b"))
+        repo.assert_parity()
+
+
+class TestRemoteUrl:
+    def test_remote_url(self, repo):
+        repo.commit("one")
+        repo.git("remote", "add", "origin", "git@github.com:user/repo.git")
+        repo.git("remote", "add", "upstream", "https://example.com/x.git")
+        for name in ("origin", "upstream"):
+            assert git.remote_url(name) == repo.git("remote", "get-url", name)
+
+    def test_insteadof_unsupported(self, repo):
+        repo.commit("one")
+        repo.git("remote", "add", "origin", "gh:user/repo.git")
+        repo.git("config", "url.https://github.com/.insteadOf", "gh:")
+        with pytest.raises(git.Unsupported):
+            git.remote_url()
+        assert inji_globals.git_remote_url() == "https://github.com/user/repo.git"
+
+
+class TestConfig:
+    def test_parse(self, tmp_path):
+        config = tmp_path / "config"
+        config.write_text(
+            "# comment\n"
+            "[core]\n"
+            "\tbare = false ; trailing comment\n"
+            "\tAbbrev=9\n"
+            '[remote "Origin"]\n'
+            '\turl = "a b ; c" \\\n'
+            "  d\n"
+            "[branch.Main] remote = x\n"
+            "[flag]\n"
+            "\tset\n"
+        )
+        assert git._config(str(config)) == [
+            ("core.bare", "false"),
+            ("core.abbrev", "9"),
+            ("remote.Origin.url", "a b ; c   d"),
+            ("branch.main.remote", "x"),
+            ("flag.set", None),
+        ]
+
+    def test_core_abbrev(self, repo):
+        repo.commit("one")
+        repo.git("config", "core.abbrev", "12")
+        repo.assert_parity()
+        assert len(git.commit_id("%h")) == 12
+
+
+class TestUnsupported:
+    def test_not_a_repository(self, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        with pytest.raises(git.Unsupported):
+            git.branch()
+
+    def test_unborn_head(self, repo):
+        with pytest.raises(git.Unsupported):
+            git.commit_id()
+
+    def test_git_dir_in_environment(self, repo, monkeypatch):
+        repo.commit("one")
+        monkeypatch.setenv("GIT_DIR", os.path.join(repo.path, ".git"))
+        with pytest.raises(git.Unsupported):
+            git.branch()
+
+    def test_unknown_format(self, repo):
+        repo.commit("one")
+        with pytest.raises(git.Unsupported):
+            git.commit_id("%ad")
+        assert inji_globals.git_commit_id("%ad") == repo.git("log", "--pretty=format:%ad", "-n1")
+
+    def test_ambiguous_branch(self, repo):
+        repo.commit("one")
+        repo.git("tag", "main")
+        with pytest.raises(git.Unsupported):
+            git.branch()
+        assert inji_globals.git_branch() == repo.git("rev-parse", "--abbrev-ref", "HEAD")
+
+
+class TestGlobals:
+    def test_no_command_run(self, repo):
+        repo.commit("one")
+        repo.git("tag", "v1")
+        with patch("inji.utils.cmd") as cmd:
+            assert inji_globals.git_tag() == "v1"
+            assert inji_globals.git_branch() == "main"
+        cmd.assert_not_called()
+
+    def test_commands_run_with_cassette(self, repo, tmp_path):
+        repo.commit("one")
+        utils.cassette = Cassette(str(tmp_path / "tape.json.gz"), mode="record")
+        try:
+            inji_globals.git_branch()
+        finally:
+            cassette, utils.cassette = utils.cassette, None
+        assert list(cassette.calls) == ["cmd git rev-parse --abbrev-ref HEAD"]
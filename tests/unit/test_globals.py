@@ -19,6 +19,11 @@ import pytest
 from inji import globals as inji_globals
 
 
+@pytest.fixture(autouse=True)
+def _git_commands(no_native_git):
+    """The git_* globals are tested here through the commands they fall back to"""
+
+
 class TestSystemInfoGlobals:
     """Test globals that provide system information."""
 
@@ -291,3 +296,9 @@ class TestGlobalAvailability:
         assert len(symbols) > 5
         # Should not have internal attributes (starting with _)
         assert all(not k.startswith("_") for k in symbols.keys())
+
+    def test_modules_not_exported(self):
+        """inji's own modules would hand templates their impure functions uncached"""
+        from inji.engine import get_symbols
+
+        assert not {"facts", "git", "md", "memo"} & set(get_symbols(inji_globals))
@@ -0,0 +1,117 @@
+"""
+Unit tests for inji.httpcache module.
+
+Tests the disk cache of HTTP responses (against a local http.server):
+- Freshness by Cache-Control, Expires and an explicit ttl
+- Revalidation with ETag and Last-Modified
+- Offline mode serving only from the cache
+- Compressed entries
+"""
+
+import zlib
+
+import pytest
+import requests
+
+from inji import httpcache, utils
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return httpcache.HTTPCache(tmp_path / "http")
+
+
+@pytest.fixture
+def session():
+    with requests.Session() as s:
+        yield s
+
+
+def route(body="body", status=200, **headers):
+    headers = {k.replace("_", "-"): v for k, v in headers.items()}
+    return lambda h: (status, headers, body)
+
+
+class TestDirectives:
+    def test_parsed(self):
+        headers = {"Cache-Control": 'public, max-age=60, no-cache="Set-Cookie"'}
+        assert httpcache.directives(headers) == {
+            "public": "",
+            "max-age": "60",
+            "no-cache": "Set-Cookie",
+        }
+
+
+class TestHTTPCache:
+    def test_fresh_responses_served_from_cache(self, cache, session, http_server):
+        http_server.routes["/a"] = route(Cache_Control="max-age=60")
+        url = http_server.url + "/a"
+        assert [cache.get(session, url).text for _ in range(3)] == ["body"] * 3
+        assert len(http_server.seen) == 1
+
+    def test_expires(self, cache, session, http_server):
+        http_server.routes["/a"] = route(Expires="Thu, 01 Jan 2099 00:00:00 GMT")
+        cache.get(session, http_server.url + "/a")
+        cache.get(session, http_server.url + "/a")
+        assert len(http_server.seen) == 1
+
+    def test_ttl_overrides_headers(self, tmp_path, session, http_server):
+        cache = httpcache.HTTPCache(tmp_path, ttl=60)
+        http_server.routes["/a"] = route(Cache_Control="no-cache")
+        cache.get(session, http_server.url + "/a")
+        cache.get(session, http_server.url + "/a")
+        assert len(http_server.seen) == 1
+
+    def test_etag_revalidation(self, cache, session, http_server):
+        def etag(handler):
+            if handler.headers.get("If-None-Match") == '"v1"':
+                return 304, {"ETag": '"v1"'}, ""
+            return 200, {"ETag": '"v1"', "Content-Type": "text/plain"}, "body"
+
+        http_server.routes["/a"] = etag
+        url = http_server.url + "/a"
+        assert cache.get(session, url).text == "body"
+        response = cache.get(session, url)
+        assert (response.status_code, response.text) == (200, "body")
+        assert response.headers["Content-Type"] == "text/plain"
+        assert http_server.seen[1][2]["If-None-Match"] == '"v1"'
+
+    def test_last_modified_revalidation(self, cache, session, http_server):
+        modified = "Wed, 01 Jan 2020 00:00:00 GMT"
+        http_server.routes["/a"] = route(Last_Modified=modified)
+        cache.get(session, http_server.url + "/a")
+        cache.get(session, http_server.url + "/a")
+        assert http_server.seen[1][2]["If-Modified-Since"] == modified
+
+    @pytest.mark.parametrize("status, headers", [(404, {}), (200, {"Cache_Control": "no-store"})])
+    def test_not_stored(self, cache, session, http_server, status, headers):
+        http_server.routes["/a"] = route(status=status, **headers)
+        cache.get(session, http_server.url + "/a")
+        assert cache.load(http_server.url + "/a") == (None, None)
+
+    def test_entries_compressed(self, cache, session, http_server):
+        http_server.routes["/a"] = route(body="x" * 10000)
+        cache.get(session, http_server.url + "/a")
+        data = cache.store.read(cache.key(http_server.url + "/a"))
+        assert len(data) < 1000
+        assert zlib.decompress(data).endswith(b"x" * 10000)
+
+    def test_offline(self, tmp_path, session, http_server):
+        http_server.routes["/a"] = route(Cache_Control="no-cache")
+        httpcache.HTTPCache(tmp_path).get(session, http_server.url + "/a")
+
+        offline = httpcache.HTTPCache(tmp_path, offline=True)
+        assert offline.get(session, http_server.url + "/a").text == "body"
+        with pytest.raises(httpcache.OfflineError, match="not cached"):
+            offline.get(session, http_server.url + "/b")
+        assert len(http_server.seen) == 1
+
+
+class TestUtilsGet:
+    def test_get_goes_through_cache(self, tmp_path, http_server, monkeypatch):
+        monkeypatch.setattr(utils, "http_cache", httpcache.HTTPCache(tmp_path))
+        http_server.routes["/j"] = route(
+            body='{"a": 1}', Content_Type="application/json", Cache_Control="max-age=60"
+        )
+        assert utils.get(http_server.url + "/j") == utils.get(http_server.url + "/j") == {"a": 1}
+        assert len(http_server.seen) == 1
@@ -0,0 +1,137 @@
+"""
+Unit tests for inji.httpd module.
+
+Tests the HTTP render service:
+- Rendering requests with vars layers and context overlays
+- Request validation (bad JSON, unknown or escaping template names)
+- Bounded queueing and timeouts
+- Prometheus metrics
+"""
+
+import argparse
+import json
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+from inji import httpd, server
+
+
+@pytest.fixture
+def root(tmp_path):
+    (tmp_path / "hello.j2").write_text("hello {{ name }} from {{ site }}")
+    (tmp_path / "vars.yml").write_text("site: base\nname: nobody\n")
+    return tmp_path
+
+
+@pytest.fixture
+def service(root):
+    return httpd.Service(root=root, vars_files=[str(root / "vars.yml")], max_concurrency=2)
+
+
+@pytest.fixture
+def url(service):
+    server = httpd.make_server(("127.0.0.1", 0), service)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def post(url, body):
+    request = urllib.request.Request(f"{url}/render", data=json.dumps(body).encode("utf-8"))
+    try:
+        with urllib.request.urlopen(request) as response:
+            return response.status, response.read().decode("utf-8")
+    except urllib.error.HTTPError as e:
+        return e.code, e.read().decode("utf-8")
+
+
+class TestArgs:
+    def test_bind(self):
+        assert httpd.bind("0.0.0.0:80") == ("0.0.0.0", 80)
+        assert httpd.bind(":80") == ("127.0.0.1", 80)
+
+    def test_invalid_bind(self):
+        with pytest.raises(argparse.ArgumentTypeError):
+            httpd.bind("nope")
+
+
+class TestService:
+    def test_render(self, url):
+        body = {"template": "hello.j2", "context": {"name": "world"}}
+        assert post(url, body) == (200, "hello world from base")
+
+    def test_unknown_template(self, url):
+        assert post(url, {"template": "missing.j2"})[0] == 404
+
+    def test_template_outside_root(self, url):
+        assert post(url, {"template": "../../etc/passwd"})[0] == 404
+
+    def test_bad_request(self, url):
+        assert post(url, {"context": {}})[0] == 400
+        assert post(url, {"template": "hello.j2", "context": []})[0] == 400
+        assert post(url, [1])[0] == 400
+        assert post(url, "hello.j2")[0] == 400
+
+    def test_unknown_strict_mode(self, url):
+        engines = dict(server.engines)
+        for mode in ("nope", "nope2"):
+            status, text = post(url, {"template": "hello.j2", "strict_mode": mode})
+            assert status == 400
+            assert "strict_mode" in text
+        assert server.engines == engines
+
+    def test_render_error(self, url, root):
+        (root / "broken.j2").write_text("{{ undefined }}")
+        status, text = post(url, {"template": "broken.j2"})
+        assert status == 422
+        assert "undefined" in text
+
+    def test_queue_full(self, service):
+        service.max_queue = 0
+        assert service.render(json.dumps({"template": "hello.j2"}))[0] == 503
+
+    def test_timeout(self, service, root):
+        (root / "slow.j2").write_text("{{ wait() }}")
+        service.timeout = 0.05
+        release = threading.Event()
+        body = {"template": "slow.j2", "context": {}}
+        with pytest.MonkeyPatch.context() as mp:
+            mp.setattr("inji.worker.render", lambda request: release.wait(5) and "late")
+            assert service.render(json.dumps(body))[0] == 504
+            release.set()
+
+    def test_metrics(self, url):
+        post(url, {"template": "hello.j2"})
+        post(url, {"template": "missing.j2"})
+        with urllib.request.urlopen(f"{url}/metrics") as response:
+            metrics = response.read().decode("utf-8")
+        assert "inji_render_duration_seconds_count 1" in metrics
+        assert 'inji_render_duration_seconds_bucket{le="+Inf"} 1' in metrics
+        assert 'inji_http_responses_total{code="200"} 1' in metrics
+        assert 'inji_http_responses_total{code="404"} 1' in metrics
+        assert "inji_render_queue_depth 0" in metrics
+        assert 'inji_cache_hit_ratio{cache="vars"}' in metrics
+
+    def test_not_found(self, url):
+        with pytest.raises(urllib.error.HTTPError) as e:
+            urllib.request.urlopen(f"{url}/nope")
+        assert e.value.code == 404
+
+
+class TestHistogram:
+    def test_cumulative_buckets(self):
+        h = httpd.Histogram(buckets=(0.1, 1.0))
+        for v in (0.05, 0.5, 5.0):
+            h.observe(v)
+        assert h.exposition("x") == [
+            'x_bucket{le="0.1"} 1',
+            'x_bucket{le="1.0"} 2',
+            'x_bucket{le="+Inf"} 3',
+            "x_sum 5.55",
+            "x_count 3",
+        ]
@@ -0,0 +1,79 @@
+"""
+Unit tests for inji.journal module.
+
+Tests the append-only journal of completed jobs:
+- Recording and reading back entries
+- Resetting the journal for a fresh run
+- Batched fsync
+- Tolerance of a torn last line after a crash, and dropping it before appending
+"""
+
+from unittest.mock import patch
+
+from inji.journal import Journal
+
+
+class TestJournal:
+    def test_missing_journal_is_empty(self, tmp_path):
+        assert Journal(tmp_path / "journal").completed() == {}
+
+    def test_record_and_read_back(self, tmp_path):
+        path = tmp_path / "journal"
+        with Journal(path) as j:
+            j.record("a.j2", "sha-a")
+            j.record("b.j2", "sha-b")
+        completed = Journal(path).completed()
+        assert set(completed) == {"a.j2", "b.j2"}
+        assert completed["a.j2"]["sha256"] == "sha-a"
+
+    def test_appends_across_runs(self, tmp_path):
+        path = tmp_path / "journal"
+        with Journal(path) as j:
+            j.record("a.j2", "1")
+        with Journal(path) as j:
+            j.record("b.j2", "2")
+        assert set(Journal(path).completed()) == {"a.j2", "b.j2"}
+
+    def test_reset_forgets_earlier_runs(self, tmp_path):
+        path = tmp_path / "journal"
+        with Journal(path) as j:
+            j.record("a.j2", "1")
+        with Journal(path) as j:
+            j.reset()
+            j.record("b.j2", "2")
+        assert set(Journal(path).completed()) == {"b.j2"}
+
+    def test_fsync_is_batched(self, tmp_path):
+        with patch("os.fsync") as fsync:
+            with Journal(tmp_path / "journal", batch_size=10, batch_interval=3600) as j:
+                for i in range(25):
+                    j.record(f"{i}.j2", "sha")
+                assert fsync.call_count == 2
+            assert fsync.call_count == 3
+
+    def test_torn_last_line_is_ignored(self, tmp_path):
+        path = tmp_path / "journal"
+        with Journal(path) as j:
+            j.record("a.j2", "sha")
+        with open(path, "a") as f:
+            f.write('{"job": "b.j2", "sha2')
+        assert set(Journal(path).completed()) == {"a.j2"}
+
+    def test_torn_last_line_is_dropped_before_appending(self, tmp_path):
+        path = tmp_path / "journal"
+        with Journal(path) as j:
+            j.record("a.j2", "sha")
+        with open(path, "a") as f:
+            f.write('{"job": "b.j2", "sha2')
+        with Journal(path) as j:
+            j.record("c.j2", "sha")
+        assert set(Journal(path).completed()) == {"a.j2", "c.j2"}
+        with open(path) as f:
+            assert all(line.endswith("}\n") for line in f)
+
+    def test_torn_only_line_is_dropped(self, tmp_path):
+        path = tmp_path / "journal"
+        path.write_text('{"job": "a.j2"')
+        with Journal(path) as j:
+            j.record("b.j2", "sha")
+        assert set(Journal(path).completed()) == {"b.j2"}
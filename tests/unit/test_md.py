@@ -0,0 +1,131 @@
+"""
+Unit tests for inji.md module.
+
+Tests markdown conversion for the markdown() global:
+- Output matching markdown.markdown(), extension configs honoured
+- Converters reused, reset between conversions and per settings
+- Converters for extension instances by their class and configs
+- Converted HTML cached by content in memory and on disk, under the cache key
+- Concurrent conversions
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+import markdown
+import pytest
+from markdown.extensions.toc import TocExtension
+
+from inji import globals as inji_globals
+from inji import md
+from inji.cache import DiskCache
+
+EXTENSIONS = ["extra", "toc"]
+
+
+@pytest.fixture(autouse=True)
+def fresh():
+    md.converted = md.memo.LRU(maxsize=4096)
+    md._idle.clear()
+    yield
+    md.disk_cache = None
+
+
+class TestConvert:
+    def test_matches_markdown(self):
+        text = "# Title\n\nSome *text*[^1].\n\n[^1]: A note.\n"
+        expected = markdown.markdown(text, extensions=EXTENSIONS, output_format="html5")
+        assert md.convert(text, extensions=EXTENSIONS) == expected
+
+    def test_extension_configs(self):
+        text = "# Title\n"
+        configs = {"toc": {"permalink": "#"}}
+        html = md.convert(text, extensions=EXTENSIONS, extension_configs=configs)
+        assert 'class="headerlink"' in html
+        assert 'class="headerlink"' not in md.convert(text, extensions=EXTENSIONS)
+
+    def test_global_passes_extension_configs(self, tmp_path):
+        doc = tmp_path / "doc.md"
+        doc.write_text("# Title\n")
+        html = inji_globals.markdown(str(doc), extension_configs={"toc": {"permalink": "#"}})
+        assert 'class="headerlink"' in html
+
+
+class TestConverters:
+    def test_reused(self):
+        with patch("inji.md.markdown.Markdown", wraps=markdown.Markdown) as built:
+            for i in range(5):
+                md.convert(f"text {i}", extensions=EXTENSIONS)
+        assert built.call_count == 1
+
+    def test_per_settings(self):
+        with patch("inji.md.markdown.Markdown", wraps=markdown.Markdown) as built:
+            md.convert("a", extensions=EXTENSIONS)
+            md.convert("b", extensions=["extra"])
+            md.convert("c", extensions=EXTENSIONS, extension_configs={"toc": {"permalink": True}})
+            md.convert("d", extensions=EXTENSIONS, output_format="xhtml")
+        assert built.call_count == 4
+
+    def test_extension_instances_by_class_and_configs(self):
+        with patch("inji.md.markdown.Markdown", wraps=markdown.Markdown) as built:
+            for i in range(3):
+                md.convert(f"# {i}", extensions=[TocExtension(permalink="#")])
+            md.convert("# x", extensions=[TocExtension(permalink="%")])
+        assert built.call_count == 2
+        assert len(md._idle) == 2
+        assert md.convert("# 0", extensions=[TocExtension(permalink="#")]) == markdown.markdown(
+            "# 0", extensions=[TocExtension(permalink="#")], output_format="html5"
+        )
+
+    def test_unfingerprintable_configs_not_pooled_or_cached(self):
+        with patch("inji.md.markdown.Markdown", wraps=markdown.Markdown) as built:
+            for _ in range(2):
+                html = md.convert("# x", extensions=[TocExtension(slugify=lambda v, s: "s")])
+        assert 'id="s"' in html
+        assert built.call_count == 2
+        assert not md._idle and not len(md.converted)
+
+    def test_reset_between_conversions(self):
+        md.convert("Text[^1].\n\n[^1]: A note.\n", extensions=EXTENSIONS)
+        assert "footnote" not in md.convert("Plain text.", extensions=EXTENSIONS)
+
+    def test_concurrent(self):
+        texts = [f"# Heading {i}\n\nBody {i}[^n].\n\n[^n]: Note {i}.\n" for i in range(64)]
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            htmls = list(pool.map(lambda t: md.convert(t, extensions=EXTENSIONS), texts))
+        assert htmls == [
+            markdown.markdown(t, extensions=EXTENSIONS, output_format="html5") for t in texts
+        ]
+
+
+class TestCache:
+    def test_converted_once(self):
+        with patch.object(
+            markdown.Markdown, "convert", autospec=True, return_value="<p>x</p>"
+        ) as c:
+            for _ in range(3):
+                assert md.convert("x", extensions=EXTENSIONS) == "<p>x</p>"
+            md.convert("y", extensions=EXTENSIONS)
+        assert c.call_count == 2
+
+    def test_on_disk(self, tmp_path):
+        md.disk_cache = DiskCache(str(tmp_path))
+        html = md.convert("# Kept\n", extensions=EXTENSIONS)
+        md.converted = md.memo.LRU()
+        with patch.object(markdown.Markdown, "convert", autospec=True) as c:
+            assert md.convert("# Kept\n", extensions=EXTENSIONS) == html
+        c.assert_not_called()
+        assert len(list(md.disk_cache.entries())) == 1
+
+    def test_on_disk_under_cache_key(self, tmp_path):
+        md.disk_cache = DiskCache(str(tmp_path))
+        md.convert("# Kept\n", extensions=EXTENSIONS)
+        md.converted = md.memo.LRU()
+        md.cache_key = "other"
+        try:
+            with patch.object(markdown.Markdown, "convert", autospec=True, return_value="x") as c:
+                md.convert("# Kept\n", extensions=EXTENSIONS)
+        finally:
+            md.cache_key = None
+        c.assert_called_once()
+        assert len(list(md.disk_cache.entries())) == 2
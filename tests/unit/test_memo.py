@@ -0,0 +1,169 @@
+"""
+Unit tests for inji.memo module.
+
+Tests memoization of macros and filters:
+- LRU bounds and stats
+- Memoized calls with hashable and unhashable arguments
+- jinja2's pass_environment/pass_context markers kept by memoized filters
+- Mutable results isolated from callers
+- The memoize global and --memoize-filters in templates
+- Single-flight, per-render memoization of facts
+"""
+
+import threading
+import time
+from unittest.mock import patch
+
+import pytest
+from jinja2 import Environment, pass_environment
+
+from inji import memo
+from inji.engine import TemplateEngine
+
+
+class TestLRU:
+    def test_least_recently_used_evicted(self):
+        lru = memo.LRU(maxsize=2)
+        lru.set("a", 1)
+        lru.set("b", 2)
+        lru.get("a")
+        lru.set("c", 3)
+        assert lru.get("b") is None
+        assert (lru.get("a"), lru.get("c")) == (1, 3)
+        assert len(lru) == 2
+
+
+class TestMemoize:
+    def test_same_arguments_call_once(self):
+        calls = []
+        f = memo.memoize(lambda x, y=0: calls.append(x) or x + y)
+        assert [f(1), f(1), f(1, y=1), f(2)] == [1, 1, 2, 2]
+        assert calls == [1, 1, 2]
+        assert f.cache.stats == {"hits": 1, "misses": 3}
+
+    def test_dicts_and_lists_compared_by_value(self):
+        calls = []
+        f = memo.memoize(lambda d: calls.append(d) or len(d))
+        assert f({"a": [1], "b": 2}) == f({"b": 2, "a": [1]}) == 2
+        assert f({"a": [2], "b": 2}) == 2
+        assert len(calls) == 2
+
+    def test_arguments_typed(self):
+        f = memo.memoize(lambda *args, **kwargs: repr((args, kwargs)))
+        assert len({f(True), f(1), f(1.0), f({"x": True}), f({"x": 1}), f({"x": 1.0})}) == 6
+        assert len({f((1,)), f([1]), f({1: 1}), f({True: 1}), f(x=1), f(x=True)}) == 6
+
+    def test_unhashable_arguments_passed_through(self):
+        calls = []
+        f = memo.memoize(lambda s: calls.append(s) or len(s))
+        assert f({1}) == f({1}) == 1
+        assert len(calls) == 2
+
+    def test_jinja_markers_kept(self):
+        @pass_environment
+        def env_name(environment, value):
+            return f"{environment.name}:{value}"
+
+        environment = Environment()
+        environment.name = "env"
+        environment.filters.update(memo.memoize_filters({"env_name": env_name}, {"env_name"}))
+        assert environment.from_string("{{ 'x' | env_name }}").render() == "env:x"
+        assert environment.filters["env_name"].__name__ == "env_name"
+
+    def test_mutable_results_copied(self):
+        f = memo.memoize(lambda: [1, 2])
+        f().append(3)
+        assert f() == [1, 2]
+
+
+class TestTemplates:
+    def _render(self, tmp_path, source, **kwargs):
+        template = tmp_path / "t.j2"
+        template.write_text(source)
+        return "".join(TemplateEngine(**kwargs).render(str(template), {}))
+
+    def test_memoized_macro(self, tmp_path):
+        source = (
+            "{% set n = namespace(calls=0) %}"
+            "{% macro m(x) %}{% set n.calls = n.calls + 1 %}<{{ x }}>{% endmacro %}"
+            "{% set m = memoize(m) %}"
+            "{% for x in [1, 2, 1, 1] %}{{ m(x) }}{% endfor %} {{ n.calls }}"
+        )
+        assert self._render(tmp_path, source) == "<1><2><1><1> 2"
+
+    def test_memoized_filters(self, tmp_path):
+        engine = TemplateEngine(memoize_filters=True)
+        assert "cache" in dir(engine.filters["to_url"])
+        assert "cache" not in dir(engine.filters["pop"])
+        source = "{{ {'hostname': 'h'} | to_url }} {{ '[1]' | from_literal }}"
+        assert self._render(tmp_path, source, memoize_filters=True) == "https://h [1]"
+        source = (
+            "{{ {'x': True}|format_dict('{x}') }} {{ {'x': 1}|format_dict('{x}') }} "
+            "{{ {'x': 1.0}|format_dict('{x}') }}"
+        )
+        assert self._render(tmp_path, source, memoize_filters=True) == "True 1 1.0"
+
+    def test_pure_filters(self):
+        pure = memo.pure_filters()
+        assert {"format_dict", "to_url", "from_literal", "tr"} <= pure
+        assert not pure & {"pop", "env_override", "cat", "shuffle", "random"}
+
+
+class TestSingleFlight:
+    def test_concurrent_calls_made_once(self):
+        flight, calls = memo.SingleFlight(), []
+
+        def slow():
+            calls.append(1)
+            time.sleep(0.1)
+            return "x"
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(flight.call("k", slow)))
+            for _ in range(5)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert results == ["x"] * 5
+        assert calls == [1]
+
+    def test_errors_not_kept(self):
+        flight, calls = memo.SingleFlight(), []
+
+        def fail():
+            calls.append(1)
+            raise OSError("boom")
+
+        for _ in range(2):
+            with pytest.raises(OSError):
+                flight.call("k", fail)
+        assert len(calls) == 2
+
+
+class TestPerRender:
+    def test_only_within_a_render(self):
+        calls = []
+        f = memo.per_render("f", lambda: calls.append(1) or len(calls))
+        assert (f(), f()) == (1, 2)
+        token = memo.render_memo.set(memo.SingleFlight())
+        try:
+            assert (f(), f()) == (3, 3)
+        finally:
+            memo.render_memo.reset(token)
+
+    @pytest.mark.usefixtures("no_native_git")
+    def test_git_facts_looked_up_once_per_render(self, tmp_path):
+        template = tmp_path / "t.j2"
+        template.write_text(
+            "{% for i in range(5) %}{{ git_commit_id() }}{% endfor %}"
+            "{% parallel for i in range(5) %}{{ git_commit_id() }}{% endparallel %}"
+        )
+        with patch("inji.utils.cmd", return_value="abc") as cmd:
+            engine = TemplateEngine()
+            assert list(engine.render(str(template), {})) == ["abc" * 10]
+            assert cmd.call_count == 1
+            list(engine.render(str(template), {}))
+            assert cmd.call_count == 2
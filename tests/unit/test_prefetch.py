@@ -0,0 +1,88 @@
+"""
+Unit tests for inji.prefetch module.
+
+Tests starting external calls ahead of the render:
+- Which calls have arguments known up front
+- Results taken by the render, once, and errors surfacing where called
+- Calls made concurrently when rendering with an engine that prefetches
+"""
+
+import threading
+from unittest.mock import patch
+
+import pytest
+from jinja2 import DictLoader, Environment
+
+from inji import prefetch
+from inji.engine import TemplateEngine
+
+
+def calls(source, context=None, **templates):
+    env = Environment(loader=DictLoader({"t": source, **templates}))
+    return prefetch.calls(prefetch.closure(env, "t"), context or {})
+
+
+class TestCalls:
+    def test_literal_and_context_arguments(self):
+        source = "{{ run('a') }}{{ GET(url) }}{{ git_commit_id(fmt='%H') }}{{ git_branch() }}"
+        assert calls(source, {"url": "http://x"}) == [
+            ("run", ("a",), ()),
+            ("GET", ("http://x",), ()),
+            ("git_commit_id", (), (("fmt", "%H"),)),
+            ("git_branch", (), ()),
+        ]
+
+    @pytest.mark.parametrize(
+        "source",
+        [
+            "{{ run(missing) }}",
+            "{% for c in cmds %}{{ run(c) }}{% endfor %}",
+            "{% set url = 'y' %}{{ GET(url) }}",
+            "{{ run('a' ~ b) }}",
+            "{{ upper('a') }}",
+            "{{ run(*args) }}",
+        ],
+    )
+    def test_unknown_arguments_skipped(self, source):
+        assert calls(source, {"cmds": ["a"], "url": "x", "b": "b", "args": ["a"]}) == []
+
+    def test_shadowed_globals_skipped(self):
+        assert calls("{{ run('a') }}", {"run": print}) == []
+        assert calls("{% macro run(x) %}{% endmacro %}{{ run('a') }}") == []
+        assert calls("{% from 'm' import f as run %}{{ run('a') }}", m="") == []
+
+    def test_duplicates_and_includes(self):
+        found = calls("{{ run('a') }}{% include 'i' %}", i="{{ run('a') }}{{ run('b') }}")
+        assert sorted(found) == [("run", ("a",), ()), ("run", ("b",), ())]
+
+
+class TestPrefetch:
+    def test_calls_made_concurrently(self):
+        barrier = threading.Barrier(3, timeout=5)
+        functions = {"f": lambda x: barrier.wait() is not None and x}
+        with prefetch.Prefetch(functions, [("f", (i,), ()) for i in range(3)]) as p:
+            f = p.context()["f"]
+            assert [f(2), f(1), f(0)] == [2, 1, 0]
+
+    def test_results_taken_once(self):
+        count = []
+        functions = {"f": lambda: count.append(1) or len(count)}
+        with prefetch.Prefetch(functions, [("f", (), ())]) as p:
+            f = p.context()["f"]
+            assert (f(), f()) == (1, 2)
+
+    def test_errors_raised_where_called(self):
+        functions = {"f": lambda: 1 / 0}
+        with prefetch.Prefetch(functions, [("f", (), ())]) as p:
+            with pytest.raises(ZeroDivisionError):
+                p.context()["f"]()
+
+
+class TestEngine:
+    def test_render_runs_calls_concurrently(self, tmp_path):
+        template = tmp_path / "t.j2"
+        template.write_text("{{ run('a') }} {{ run('b') }} {{ run(c) }}")
+        barrier = threading.Barrier(3, timeout=5)
+        with patch("inji.utils.cmd", side_effect=lambda c: barrier.wait() is not None and c):
+            engine = TemplateEngine(prefetch=True)
+            assert list(engine.render(str(template), {"c": "c"})) == ["a b c"]
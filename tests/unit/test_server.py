@@ -0,0 +1,164 @@
+"""
+Unit tests for inji.server module.
+
+Tests the render daemon and its client:
+- Argument handling (serve args, forwarding argv without --connect,
+  refusing --watch and --worker)
+- Applying the client's environment for the duration of a request
+- One engine per valid strict mode and engine setting (deadline, caches, ..)
+- Rendering through a pre-forked daemon, including STDIN and errors
+- Invalidation of warm caches when templates and vars files change
+"""
+
+import os
+import socket
+import subprocess
+import sys
+import time
+from unittest.mock import patch
+
+import pytest
+
+from inji import cli, server
+
+
+@pytest.fixture
+def daemon(tmp_path):
+    """A daemon with two workers listening on a socket in tmp_path"""
+    sock = str(tmp_path / "inji.sock")
+    code = f"from inji import server; server.serve({sock!r}, workers=2)"
+    proc = subprocess.Popen([sys.executable, "-c", code])
+    # the socket exists between bind() and listen() so wait for a connection
+    for _ in range(100):
+        try:
+            with socket.socket(socket.AF_UNIX) as s:
+                s.connect(sock)
+            break
+        except OSError:
+            time.sleep(0.05)
+    yield sock
+    proc.terminate()
+    proc.wait(timeout=5)
+    assert not os.path.exists(sock)
+
+
+def connect(sock, argv, stdin=None):
+    """Run the client as `inji --connect sock ...` would, returning (exit, output)"""
+    output = []
+    stdout = lambda *a, **kw: "file" in kw or output.append(*a)
+    with patch("sys.argv", ["inji", "--connect", sock] + argv):
+        with patch("sys.stdin") as mock_stdin, patch("builtins.print", side_effect=stdout):
+            mock_stdin.read.return_value = stdin
+            args = cli.cli_args(sys.argv[1:])
+            code = server.connect(sock, server.forwarded_argv(sys.argv[1:]), args)
+    return code, output
+
+
+class TestArgs:
+    def test_forwarded_argv(self):
+        argv = ["--connect", "/s", "-d", "a=b", "--connect=/t", "t.j2"]
+        assert server.forwarded_argv(argv) == ["-d", "a=b", "t.j2"]
+
+    def test_serve_args(self):
+        args = server.serve_args(["--socket", "/s", "--workers", "3"])
+        assert (args.socket, args.workers) == ("/s", 3)
+
+    def test_serve_args_requires_socket(self):
+        with pytest.raises(SystemExit):
+            server.serve_args([])
+
+    def test_connect_refuses_long_running_modes(self):
+        for option in ("--watch", "--worker"):
+            with pytest.raises(SystemExit):
+                cli.cli_args(["--connect", "/s", option, "t.j2"])
+
+    def test_environment_applied_and_restored(self, monkeypatch):
+        monkeypatch.setenv("INJI_DAEMON_TEST", "daemon")
+        with server.environment({"INJI_CLIENT_TEST": "client"}):
+            assert os.environ == {"INJI_CLIENT_TEST": "client"}
+        assert os.environ["INJI_DAEMON_TEST"] == "daemon"
+        assert "INJI_CLIENT_TEST" not in os.environ
+
+    def test_exit_code(self):
+        assert server.exit_code(SystemExit()) == 0
+        assert server.exit_code(SystemExit(2)) == 2
+        assert server.exit_code(SystemExit("message")) == 1
+
+
+class TestEngines:
+    def test_engine_per_mode(self):
+        assert server.engine("strict") is server.engine("strict")
+
+    def test_unknown_mode(self):
+        with pytest.raises(ValueError, match="strict_mode"):
+            server.engine("nope")
+        assert all(mode != "nope" for mode, _ in server.engines)
+
+    def test_engine_per_setting(self):
+        assert server.engine("strict", deadline=1.0) is server.engine("strict", deadline=1.0)
+        assert server.engine("strict", deadline=1.0) is not server.engine("strict")
+        assert server.engine("strict", deadline=1.0).deadline == 1.0
+
+
+class TestDaemon:
+    def test_render_template(self, daemon, tmp_path):
+        t = tmp_path / "t.j2"
+        t.write_text("hello {{ name }}")
+        assert connect(daemon, ["-d", "name=world", str(t)]) == (0, ["hello world"])
+
+    def test_render_stdin(self, daemon):
+        assert connect(daemon, ["-d", "x=1"], stdin="{{ x }}") == (0, ["1"])
+
+    def test_client_environment_and_cwd(self, daemon, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        monkeypatch.setenv("INJI_DAEMON_TEST", "from-client")
+        (tmp_path / "inji.yml").write_text("local: vars\n")
+        t = tmp_path / "t.j2"
+        t.write_text("{{ INJI_DAEMON_TEST }} {{ local }}")
+        assert connect(daemon, ["t.j2"]) == (0, ["from-client vars"])
+
+    def test_client_environment_seen_by_filters(self, daemon, tmp_path, monkeypatch):
+        monkeypatch.setenv("INJI_DAEMON_TEST", "from-client")
+        t = tmp_path / "t.j2"
+        t.write_text("{{ 'default' | env_override('INJI_DAEMON_TEST') }}")
+        assert connect(daemon, [str(t)]) == (0, ["from-client"])
+
+    def test_long_running_modes_refused(self, daemon, tmp_path, capsys):
+        (tmp_path / "t.j2").write_text("")
+        args = cli.cli_args([str(tmp_path / "t.j2")])
+        assert server.connect(daemon, ["--watch", str(tmp_path / "t.j2")], args) == 1
+        assert "can't be served" in capsys.readouterr().err
+
+    def test_deadline_and_call_timeout_honoured(self, daemon, tmp_path):
+        t = tmp_path / "t.j2"
+        t.write_text("{{ run('sleep 5') }}")
+        for option in ("--deadline", "--call-timeout"):
+            assert connect(daemon, [option, "0.2", str(t)]) == (124, [])
+        # the next request has no deadline for its engine
+        t.write_text("{{ run('sleep 0.5') }}done")
+        assert connect(daemon, [str(t)]) == (0, ["done"])
+
+    def test_errors_reported(self, daemon, tmp_path):
+        t = tmp_path / "t.j2"
+        t.write_text("{{ undefined }}")
+        code, output = connect(daemon, [str(t)])
+        assert code == 1
+        assert output == []
+
+    def test_argument_errors_reported(self, daemon, capsys, tmp_path):
+        (tmp_path / "t.j2").write_text("")
+        args = cli.cli_args([str(tmp_path / "t.j2")])
+        assert server.connect(daemon, ["--strict-mode", "invalid"], args) == 2
+        assert "invalid choice" in capsys.readouterr().err
+
+    def test_changes_invalidate_caches(self, daemon, tmp_path):
+        t, v = tmp_path / "t.j2", tmp_path / "vars.yml"
+        t.write_text("{{ a }}")
+        v.write_text("a: 1\n")
+        # more requests than workers so every worker has warm caches
+        for _ in range(4):
+            assert connect(daemon, ["-v", str(v), str(t)]) == (0, ["1"])
+        t.write_text("{{ a }}!")
+        v.write_text("a: 2\n")
+        for _ in range(4):
+            assert connect(daemon, ["-v", str(v), str(t)]) == (0, ["2!"])
@@ -0,0 +1,101 @@
+"""
+Unit tests for inji.shard module.
+
+Tests deterministic partitioning of render jobs:
+- INDEX/COUNT parsing
+- Stable, disjoint and complete assignment (hashed and weighted)
+- Agreement between independent processes
+- Manifest merge checks
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from inji import shard
+
+
+class TestParse:
+    def test_valid(self):
+        assert shard.parse("1/4") == (1, 4)
+
+    @pytest.mark.parametrize("spec", ["4/4", "-1/4", "0/0", "1", "a/b"])
+    def test_invalid(self, spec):
+        with pytest.raises(argparse.ArgumentTypeError):
+            shard.parse(spec)
+
+
+class TestAssign:
+    keys = [f"templates/t{i}.j2" for i in range(50)]
+
+    def test_disjoint_and_complete(self):
+        slices = [shard.select(self.keys, i, 4) for i in range(4)]
+        flat = [t for s in slices for t in s]
+        assert sorted(flat) == sorted(self.keys)
+        assert len(flat) == len(set(flat))
+
+    def test_hashed_assignment_is_stable_when_jobs_are_added(self):
+        before = shard.assign(self.keys, 3)
+        after = shard.assign(self.keys + ["templates/new.j2"], 3)
+        assert all(after[k] == v for k, v in before.items())
+
+    def test_weighted_assignment_balances_load(self):
+        weights = {k: (100 if i < 4 else 1) for i, k in enumerate(self.keys)}
+        assignment = shard.assign(self.keys, 4, weights)
+        loads = [sum(weights[k] for k, s in assignment.items() if s == i) for i in range(4)]
+        assert max(loads) - min(loads) <= 1
+
+    def test_weighted_unknown_jobs_are_assigned(self):
+        assignment = shard.assign(self.keys, 2, {self.keys[0]: 5.0})
+        assert set(assignment) == set(self.keys)
+
+    def test_weights_by_size(self, tmp_path):
+        t = tmp_path / "a.j2"
+        t.write_text("12345")
+        assert shard.weights_by_size({"a": str(t), "-": "-"}) == {"a": 5, "-": 0}
+
+    def test_independent_processes_agree(self):
+        code = (
+            "import json, sys; from inji import shard; "
+            "print(json.dumps(shard.select(json.loads(sys.argv[1]), int(sys.argv[2]), 3)))"
+        )
+        slices = []
+        for i in range(3):
+            env = dict(os.environ, PYTHONHASHSEED=str(i + 1))
+            out = subprocess.check_output(
+                [sys.executable, "-c", code, json.dumps(self.keys), str(i)], env=env
+            )
+            slices.append(json.loads(out))
+        assert slices == [shard.select(self.keys, i, 3) for i in range(3)]
+        assert sorted(t for s in slices for t in s) == sorted(self.keys)
+
+
+class TestMerge:
+    def test_complete(self, tmp_path):
+        templates = ["a.j2", "b.j2", "c.j2"]
+        manifests = []
+        for i in range(2):
+            m = tmp_path / f"shard-{i}.json"
+            jobs = {t: "sha" for t in shard.select(templates, i, 2)}
+            shard.write_manifest(m, i, 2, jobs)
+            manifests.append(m)
+        assert shard.merge(manifests, templates) == {
+            "missing": [],
+            "duplicated": [],
+            "unexpected": [],
+        }
+
+    def test_problems_reported(self, tmp_path):
+        m1, m2 = tmp_path / "m1.json", tmp_path / "m2.json"
+        shard.write_manifest(m1, 0, 2, {"a.j2": "x", "z.j2": "x"})
+        shard.write_manifest(m2, 1, 2, {"a.j2": "x"})
+        problems = shard.merge([m1, m2], ["a.j2", "b.j2"])
+        assert problems["missing"] == ["b.j2"]
+        assert problems["duplicated"] == ["a.j2"]
+        assert problems["unexpected"] == ["z.j2"]
+        assert json.loads(Path(m1).read_text())["shard"] == [0, 2]
@@ -0,0 +1,125 @@
+"""
+Unit tests for inji.sinks module.
+
+Tests the destinations rendered output is written to:
+- Pooled file writes creating parent directories
+- Writes to the same path made in order, paths outside the root refused
+- Batched fsync
+- Errors surfacing on close
+- Atomic writes that leave unchanged files alone
+"""
+
+import os
+from unittest.mock import patch
+
+import pytest
+
+from inji import sinks
+
+
+class TestWriter:
+    def test_writes_files_relative_to_root(self, tmp_path):
+        with sinks.Writer(root=tmp_path) as w:
+            w.submit("a/b/c.txt", "hello")
+            w.submit("d.txt", "world")
+        assert (tmp_path / "a/b/c.txt").read_text() == "hello"
+        assert (tmp_path / "d.txt").read_text() == "world"
+
+    def test_fsync_is_batched(self, tmp_path):
+        with patch("os.fsync") as fsync:
+            with sinks.Writer(root=tmp_path, workers=1, batch_size=5) as w:
+                for i in range(10):
+                    w.submit(f"{i}.txt", "x")
+            # 10 files plus the (single) directory per batch of 5
+            assert fsync.call_count == 12
+
+    def test_error_raised_on_close(self, tmp_path):
+        (tmp_path / "blocker").write_text("not a directory")
+        w = sinks.Writer(root=tmp_path)
+        w.submit("blocker/file.txt", "x")
+        with pytest.raises(OSError):
+            w.close()
+
+    def test_unchanged_files_not_rewritten(self, tmp_path):
+        (tmp_path / "same.txt").write_text("x")
+        with patch("os.fsync") as fsync:
+            with sinks.Writer(root=tmp_path) as w:
+                w.submit("same.txt", "x")
+            fsync.assert_not_called()
+
+    def test_last_write_to_a_path_wins(self, tmp_path):
+        for _ in range(20):
+            with sinks.Writer(root=tmp_path, workers=8) as w:
+                for i in range(50):
+                    w.submit("same.txt", f"{i}\n" * (50 - i) * 100)
+            assert (tmp_path / "same.txt").read_text() == "49\n" * 100
+
+    @pytest.mark.parametrize("path", ["../escaped.txt", "a/../../escaped.txt", "/tmp/x", "", "."])
+    def test_paths_outside_root_refused(self, tmp_path, path):
+        root = tmp_path / "root"
+        with sinks.Writer(root=root) as w:
+            with pytest.raises(ValueError, match="not a file inside"):
+                w.submit(path, "x")
+        assert not (tmp_path / "escaped.txt").exists()
+
+    def test_symlinks_out_of_root_refused(self, tmp_path):
+        root = tmp_path / "root"
+        root.mkdir()
+        (root / "link").symlink_to(tmp_path)
+        with sinks.Writer(root=root) as w:
+            with pytest.raises(ValueError):
+                w.submit("link/escaped.txt", "x")
+            w.submit("inside/../ok.txt", "x")
+        assert (root / "ok.txt").read_text() == "x"
+
+
+class TestWriteIfChanged:
+    def test_creates_file(self, tmp_path):
+        path = tmp_path / "sub" / "f.txt"
+        assert sinks.write_if_changed(path, "hello") is True
+        assert path.read_text() == "hello"
+
+    def test_same_content_keeps_mtime(self, tmp_path):
+        path = tmp_path / "f.txt"
+        path.write_text("hello")
+        os.utime(path, ns=(1, 1))
+        assert sinks.write_if_changed(path, "hello") is False
+        assert path.stat().st_mtime_ns == 1
+
+    def test_changed_content_replaced_keeping_mode(self, tmp_path):
+        path = tmp_path / "f.txt"
+        path.write_text("hello")
+        path.chmod(0o600)
+        inode = path.stat().st_ino
+        assert sinks.write_if_changed(path, "world") is True
+        assert path.read_text() == "world"
+        assert path.stat().st_mode & 0o777 == 0o600
+        assert path.stat().st_ino != inode  # renamed over, not rewritten in place
+
+    def test_no_temporary_files_left_on_failure(self, tmp_path):
+        with patch("os.replace", side_effect=OSError("boom")):
+            with pytest.raises(OSError):
+                sinks.write_if_changed(tmp_path / "f.txt", "x")
+        assert os.listdir(tmp_path) == []
+
+    def test_file_sha256_of_missing_file(self, tmp_path):
+        assert sinks.file_sha256(tmp_path / "missing") is None
+
+
+class TestOutputPath:
+    @pytest.mark.parametrize(
+        "template, expected",
+        [("a/motd.j2", "motd"), ("nginx.conf.jinja2", "nginx.conf"), ("README", "README")],
+    )
+    def test_template_suffix_dropped(self, template, expected):
+        assert sinks.output_path("out", template) == os.path.join("out", expected)
+
+    def test_collisions(self):
+        templates = ["a/motd.j2", "b/motd.tmpl", "./a/motd.j2", "a/other.j2"]
+        collisions = sinks.output_collisions("out", templates)
+        assert collisions == {
+            os.path.join("out", "motd"): [
+                os.path.abspath("a/motd.j2"),
+                os.path.abspath("b/motd.tmpl"),
+            ]
+        }
@@ -0,0 +1,154 @@
+"""
+Unit tests for inji.timeouts module.
+
+Tests time budgets for renders and external calls:
+- Deadlines nesting and what is left of them for calls
+- Commands and HTTP requests cut short by --call-timeout
+- Renders (and loops producing no output) stopped at their deadline, reporting
+  the template line
+- Deadlines carried into {% parallel for %} loops and GET_many()
+- Worker requests with deadlines
+"""
+
+import time
+
+import pytest
+
+from inji import coprocess, timeouts, utils, worker
+from inji.engine import TemplateEngine
+
+
+@pytest.fixture
+def call_timeout():
+    def set(seconds):
+        timeouts.call_timeout = seconds
+
+    yield set
+    timeouts.call_timeout = None
+
+
+def render(path, **kwargs):
+    return "".join(TemplateEngine(**kwargs).render(str(path), {}))
+
+
+class TestBudgets:
+    def test_unbounded(self):
+        assert timeouts.remaining("call") is None
+
+    def test_earlier_deadline_kept(self):
+        with timeouts.within(10):
+            with timeouts.within(100):
+                assert timeouts.remaining("call") <= 10
+            with timeouts.within(1):
+                assert timeouts.remaining("call") <= 1
+        assert timeouts.deadline.get() is None
+
+    def test_call_timeout_within_deadline(self, call_timeout):
+        call_timeout(5)
+        assert timeouts.remaining("call") == 5
+        with timeouts.within(1):
+            assert timeouts.remaining("call") <= 1
+
+    def test_passed_deadline(self):
+        with timeouts.within(0.01):
+            time.sleep(0.02)
+            assert timeouts.expired()
+            with pytest.raises(
+                timeouts.Timeout, match="GET x not made, the deadline of 0.01s had passed"
+            ):
+                timeouts.remaining("GET x")
+
+
+class TestCalls:
+    def test_command(self, call_timeout):
+        call_timeout(0.2)
+        start = time.monotonic()
+        with pytest.raises(timeouts.Timeout, match="command 'sleep 5' took longer than 0.2s"):
+            utils.cmd("sleep 5")
+        assert time.monotonic() - start < 2
+
+    def test_command_on_coprocess(self, call_timeout):
+        call_timeout(0.2)
+        with coprocess.Pool(1) as pool:
+            utils.coprocesses = pool
+            try:
+                with pytest.raises(timeouts.Timeout):
+                    utils.cmd("sleep 5")
+                assert utils.cmd("printf ok") == "ok"
+            finally:
+                utils.coprocesses = None
+        assert len(pool.coprocesses) == 0
+
+    def test_get(self, call_timeout, http_server):
+        http_server.routes["/slow"] = lambda h: time.sleep(1) or (200, {}, "late")
+        call_timeout(0.2)
+        with pytest.raises(timeouts.Timeout, match="GET .*/slow took longer than 0.2s"):
+            utils.get(f"{http_server.url}/slow")
+
+    def test_get_many_keeps_to_deadline(self, http_server):
+        http_server.routes["/slow"] = lambda h: time.sleep(1) or (200, {}, "late")
+        with timeouts.within(0.2):
+            with pytest.raises(timeouts.Timeout):
+                utils.get_many([f"{http_server.url}/slow"] * 2)
+
+
+class TestRender:
+    def test_call_reported_with_template_line(self, tmp_path):
+        (tmp_path / "a.j2").write_text("a\n{% include 'b.j2' %}\n")
+        (tmp_path / "b.j2").write_text("b\n\n{{ run('sleep 5') }}\n")
+        with pytest.raises(timeouts.Timeout) as e:
+            render(tmp_path / "a.j2", deadline=0.2)
+        assert str(e.value).startswith("command 'sleep 5' went past the deadline of 0.2s")
+        assert str(e.value).endswith(f"at {tmp_path}/b.j2:3 (via {tmp_path}/a.j2:2)")
+
+    def test_render_stopped(self, tmp_path):
+        template = tmp_path / "t.j2"
+        template.write_text("{% for i in range(10**8) %}{{ i }}{% endfor %}")
+        start = time.monotonic()
+        with pytest.raises(
+            timeouts.Timeout, match=f"render went past the deadline of 0.2s at {template}:1"
+        ):
+            render(template, deadline=0.2)
+        assert time.monotonic() - start < 2
+
+    def test_loop_without_output_stopped(self, tmp_path):
+        template = tmp_path / "t.j2"
+        template.write_text(
+            "start\n{% for i in range(10**8) %}\n{% set x = i %}\n{% endfor %}\nend"
+        )
+        start = time.monotonic()
+        with pytest.raises(
+            timeouts.Timeout, match=f"render went past the deadline of 0.2s at {template}:2"
+        ):
+            render(template, deadline=0.2)
+        assert time.monotonic() - start < 2
+
+    def test_loops_unchanged_by_checks(self, tmp_path):
+        template = tmp_path / "t.j2"
+        template.write_text(
+            "{% for i in range(3) %}{{ loop.length }}{{ loop.revindex }}{% endfor %}"
+            "{% for i in 'ab' | map('upper') %}{{ loop.length }}{% endfor %}"
+            "{% for i in [] %}{% else %}empty{% endfor %}"
+        )
+        assert render(template, deadline=10) == render(template) == "33323122empty"
+
+    def test_within_deadline(self, tmp_path):
+        template = tmp_path / "t.j2"
+        template.write_text("{{ run('printf ok') }}")
+        assert render(template, deadline=10) == "ok"
+        assert timeouts.deadline.get() is None
+
+    def test_parallel_loop_keeps_to_deadline(self, tmp_path):
+        template = tmp_path / "t.j2"
+        template.write_text("{% parallel for i in range(2) %}{{ run('sleep 5') }}{% endparallel %}")
+        with pytest.raises(timeouts.Timeout, match="command 'sleep 5'"):
+            render(template, deadline=0.2)
+
+
+class TestWorker:
+    def test_request_deadline(self, tmp_path):
+        template = tmp_path / "t.j2"
+        template.write_text("{{ run('sleep 5') }}")
+        response = worker.handle(dict(template=str(template), deadline=0.2))
+        assert response["exitCode"] == 1
+        assert response["error"].startswith("Timeout: command 'sleep 5'")
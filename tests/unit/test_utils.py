@@ -12,6 +12,7 @@ Tests utility functions for:
 import json
 import os
 import tempfile
+import threading
 from pathlib import Path
 from unittest.mock import Mock, patch
 
@@ -118,6 +119,24 @@ class TestYamlReading:
             finally:
                 os.unlink(f.name)
 
+    def test_read_context_cached_until_modified(self, tmp_path):
+        """Vars files are only parsed again when they change."""
+        f = tmp_path / "vars.yml"
+        f.write_text("a: 1\n")
+        assert utils.read_context(f) == {"a": 1}
+        with patch("yaml.load") as mock_load:
+            assert utils.read_context(f) == {"a": 1}
+            mock_load.assert_not_called()
+        f.write_text("a: 22\n")
+        assert utils.read_context(f) == {"a": 22}
+
+    def test_read_context_returns_copies(self, tmp_path):
+        """Mutating a returned context does not affect the cached one."""
+        f = tmp_path / "vars.yml"
+        f.write_text("a: [1]\n")
+        utils.read_context(f)["a"].append(2)
+        assert utils.read_context(f) == {"a": [1]}
+
     def test_read_context_invalid_yaml(self):
         """Raise on invalid YAML."""
         with tempfile.NamedTemporaryFile(mode="w", suffix=".yml", delete=False) as f:
@@ -219,6 +238,15 @@ class TestCommandExecution:
         result = utils.cmd("echo test")
         assert result == "output with spaces"
 
+    def test_cmd_quoting(self):
+        """Arguments are split as a shell would."""
+        assert utils.cmd("printf '%s|' 'a  b' \"c d\" e") == "a  b|c d|e|"
+
+    def test_cmd_empty(self):
+        """There must be a command to run."""
+        with pytest.raises(ValueError):
+            utils.cmd("  ")
+
     @patch("subprocess.check_output")
     def test_cmd_failure(self, mock_check_output):
         """Command execution failure raises exception."""
@@ -276,7 +304,7 @@ class TestFileLoading:
 class TestHttpGet:
     """Test HTTP GET utilities."""
 
-    @patch("inji.utils.requests.get")
+    @patch("inji.utils.requests.Session.get")
     def test_get_json_response(self, mock_get):
         """Fetch and parse JSON response."""
         mock_response = Mock()
@@ -287,7 +315,7 @@ class TestHttpGet:
         result = utils.get("http://api.example.com/data")
         assert result == {"result": "success"}
 
-    @patch("inji.utils.requests.get")
+    @patch("inji.utils.requests.Session.get")
     def test_get_text_response(self, mock_get):
         """Fetch text response."""
         mock_response = Mock()
@@ -298,7 +326,7 @@ class TestHttpGet:
         result = utils.get("http://example.com/text")
         assert result == "plain text response"
 
-    @patch("inji.utils.requests.get")
+    @patch("inji.utils.requests.Session.get")
     def test_get_network_error(self, mock_get):
         """Handle network errors."""
         mock_get.side_effect = Exception("Network error")
@@ -307,6 +335,42 @@ class TestHttpGet:
             utils.get("http://unreachable.example.com")
 
 
+class TestHttpSession:
+    """Test pooled connections and concurrent fetching."""
+
+    @pytest.fixture(autouse=True)
+    def fresh_session(self):
+        size = utils.http_pool_size
+        utils.configure_http(size)
+        yield
+        utils.configure_http(size)
+
+    def test_connections_kept_alive(self, http_server):
+        http_server.routes["/a"] = lambda h: (200, {"Content-Type": "text/plain"}, "a")
+        assert [utils.get(http_server.url + "/a") for _ in range(3)] == ["a"] * 3
+        assert len({port for _, port, _ in http_server.seen}) == 1
+
+    def test_get_many_in_order_and_concurrent(self, http_server):
+        barrier = threading.Barrier(3, timeout=5)
+
+        def route(name):
+            # every request waits for the others, so only passes if all are in flight
+            return lambda h: barrier.wait() is not None and (200, {}, name)
+
+        for name in "abc":
+            http_server.routes[f"/{name}"] = route(name)
+        urls = [f"{http_server.url}/{n}" for n in "cab"]
+        assert utils.get_many(urls) == ["c", "a", "b"]
+
+    def test_get_many_nothing(self):
+        assert utils.get_many([]) == []
+
+    def test_pool_size_configurable(self):
+        utils.configure_http(2)
+        adapter = utils.session().get_adapter("http://example.com")
+        assert adapter._pool_maxsize == 2
+
+
 class TestIpApiUtilities:
     """Test IP API utilities."""
 
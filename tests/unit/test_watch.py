@@ -0,0 +1,141 @@
+"""
+Unit tests for inji.watch module.
+
+Tests incremental re-rendering on changes:
+- Only templates whose dependency closure changed are re-rendered
+- Templates including by names known only at render time re-render on any change
+- Vars file changes (including new vars files) re-render everything
+- Render errors don't stop watching
+"""
+
+import os
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+from inji import utils
+from inji.engine import TemplateEngine
+from inji.watch import Watch, stamp
+
+
+def touch(path, text):
+    """Write text to path making sure its mtime moves on"""
+    path = Path(path)
+    old = path.stat().st_mtime_ns if path.exists() else 0
+    path.write_text(text)
+    os.utime(path, ns=(old + 10**9, old + 10**9))
+
+
+def wait_for(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+@pytest.fixture
+def tree(tmp_path):
+    (tmp_path / "macros.j2").write_text("{% macro m() %}m{% endmacro %}")
+    (tmp_path / "a.j2").write_text('{% from "macros.j2" import m %}a{{ m() }}{{ v }}')
+    (tmp_path / "b.j2").write_text("b{{ v }}")
+    (tmp_path / "vars.yml").write_text("v: 1\n")
+    return tmp_path
+
+
+@pytest.fixture
+def watching(tree):
+    engine = TemplateEngine()
+    vars_files = [str(tree / "vars.yml")]
+    renders = []
+    lock = threading.Lock()
+
+    def render(template, context):
+        with lock:
+            renders.append("".join(engine.render(template, context)))
+
+    def context():
+        ctx = {}
+        for f in vars_files:
+            ctx.update(utils.read_context(f))
+        return ctx
+
+    w = Watch(
+        [str(tree / "a.j2"), str(tree / "b.j2")],
+        vars_files=lambda: vars_files,
+        context=context,
+        dependencies=engine.dependencies,
+        render=render,
+        interval=0.02,
+        debounce=0.02,
+    )
+    stop = threading.Event()
+    thread = threading.Thread(target=w.run, args=(stop,))
+    thread.start()
+    assert wait_for(lambda: len(renders) == 2)
+    yield renders, vars_files
+    stop.set()
+    thread.join(timeout=5)
+
+
+class TestStamp:
+    def test_missing(self, tmp_path):
+        assert stamp(tmp_path / "missing") is None
+
+    def test_changes_with_content(self, tmp_path):
+        f = tmp_path / "f"
+        f.write_text("a")
+        before = stamp(f)
+        touch(f, "bb")
+        assert stamp(f) != before
+
+
+class TestWatch:
+    def test_initial_render(self, watching):
+        renders, _ = watching
+        assert sorted(renders) == ["am1", "b1"]
+
+    def test_partial_change_only_rerenders_dependants(self, watching, tree):
+        renders, _ = watching
+        touch(tree / "macros.j2", "{% macro m() %}M{% endmacro %}")
+        assert wait_for(lambda: len(renders) == 3)
+        time.sleep(0.2)
+        assert renders[2:] == ["aM1"]
+
+    def test_dynamic_includes_rerender_on_any_change(self, tree):
+        (tree / "d.j2").write_text("{% include name %}")
+        (tree / "c.j2").write_text("c")
+        w = Watch(
+            [str(tree / "d.j2")],
+            vars_files=lambda: [],
+            context=lambda: {"name": "c.j2"},
+            dependencies=TemplateEngine().dependencies,
+            render=lambda template, context: None,
+        )
+        w._render(str(tree / "d.j2"), {})
+        assert w.affected({str(tree / "c.j2")}) == [str(tree / "d.j2")]
+        assert w.affected({str(tree)}) == [str(tree / "d.j2")]
+
+    def test_vars_change_rerenders_everything(self, watching, tree):
+        renders, _ = watching
+        touch(tree / "vars.yml", "v: 2\n")
+        assert wait_for(lambda: len(renders) == 4)
+        assert sorted(renders[2:]) == ["am2", "b2"]
+
+    def test_new_vars_file_rerenders_everything(self, watching, tree):
+        renders, vars_files = watching
+        touch(tree / "more.yml", "v: 3\n")
+        vars_files.append(str(tree / "more.yml"))
+        assert wait_for(lambda: len(renders) == 4)
+        assert sorted(renders[2:]) == ["am3", "b3"]
+
+    def test_render_errors_keep_watching(self, watching, tree, capsys):
+        renders, _ = watching
+        touch(tree / "b.j2", "{{ undefined }}")
+        time.sleep(0.3)
+        touch(tree / "b.j2", "fixed")
+        assert wait_for(lambda: "fixed" in renders)
+        assert "undefined" in capsys.readouterr().err
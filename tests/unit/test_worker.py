@@ -0,0 +1,100 @@
+"""
+Unit tests for inji.worker module.
+
+Tests the NDJSON persistent worker protocol:
+- Rendering requests with layered vars and context
+- Writing to output paths
+- Errors and malformed requests
+- Concurrent (multiplexed) requests
+"""
+
+import io
+import json
+import threading
+from unittest.mock import patch
+
+from inji import worker
+
+
+def serve(*requests):
+    stdin = io.StringIO("".join(json.dumps(r) + "\n" for r in requests) + "not json\n")
+    stdout = io.StringIO()
+    assert worker.serve(stdin, stdout) == 0
+    responses = [json.loads(line) for line in stdout.getvalue().splitlines()]
+    return {r["requestId"]: r for r in responses}
+
+
+class TestWorker:
+    def test_layered_vars_and_context(self, tmp_path):
+        (tmp_path / "t.j2").write_text("{{ a }} {{ b }} {{ c }}")
+        (tmp_path / "base.yml").write_text("a: base\nb: base\nc: base\n")
+        (tmp_path / "prod.yml").write_text("b: prod\nc: prod\n")
+        response = worker.handle(
+            {
+                "requestId": 1,
+                "template": str(tmp_path / "t.j2"),
+                "vars": [str(tmp_path / "base.yml"), str(tmp_path / "prod.yml")],
+                "context": {"c": "ctx"},
+            }
+        )
+        assert response == {"requestId": 1, "exitCode": 0, "output": "base prod ctx", "error": ""}
+
+    def test_output_path(self, tmp_path):
+        (tmp_path / "t.j2").write_text("{{ a }}")
+        out = tmp_path / "t.conf"
+        response = worker.handle(
+            {"template": str(tmp_path / "t.j2"), "context": {"a": 1}, "output": str(out)}
+        )
+        assert response["exitCode"] == 0
+        assert response["output"] == ""
+        assert out.read_text() == "1\n"
+
+    def test_render_error(self, tmp_path):
+        (tmp_path / "t.j2").write_text("{{ missing }}")
+        response = worker.handle({"requestId": 3, "template": str(tmp_path / "t.j2")})
+        assert response["exitCode"] == 1
+        assert "missing" in response["error"]
+
+    def test_serve(self, tmp_path):
+        (tmp_path / "t.j2").write_text("{{ n }}")
+        t = str(tmp_path / "t.j2")
+        responses = serve(
+            *({"requestId": n, "template": t, "context": {"n": n}} for n in range(1, 6))
+        )
+        assert {k: r["output"] for k, r in responses.items() if k} == {
+            n: str(n) for n in range(1, 6)
+        }
+        assert responses[None]["exitCode"] == 2
+
+    def test_requests_are_multiplexed(self, tmp_path):
+        (tmp_path / "t.j2").write_text("x")
+        barrier = threading.Barrier(3, timeout=5)
+        render = worker.render
+
+        def blocking_render(request):
+            barrier.wait()
+            return render(request)
+
+        # deadlocks (and times out) unless all three requests are in flight at once
+        with patch("inji.worker.render", side_effect=blocking_render):
+            t = str(tmp_path / "t.j2")
+            responses = serve(*({"requestId": n, "template": t} for n in range(1, 4)))
+        assert all(responses[n]["exitCode"] == 0 for n in range(1, 4))
+
+    def test_requests_not_objects(self):
+        stdin = io.StringIO('[1]\n"x"\n7\n')
+        stdout = io.StringIO()
+        assert worker.serve(stdin, stdout) == 0
+        responses = [json.loads(line) for line in stdout.getvalue().splitlines()]
+        assert [r["exitCode"] for r in responses] == [2, 2, 2]
+        assert "expected a JSON object, not list" in responses[0]["error"]
+
+    def test_unexpected_errors_answered(self, tmp_path):
+        with patch("inji.worker.handle", side_effect=RuntimeError("boom")):
+            responses = serve({"requestId": 3, "template": "t.j2"})
+        assert responses[3] == {
+            "requestId": 3,
+            "exitCode": 1,
+            "output": "",
+            "error": "RuntimeError: boom",
+        }